@@ -10,8 +10,33 @@ from sqlalchemy.exc import OperationalError
 db = SQLAlchemy()
 migrate = Migrate()
 
-def create_app(config_name=None):
-    """Application factory pattern"""
+def engine_options(app, threads=None):
+    """Pool settings for the app's one engine: ``threads`` that use it at once plus headroom
+
+    ``threads`` defaults to the web server's request threads and the embedded
+    job workers. SQLite keeps its default pool.
+    """
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return options
+    
+    if threads is None:
+        # Waitress request threads (server.py) and embedded job workers
+        threads = 6 + app.config.get('JOB_WORKERS_EMBEDDED', 0)
+    # Lesson indexer, curriculum digest and chat summary workers hold a connection each
+    pool_size = app.config.get('DB_POOL_SIZE') or threads + 3
+    options.setdefault('pool_size', pool_size)
+    options.setdefault('max_overflow', app.config.get('DB_MAX_OVERFLOW', 5))
+    options.setdefault('pool_recycle', app.config.get('DB_POOL_RECYCLE', 1800))
+    options.setdefault('pool_pre_ping', True)
+    return options
+
+def create_app(config_name=None, threads=None):
+    """Application factory pattern
+    
+    Create one app per process: it owns the pooled database engine. Job
+    workers pass their concurrency as ``threads`` to size the pool.
+    """
     
     if config_name is None:
         config_name = os.environ.get('FLASK_ENV', 'development')
@@ -30,10 +55,15 @@ def create_app(config_name=None):
     # Test database connection and fallback to SQLite if needed
     try:
         from sqlalchemy import create_engine
-        engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'], 
+        from sqlalchemy.pool import NullPool
+        # A throwaway probe: the app's pooled engine is created by db.init_app
+        engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'], poolclass=NullPool,
                              connect_args={'connect_timeout': 2})
-        with engine.connect():
-            print(f"Connected to database: {app.config['SQLALCHEMY_DATABASE_URI']}")
+        try:
+            with engine.connect():
+                print(f"Connected to database: {app.config['SQLALCHEMY_DATABASE_URI']}")
+        finally:
+            engine.dispose()
     except (OperationalError, Exception) as e:
         print(f"PostgreSQL connection failed: {e}")
         print("Falling back to SQLite database...")
@@ -41,10 +71,50 @@ def create_app(config_name=None):
         print(f"Using SQLite: {app.config['SQLALCHEMY_DATABASE_URI']}")
     
     # Initialize extensions
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app, threads)
     db.init_app(app)
     migrate.init_app(app, db)
     CORS(app)
     
+    from app.services.chat_memory import chat_memory
+    from app.services.chunk_writer import chunk_writer
+    from app.services.curriculum_digest import curriculum_digest
+    from app.services.document_counts import document_counts
+    from app.services.http_client import http_client
+    from app.services.ingestion_pipeline import ingestion_pipeline
+    from app.services.job_events import job_events
+    from app.services.job_queue import job_queue
+    from app.services.lesson_batch import lesson_batch_runner
+    from app.services.lesson_context import lesson_context
+    from app.services.lesson_index import lesson_indexer
+    from app.services.lesson_title_cache import lesson_title_cache
+    from app.services.llm_queue import llm_queue
+    from app.services.llm_router import llm_router
+    from app.services.ollama_client import ollama_client
+    from app.services.response_cache import response_cache
+    from app.services.resumable_upload import resumable_uploads
+    from app.services.settings_cache import settings_cache
+    from app.services.upload_stream import upload_receiver
+    chat_memory.init_app(app)
+    chunk_writer.init_app(app)
+    curriculum_digest.init_app(app)
+    document_counts.init_app(app)
+    http_client.init_app(app)
+    ingestion_pipeline.init_app(app)
+    job_events.init_app(app)
+    job_queue.init_app(app)
+    lesson_batch_runner.init_app(app)
+    lesson_context.init_app(app)
+    lesson_indexer.init_app(app)
+    lesson_title_cache.init_app(app)
+    llm_queue.init_app(app)
+    llm_router.init_app(app)
+    ollama_client.init_app(app)
+    response_cache.init_app(app)
+    resumable_uploads.init_app(app)
+    settings_cache.init_app(app)
+    upload_receiver.init_app(app)
+    
     # Create upload directory
     upload_dir = app.config['UPLOAD_FOLDER']
     if not os.path.exists(upload_dir):
@@ -69,4 +139,16 @@ def create_app(config_name=None):
     app.register_blueprint(prompt_api)  # Has its own url_prefix='/api/prompts'
     app.register_blueprint(onlyoffice_bp)
     
+    # Hear job events from worker processes, and refresh caches on their completions
+    if app.config.get('JOB_EVENTS_LISTEN'):
+        from app.services import document_ingestion  # noqa: F401  registers the cache refresh handler
+        job_events.start_listener(app)
+    
+    # Single-process setups can run job workers in the web process
+    if app.config.get('JOB_WORKERS_EMBEDDED'):
+        from app.services import document_ingestion  # noqa: F401  registers the ingestion handler
+        from app.services.job_queue import job_queue, WorkerPool
+        WorkerPool(app, job_queue, concurrency=app.config['JOB_WORKERS_EMBEDDED'],
+                   poll_interval=app.config.get('JOB_POLL_INTERVAL', 1.0)).start()
+    
     return app
\ No newline at end of file
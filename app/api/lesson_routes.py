@@ -2,11 +2,17 @@
 API routes for lesson note generation
 """
 
-from flask import Blueprint, request, jsonify
+import itertools
+import json
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from app.services.document_counts import document_counts
 from app.services.lesson_service import LessonNoteService
 from app.services.onlyoffice_api import onlyoffice_api
-from app.models import db, Document
-from sqlalchemy import text
+from app.services.llm_queue import LLMQueueRejected, rejection_response
+from app.services.lesson_batch import lesson_batch_runner, JOB_TYPE as LESSON_BATCH_JOB
+from app.services.lesson_index import lesson_indexer
+from app.models import db, Document, ProcessingJob
 
 lesson_bp = Blueprint('lessons', __name__)
 
@@ -24,27 +30,14 @@ def check_documents():
                 'error': 'Subject and class level are required'
             }), 400
         
-        # Count documents by type
-        query = text("""
-            SELECT 
-                COUNT(CASE WHEN metadata->>'type' = 'textbook' OR metadata->>'type' IS NULL THEN 1 END) as documents_count,
-                COUNT(CASE WHEN metadata->>'type' = 'curriculum' THEN 1 END) as curriculum_count,
-                COUNT(CASE WHEN metadata->>'type' = 'progression' THEN 1 END) as progression_count
-            FROM documents 
-            WHERE (metadata->>'class') = :class_level 
-            AND (metadata->>'subject') = :subject
-        """)
-        
-        result = db.session.execute(query, {
-            'class_level': class_level,
-            'subject': subject
-        }).fetchone()
+        # Count documents by type (cached per subject and class)
+        counts = document_counts.get(subject, class_level)
         
         return jsonify({
             'success': True,
-            'documents_count': result[0] or 0,
-            'curriculum_count': result[1] or 0,
-            'progression_count': result[2] or 0,
+            'documents_count': counts['documents_count'],
+            'curriculum_count': counts['curriculum_count'],
+            'progression_count': counts['progression_count'],
             'subject': subject,
             'class_level': class_level
         })
@@ -69,6 +62,17 @@ def load_lessons():
                 'error': 'Subject and class level are required'
             }), 400
         
+        # Lessons indexed at ingestion need no document scan or extraction
+        lessons = lesson_indexer.lessons(subject, class_level)
+        if lessons:
+            return jsonify({
+                'success': True,
+                'lessons': lessons,
+                'subject': subject,
+                'class_level': class_level,
+                'total_lessons': len(lessons)
+            })
+        
         lesson_service = LessonNoteService()
         
         # Get subject documents
@@ -89,7 +93,7 @@ def load_lessons():
                 'error': 'No progression documents found. Please upload curriculum progression data.'
             }), 404
         
-        lessons = lesson_service.extract_lesson_titles(progression_docs)
+        lessons = lesson_service.extract_lesson_titles(progression_docs, subject, class_level)
         
         if not lessons:
             return jsonify({
@@ -105,6 +109,8 @@ def load_lessons():
             'total_lessons': len(lessons)
         })
         
+    except LLMQueueRejected as e:
+        return rejection_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -152,39 +158,132 @@ def generate_lesson():
                 'error': lesson_note['error']
             }), 500
         
-        # Create OnlyOffice document
-        onlyoffice_result = lesson_service.create_onlyoffice_document(lesson_note)
+        result, status = publish_lesson_note(lesson_service, subject, class_level, lesson_note)
+        return jsonify(result), status
+        
+    except LLMQueueRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def publish_lesson_note(lesson_service, subject, class_level, lesson_note):
+    """Create the OnlyOffice document for a generated note and record it; returns (payload, status)"""
+    # Create OnlyOffice document
+    onlyoffice_result = lesson_service.create_onlyoffice_document(lesson_note)
+    
+    if not onlyoffice_result.get('success'):
+        return {
+            'success': False,
+            'error': f"Failed to create OnlyOffice document: {onlyoffice_result.get('error')}"
+        }, 500
+    
+    # Store lesson information in database
+    lesson_data = {
+        'title': lesson_note.get('lessonTitle', 'Untitled Lesson'),
+        'content': lesson_note.get('mainBody', ''),
+        'subject': subject,
+        'class_level': class_level,
+        'document_id': onlyoffice_result['document_id'],
+        'document_url': onlyoffice_result['document_url']
+    }
+    
+    storage_success = lesson_service.store_lesson_info(lesson_data)
+    
+    if not storage_success:
+        print("Warning: Failed to store lesson info in database")
+    
+    return {
+        'success': True,
+        'title': lesson_note.get('lessonTitle', 'Untitled Lesson'),
+        'document_id': onlyoffice_result['document_id'],
+        'edit_url': onlyoffice_result['document_url'],
+        'download_url': onlyoffice_result['download_url'],
+        'view_url': onlyoffice_result.get('view_url', onlyoffice_result['document_url']),
+        'lesson_note': lesson_note,
+        'generation_stats': lesson_service.last_generation_stats
+    }, 200
+
+@lesson_bp.route('/api/lessons/generate/stream', methods=['POST'])
+def generate_lesson_stream():
+    """Generate a single lesson note, streaming fields as NDJSON events while the model writes"""
+    try:
+        data = request.get_json()
+        subject = data.get('subject')
+        class_level = data.get('class_level')
+        lesson_info = data.get('lesson')
         
-        if not onlyoffice_result.get('success'):
+        if not all([subject, class_level, lesson_info]):
             return jsonify({
                 'success': False,
-                'error': f"Failed to create OnlyOffice document: {onlyoffice_result.get('error')}"
-            }), 500
+                'error': 'Subject, class level, and lesson information are required'
+            }), 400
         
-        # Store lesson information in database
-        lesson_data = {
-            'title': lesson_note.get('lessonTitle', 'Untitled Lesson'),
-            'content': lesson_note.get('mainBody', ''),
-            'subject': subject,
-            'class_level': class_level,
-            'document_id': onlyoffice_result['document_id'],
-            'document_url': onlyoffice_result['document_url']
-        }
+        lesson_service = LessonNoteService()
+        documents_data = lesson_service.get_subject_documents(subject, class_level)
+        
+        if not documents_data:
+            return jsonify({
+                'success': False,
+                'error': 'No documents found for this subject and class'
+            }), 404
+        
+        events = lesson_service.stream_lesson_note(
+            subject=subject,
+            class_level=class_level,
+            lesson_info=lesson_info,
+            documents=documents_data.get('documents', []),
+            curriculum=documents_data.get('curriculum_documents', [])
+        )
+        # Admission to the LLM queue happens here, so a full queue is still a 503
+        first = next(events)
+        
+    except LLMQueueRejected as e:
+        return rejection_response(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    def generate():
+        for event in itertools.chain([first], events):
+            if event['type'] == 'done':
+                try:
+                    result, _ = publish_lesson_note(lesson_service, subject, class_level, event['lesson_note'])
+                except Exception as e:
+                    result = {'success': False, 'error': str(e), 'lesson_note': event['lesson_note']}
+                event = dict(result, type='done')
+            yield json.dumps(event) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@lesson_bp.route('/api/lessons/batch', methods=['POST'])
+def start_lesson_batch():
+    """Start a background job generating many lesson notes for a subject and class"""
+    try:
+        data = request.get_json()
+        subject = data.get('subject')
+        class_level = data.get('class_level')
+        lessons = data.get('lessons')  # omit for every lesson in the progression
         
-        storage_success = lesson_service.store_lesson_info(lesson_data)
+        if not subject or not class_level:
+            return jsonify({
+                'success': False,
+                'error': 'Subject and class level are required'
+            }), 400
         
-        if not storage_success:
-            print("Warning: Failed to store lesson info in database")
+        job = lesson_batch_runner.create_job(subject, class_level, lessons)
+        lesson_batch_runner.start(job.id)
         
         return jsonify({
             'success': True,
-            'title': lesson_note.get('lessonTitle', 'Untitled Lesson'),
-            'document_id': onlyoffice_result['document_id'],
-            'edit_url': onlyoffice_result['document_url'],
-            'download_url': onlyoffice_result['download_url'],
-            'view_url': onlyoffice_result.get('view_url', onlyoffice_result['document_url']),
-            'lesson_note': lesson_note
-        })
+            'job_id': str(job.id),
+            'status_url': f"/api/lessons/batch/{job.id}"
+        }), 202
         
     except Exception as e:
         return jsonify({
@@ -192,6 +291,37 @@ def generate_lesson():
             'error': str(e)
         }), 500
 
+@lesson_bp.route('/api/lessons/batch/<job_id>', methods=['GET'])
+def get_lesson_batch(job_id):
+    """Progress and per-lesson status of a batch job"""
+    job = ProcessingJob.query.get(job_id)
+    if job is None or job.job_type != LESSON_BATCH_JOB:
+        return jsonify({'success': False, 'error': 'Batch job not found'}), 404
+    
+    summary = lesson_batch_runner.summarize(job)
+    summary['success'] = True
+    summary['active'] = lesson_batch_runner.is_active(job.id)
+    return jsonify(summary)
+
+@lesson_bp.route('/api/lessons/batch/<job_id>/resume', methods=['POST'])
+def resume_lesson_batch(job_id):
+    """Resume a failed or interrupted batch; completed lessons are not regenerated"""
+    job = ProcessingJob.query.get(job_id)
+    if job is None or job.job_type != LESSON_BATCH_JOB:
+        return jsonify({'success': False, 'error': 'Batch job not found'}), 404
+    
+    if job.status == 'completed':
+        return jsonify({'success': False, 'error': 'Batch job already completed'}), 409
+    
+    if not lesson_batch_runner.start(job.id):
+        return jsonify({'success': False, 'error': 'Batch job is already running'}), 409
+    
+    return jsonify({
+        'success': True,
+        'job_id': str(job.id),
+        'status_url': f"/api/lessons/batch/{job.id}"
+    }), 202
+
 @lesson_bp.route('/api/lessons/generated', methods=['POST'])
 def get_generated_lessons():
     """Get previously generated lessons for subject and class"""
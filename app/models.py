@@ -7,6 +7,10 @@ import uuid
 class Document(db.Model):
     """Document model for storing uploaded files and OCR results"""
     __tablename__ = 'documents'
+    __table_args__ = (
+        # Lesson generation looks documents up by subject, class and type
+        db.Index('ix_documents_subject_class_type', 'subject', 'class_level', 'document_type'),
+    )
     
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = db.Column(db.String(255), nullable=False)
@@ -14,6 +18,7 @@ class Document(db.Model):
     file_path = db.Column(db.String(500), nullable=False)
     file_size = db.Column(db.Integer)
     mime_type = db.Column(db.String(100))
+    content_hash = db.Column(db.String(64), index=True)  # SHA-256 of the file; identical uploads reuse chunks
     
     # Document classification for Cameroonian education system
     document_type = db.Column(db.String(50))  # 'curriculum', 'textbook', 'progression'
@@ -42,7 +47,7 @@ class DocumentChunk(db.Model):
     __tablename__ = 'document_chunks'
     
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    document_id = db.Column(UUID(as_uuid=True), db.ForeignKey('documents.id'), nullable=False)
+    document_id = db.Column(UUID(as_uuid=True), db.ForeignKey('documents.id'), nullable=False, index=True)
     
     # Chunk content
     content = db.Column(db.Text, nullable=False)
@@ -64,6 +69,11 @@ class ChatSession(db.Model):
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     session_name = db.Column(db.String(255))
     system_prompt = db.Column(db.Text)
+    
+    # Rolling summary of the messages that left the verbatim history window
+    summary = db.Column(db.Text)
+    summarized_message_count = db.Column(db.Integer, default=0)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -101,6 +111,10 @@ class SystemSettings(db.Model):
 class ProcessingJob(db.Model):
     """Background processing jobs tracking"""
     __tablename__ = 'processing_jobs'
+    __table_args__ = (
+        # Job queue claim: next pending job by priority, then age
+        db.Index('ix_processing_jobs_claim', 'status', 'priority', 'run_after'),
+    )
     
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     job_type = db.Column(db.String(50), nullable=False)  # 'ocr', 'embedding', 'sync'
@@ -109,12 +123,25 @@ class ProcessingJob(db.Model):
     # Job details
     document_id = db.Column(UUID(as_uuid=True), db.ForeignKey('documents.id'))
     progress = db.Column(db.Integer, default=0)
+    status_message = db.Column(db.String(255))
+    progress_detail = db.Column(db.JSON)  # per-stage counts, see ProgressTracker
+    estimated_duration = db.Column(db.Integer)  # seconds, elapsed plus remaining estimate
     error_message = db.Column(db.Text)
     result_data = db.Column(db.JSON)
     
+    # Job queue (see app/services/job_queue.py)
+    payload = db.Column(db.JSON)  # handler arguments
+    priority = db.Column(db.Integer, default=0)  # higher runs first
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)  # retry backoff
+    locked_by = db.Column(db.String(100))  # worker holding the job
+    locked_at = db.Column(db.DateTime)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     started_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Subject(db.Model):
     """Subjects in the Cameroonian education system"""
@@ -138,4 +165,51 @@ class ClassLevel(db.Model):
     education_section = db.Column(db.String(20))  # 'english', 'french', 'both'
     grade_number = db.Column(db.Integer)  # For ordering
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class LessonTitleCache(db.Model):
+    """Lesson lists extracted from a progression, keyed by its content and the model"""
+    __tablename__ = 'lesson_title_cache'
+    __table_args__ = (
+        db.UniqueConstraint('content_hash', 'model', name='uq_lesson_title_cache_hash_model'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False)  # sha256 of the progression text
+    model = db.Column(db.String(100), nullable=False)
+    subject = db.Column(db.String(100), index=True)
+    class_level = db.Column(db.String(50))
+    lessons = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class LessonChunkMap(db.Model):
+    """Best-matching textbook and curriculum chunks per progression lesson, built at ingestion"""
+    __tablename__ = 'lesson_chunk_map'
+    __table_args__ = (
+        db.UniqueConstraint('subject', 'class_level', 'lesson', name='uq_lesson_chunk_map_lesson'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(100), nullable=False)
+    class_level = db.Column(db.String(50), nullable=False)
+    lesson = db.Column(db.String(500), nullable=False)
+    position = db.Column(db.Integer, nullable=False, default=0)  # order in the progression
+    textbook_chunk_ids = db.Column(db.JSON, nullable=False, default=list)
+    curriculum_chunk_ids = db.Column(db.JSON, nullable=False, default=list)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CurriculumDigest(db.Model):
+    """Objectives digest of all curriculum documents of a subject and class"""
+    __tablename__ = 'curriculum_digests'
+    __table_args__ = (
+        db.UniqueConstraint('subject', 'class_level', name='uq_curriculum_digest_subject_class'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(100), nullable=False)
+    class_level = db.Column(db.String(50), nullable=False)
+    source_hash = db.Column(db.String(64), nullable=False)  # curriculum documents and versions summarized
+    model = db.Column(db.String(100), nullable=False)
+    digest = db.Column(db.Text, nullable=False)
+    section_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
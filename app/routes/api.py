@@ -1,10 +1,33 @@
 from flask import Blueprint, request, jsonify, current_app
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from app.models import Document, DocumentChunk, ChatSession, ChatMessage, ProcessingJob, SystemSettings
 from app.services.ocr_service import OCRService
 from app.services.embedding_service import EmbeddingService
+from app.services.large_file_service import LargeFileUploadService
 from app.services.llm_service import LLMService
 from app.services.onlyoffice_service import OnlyOfficeService
+from app.services.http_client import http_client
+from app.services.llm_queue import llm_queue, LLMQueueRejected, rejection_response
+from app.services.llm_router import llm_router
+from app.services.chat_memory import chat_memory
+from app.services.chunk_writer import chunk_writer
+from app.services.ollama_client import ollama_client
+from app.services.response_cache import response_cache
+from app.services.resumable_upload import resumable_uploads, UploadError
+from app.services.lesson_title_cache import lesson_title_cache
+from app.services.curriculum_digest import curriculum_digest
+from app.services.document_counts import document_counts
+from app.services.document_ingestion import enqueue_document, enqueue_clone, find_duplicate
+from app.services.ingestion_pipeline import ingestion_pipeline
+from app.services.job_events import job_events
+from app.services.job_queue import job_queue
+from app.services.lesson_context import lesson_context
+from app.services.lesson_index import lesson_indexer
+from app.services.progress_tracker import ProgressTracker
+from app.services.settings_cache import settings_cache, VERSION_KEY as SETTINGS_VERSION_KEY
+from app.services.single_flight import llm_single_flight
+from app.services.upload_stream import upload_receiver, InsufficientStorage
 from app import db
 import os
 import uuid
@@ -38,6 +61,65 @@ def health_check():
         'version': '1.0.0'
     })
 
+@api_bp.route('/metrics')
+def metrics():
+    """Runtime metrics for caches and outbound services"""
+    return jsonify({
+        'response_cache': response_cache.get_stats(),
+        'lesson_title_cache': lesson_title_cache.get_stats(),
+        'document_counts': document_counts.get_stats(),
+        'lesson_generation': lesson_context.get_stats(),
+        'lesson_index': lesson_indexer.get_stats(),
+        'curriculum_digest': curriculum_digest.get_stats(),
+        'settings_cache': settings_cache.get_stats(),
+        'job_queue': job_queue.get_stats(),
+        'ingestion_pipeline': ingestion_pipeline.get_stats(),
+        'job_events': job_events.get_stats(),
+        'chunk_writer': chunk_writer.get_stats(),
+        'uploads': upload_receiver.get_stats(),
+        'resumable_uploads': resumable_uploads.get_stats(),
+        'http_client': http_client.get_stats(),
+        'llm_queue': llm_queue.get_stats(),
+        'llm_coalescing': llm_single_flight.get_stats(),
+        'llm_router': llm_router.get_stats(),
+        'chat_memory': chat_memory.get_stats(),
+        'ollama': ollama_client.get_stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@api_bp.route('/llm/queue', methods=['GET'])
+def llm_queue_status():
+    """Current LLM dispatch queue depth and wait times"""
+    return jsonify(llm_queue.get_stats())
+
+@api_bp.route('/llm/queue/<ticket>', methods=['GET'])
+def llm_queue_position(ticket):
+    """Queue position for a request sent with the X-Request-Id header"""
+    position = llm_queue.get_position(ticket)
+    if position is None:
+        return jsonify({'ticket': ticket, 'state': 'unknown'}), 404
+    return jsonify(position)
+
+def validate_upload(filename, document_type):
+    """Error message for an upload that cannot be accepted, or None"""
+    if not filename:
+        return 'No file selected'
+    
+    if not document_type:
+        return 'Document type is required'
+    
+    # Validate document type
+    valid_types = {'curriculum', 'textbook', 'progression'}
+    if document_type not in valid_types:
+        return 'Invalid document type. Must be curriculum, textbook, or progression'
+    
+    # Validate file type - expanded for testing
+    allowed_extensions = {'pdf', 'png', 'jpg', 'jpeg', 'tiff', 'bmp', 'gif', 'txt', 'doc', 'docx'}
+    if not ('.' in filename and 
+            filename.rsplit('.', 1)[1].lower() in allowed_extensions):
+        return f'File type not supported. Allowed: {", ".join(allowed_extensions)}'
+    return None
+
 @api_bp.route('/upload', methods=['POST'])
 def upload_document():
     """Upload a document and start background processing"""
@@ -51,79 +133,166 @@ def upload_document():
     subject = request.form.get('subject')
     class_level = request.form.get('class_level')
     
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+    error = validate_upload(file.filename, document_type)
+    if error:
+        return jsonify({'error': error}), 400
     
-    if not document_type:
-        return jsonify({'error': 'Document type is required'}), 400
+    try:
+        # Save file, hashed while it is written
+        file_info, error = LargeFileUploadService().save_file(file, current_app.config['UPLOAD_FOLDER'])
+        if error:
+            raise Exception(error)
+        return jsonify(register_upload(file_info, document_name, document_type, subject, class_level)), 200
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Upload failed: {str(e)}")
+        return jsonify({'error': f'Upload failed: {str(e)}'}), 500
+
+def register_upload(file_info, document_name, document_type, subject, class_level):
+    """Create the document for a saved upload and queue its processing; returns the response body"""
+    filename = file_info['original_name']
+    file_path = file_info['file_path']
     
-    # Validate document type
-    valid_types = {'curriculum', 'textbook', 'progression'}
-    if document_type not in valid_types:
-        return jsonify({'error': 'Invalid document type. Must be curriculum, textbook, or progression'}), 400
+    # The same file was uploaded and processed before: reuse its text and chunks
+    duplicate = find_duplicate(file_info['file_hash'])
+    if duplicate and os.path.exists(duplicate.file_path):
+        os.remove(file_path)
+        file_path = duplicate.file_path
     
-    # Validate file type - expanded for testing
-    allowed_extensions = {'pdf', 'png', 'jpg', 'jpeg', 'tiff', 'bmp', 'gif', 'txt', 'doc', 'docx'}
-    if not ('.' in file.filename and 
-            file.filename.rsplit('.', 1)[1].lower() in allowed_extensions):
-        return jsonify({'error': f'File type not supported. Allowed: {", ".join(allowed_extensions)}'}), 400
+    # Create document record with new fields
+    document = Document(
+        name=document_name,
+        filename=filename,
+        file_path=file_path,
+        file_size=file_info['file_size'],
+        mime_type=file_info['mime_type'],
+        content_hash=file_info['file_hash'],
+        document_type=document_type,
+        subject=subject,
+        class_level=class_level,
+        processing_status='processing'  # Set to processing immediately
+    )
+    
+    db.session.add(document)
+    db.session.commit()
+    
+    # A re-upload supersedes earlier versions of the same document
+    previous_versions = Document.query.filter(
+        Document.name == document_name,
+        Document.id != document.id
+    ).with_entities(Document.id).all()
+    for (previous_id,) in previous_versions:
+        response_cache.invalidate_document(previous_id)
     
+    # A new progression means the lesson list must be extracted again
+    if document_type == 'progression':
+        lesson_title_cache.invalidate(subject, class_level)
+    # A curriculum change makes the objectives digest stale
+    elif document_type == 'curriculum':
+        curriculum_digest.invalidate(subject, class_level)
+    document_counts.invalidate(subject, class_level)
+    
+    # Queue OCR and embeddings, or the copy of a duplicate's chunks; job queue workers (worker.py) pick it up
+    if duplicate:
+        enqueue_clone(document, duplicate)
+    else:
+        enqueue_document(document, file_path, document_name, filename, document_type)
+    
+    # Return immediately with document info
+    return {
+        'success': True,
+        'message': ('Identical document already processed. Reusing its extracted text and chunks.' if duplicate
+                    else 'Document uploaded successfully. Processing queued in background.'),
+        'document_id': str(document.id),
+        'filename': filename,
+        'file_size': document.file_size,
+        'content_hash': document.content_hash,
+        'duplicate_of': str(duplicate.id) if duplicate else None,
+        'processing_status': 'processing',
+        'estimated_time': 'under a minute' if duplicate else estimate_processing_time(document.file_size)
+    }
+
+@api_bp.route('/uploads', methods=['POST'])
+def start_resumable_upload():
+    """Start a resumable upload: the file is then sent in chunks with PUT /api/uploads/<id>"""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename', '')
+    document_type = data.get('document_type')
+    
+    error = validate_upload(filename, document_type)
+    if error:
+        return jsonify({'error': error}), 400
     try:
-        # Save file
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 
-                                str(uuid.uuid4()) + '_' + filename)
-        file.save(file_path)
-        
-        # Create document record with new fields
-        document = Document(
-            name=document_name,
-            filename=filename,
-            file_path=file_path,
-            file_size=os.path.getsize(file_path),
-            mime_type=file.content_type,
-            document_type=document_type,
-            subject=subject,
-            class_level=class_level,
-            processing_status='processing'  # Set to processing immediately
-        )
-        
-        db.session.add(document)
-        db.session.commit()
-        
-        # Create processing job
-        job = ProcessingJob(
-            job_type='ocr',
-            document_id=document.id,
-            status='pending'
-        )
-        db.session.add(job)
-        db.session.commit()
-        
-        # Start background processing (non-blocking)
-        import threading
-        processing_thread = threading.Thread(
-            target=process_document_background,
-            args=(document.id, file_path, document_name, filename, document_type),
-            daemon=True
-        )
-        processing_thread.start()
-        
-        # Return immediately with document info
-        return jsonify({
-            'success': True,
-            'message': 'Document uploaded successfully. Processing started in background.',
-            'document_id': str(document.id),
-            'filename': filename,
-            'file_size': document.file_size,
-            'processing_status': 'processing',
-            'estimated_time': estimate_processing_time(document.file_size)
-        }), 200
-        
+        size = int(data.get('size') or 0)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'File size must be a number of bytes'}), 400
+    
+    metadata = {
+        'document_name': data.get('document_name') or filename,
+        'document_type': document_type,
+        'subject': data.get('subject'),
+        'class_level': data.get('class_level'),
+        'mime_type': data.get('mime_type')
+    }
+    try:
+        upload = resumable_uploads.create(filename, size, metadata, sha256=data.get('sha256'))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(upload), 201
+
+@api_bp.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Write the request body at ``?offset=`` bytes into the file; returns the ranges received so far"""
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'offset is required'}), 400
+    try:
+        upload = resumable_uploads.write_chunk(upload_id, offset, request.stream, request.content_length)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(upload)
+
+@api_bp.route('/uploads/<upload_id>', methods=['GET'])
+def resumable_upload_status(upload_id):
+    """Ranges received so far, for a client resuming an interrupted upload"""
+    try:
+        return jsonify(resumable_uploads.status(upload_id))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+@api_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+def finalize_resumable_upload(upload_id):
+    """Assemble a fully received upload and hand it to document processing"""
+    try:
+        file_info, metadata = resumable_uploads.finalize(upload_id)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    try:
+        return jsonify(register_upload(file_info, metadata['document_name'], metadata['document_type'],
+                                       metadata['subject'], metadata['class_level'])), 200
     except Exception as e:
         print(f"Upload failed: {str(e)}")
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
+@api_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+def cancel_resumable_upload(upload_id):
+    """Abandon a resumable upload and delete what was received"""
+    try:
+        resumable_uploads.discard(upload_id)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify({'success': True})
+
+@api_bp.errorhandler(RequestEntityTooLarge)
+@api_bp.errorhandler(InsufficientStorage)
+def upload_rejected(error):
+    """Upload limits hit while the body was being received"""
+    print(f"⚠️ Upload rejected: {error.description}")
+    return jsonify({'error': error.description}), error.code
+
 def estimate_processing_time(file_size_bytes):
     """Estimate processing time based on file size"""
     file_size_mb = file_size_bytes / (1024 * 1024)
@@ -138,111 +307,34 @@ def estimate_processing_time(file_size_bytes):
     else:
         return "30-60 minutes"
 
-def process_document_background(document_id, file_path, document_name, filename, document_type):
-    """Process document OCR and embeddings in background thread"""
-    from app import create_app
+def document_status(document):
+    """Processing status of a document, for status polls and event stream snapshots"""
+    # Get processing job status
+    job = (ProcessingJob.query.filter(ProcessingJob.document_id == document.id,
+                                      ProcessingJob.job_type.in_(['ocr', 'clone']))
+           .order_by(ProcessingJob.created_at.desc()).first())
     
-    # Create new app context for background thread
-    app = create_app()
-    with app.app_context():
-        try:
-            print(f"Background processing started for document: {document_id}")
-            
-            # Get document from database
-            document = Document.query.get(document_id)
-            if not document:
-                print(f"Document {document_id} not found in database")
-                return
-            
-            # Update job status
-            job = ProcessingJob.query.filter_by(document_id=document_id, job_type='ocr').first()
-            if job:
-                job.status = 'processing'
-                db.session.commit()
-            
-            # Process OCR with timeout handling
-            import time
-            start_time = time.time()
-            
-            try:
-                print(f"Starting OCR processing for document: {document_id} (Size: {document.file_size} bytes)")
-                
-                ocr_service = OCRService()
-                extracted_text = ocr_service.process_document(file_path)
-                processing_time = time.time() - start_time
-                
-                print(f"OCR completed for document: {document_id} in {processing_time:.2f} seconds")
-                
-                if not extracted_text or len(extracted_text.strip()) < 3:
-                    # If OCR failed or returned minimal text, use filename as fallback
-                    extracted_text = f"Document: {document_name}\nFile: {filename}\nType: {document_type}"
-                    print(f"OCR returned minimal text, using fallback for document: {document_id}")
-            
-            except Exception as ocr_error:
-                print(f"OCR processing failed for document {document_id}: {ocr_error}")
-                # Use fallback text if OCR fails
-                extracted_text = f"Document: {document_name}\nFile: {filename}\nType: {document_type}\nOCR Error: {str(ocr_error)}"
-            
-            # Update document with OCR results
-            document.extracted_text = extracted_text
-            document.ocr_method = 'tesseract'
-            
-            # Create text chunks and embeddings
-            try:
-                print(f"Starting embedding generation for document: {document_id}")
-                embedding_service = EmbeddingService()
-                chunks = embedding_service.create_chunks(extracted_text)
-                print(f"Created {len(chunks)} chunks for document: {document_id}")
-                
-                successful_chunks = 0
-                
-                for i, chunk_text in enumerate(chunks):
-                    try:
-                        embedding = embedding_service.get_embedding(chunk_text)
-                        
-                        chunk = DocumentChunk(
-                            document_id=document_id,
-                            content=chunk_text,
-                            chunk_index=i,
-                            embedding=embedding
-                        )
-                        db.session.add(chunk)
-                        successful_chunks += 1
-                        
-                        # Progress update for large documents
-                        if len(chunks) > 20 and (i + 1) % 20 == 0:
-                            print(f"Embedding progress: {i + 1}/{len(chunks)} chunks processed")
-                        
-                    except Exception as chunk_error:
-                        print(f"Failed to process chunk {i} for document {document_id}: {chunk_error}")
-                        continue
-                
-                total_time = time.time() - start_time
-                print(f"Processing completed in {total_time/60:.1f} minutes. Successfully processed {successful_chunks}/{len(chunks)} chunks for document: {document_id}")
-                
-            except Exception as embedding_error:
-                print(f"Embedding processing failed for document {document_id}: {embedding_error}")
-            
-            # Mark as completed
-            document.processing_status = 'completed'
-            if job:
-                job.status = 'completed'
-            
-            db.session.commit()
-            print(f"Document {document_id} processing completed successfully")
-            
-        except Exception as e:
-            print(f"Background processing failed for document {document_id}: {str(e)}")
-            
-            # Mark as failed
-            if 'document' in locals():
-                document.processing_status = 'failed'
-            if 'job' in locals() and job:
-                job.status = 'failed'
-                job.error_message = str(e)
-            
-            db.session.commit()
-
+    # Count chunks if processing is completed; finished jobs record how many they wrote
+    chunk_count = 0
+    if document.processing_status == 'completed':
+        result = (job.result_data or {}) if job and job.status == 'completed' else {}
+        chunk_count = result.get('chunks')
+        if chunk_count is None:
+            chunk_count = DocumentChunk.query.filter_by(document_id=document.id).count()
+    
+    return {
+        'document_id': str(document.id),
+        'filename': document.filename,
+        'processing_status': document.processing_status,
+        'job_status': job.status if job else 'unknown',
+        'job_id': str(job.id) if job else None,
+        'progress': ProgressTracker.describe(job) if job else None,
+        'error_message': job.error_message if job and job.error_message else None,
+        'chunk_count': chunk_count,
+        'file_size': document.file_size,
+        'created_at': document.created_at.isoformat(),
+        'extracted_text_length': len(document.extracted_text) if document.extracted_text else 0
+    }
 
 @api_bp.route('/document-status/<document_id>', methods=['GET'])
 def get_document_status(document_id):
@@ -252,29 +344,58 @@ def get_document_status(document_id):
         if not document:
             return jsonify({'error': 'Document not found'}), 404
         
-        # Get processing job status
-        job = ProcessingJob.query.filter_by(document_id=document_id, job_type='ocr').first()
-        
-        # Count chunks if processing is completed
-        chunk_count = 0
-        if document.processing_status == 'completed':
-            chunk_count = DocumentChunk.query.filter_by(document_id=document_id).count()
-        
-        return jsonify({
-            'document_id': str(document.id),
-            'filename': document.filename,
-            'processing_status': document.processing_status,
-            'job_status': job.status if job else 'unknown',
-            'error_message': job.error_message if job and job.error_message else None,
-            'chunk_count': chunk_count,
-            'file_size': document.file_size,
-            'created_at': document.created_at.isoformat(),
-            'extracted_text_length': len(document.extracted_text) if document.extracted_text else 0
-        }), 200
+        return jsonify(document_status(document)), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def event_stream(snapshot, matches, until=None):
+    """SSE response over the job event bus; 503 when every stream slot is taken"""
+    def current_state():
+        try:
+            return snapshot()
+        finally:
+            # Streams hold a server thread, not a database connection
+            db.session.close()
+    
+    response = job_events.response(current_state, matches, request.headers.get('Last-Event-ID'), until)
+    if response is None:
+        response = jsonify({'error': 'Too many open event streams, poll the status endpoint instead'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    return response
+
+@api_bp.route('/documents/<document_id>/events', methods=['GET'])
+def document_events(document_id):
+    """Push status and progress of one document as Server-Sent Events until it is processed"""
+    document = Document.query.get(document_id)
+    if not document:
+        return jsonify({'error': 'Document not found'}), 404
+    document_id = str(document.id)
+    db.session.close()
+    
+    def snapshot():
+        document = Document.query.get(document_id)
+        return document_status(document) if document else {'document_id': document_id, 'processing_status': 'deleted'}
+    
+    return event_stream(
+        snapshot,
+        matches=lambda event: event.get('document_id') == document_id,
+        until=lambda event: event['type'] == 'document' and event.get('status') in ('completed', 'failed')
+    )
+
+@api_bp.route('/events', methods=['GET'])
+def ingestion_events():
+    """Push status and progress of every background job as Server-Sent Events"""
+    def snapshot():
+        active = (ProcessingJob.query.filter(ProcessingJob.status.in_(['pending', 'running']))
+                  .order_by(ProcessingJob.created_at).limit(100).all())
+        return {'jobs': [dict(ProgressTracker.describe(job), job_type=job.job_type,
+                              document_id=str(job.document_id) if job.document_id else None)
+                         for job in active]}
+    
+    return event_stream(snapshot, matches=lambda event: True)
+
 @api_bp.route('/documents', methods=['GET'])
 def list_documents():
     """Get list of processed documents"""
@@ -390,9 +511,8 @@ def chat():
     
     try:
         # Get or create chat session
-        if session_id:
-            session = ChatSession.query.get(session_id)
-        else:
+        session = ChatSession.query.get(session_id) if session_id else None
+        if session is None:
             session = ChatSession(session_name=f"Chat {datetime.now().strftime('%Y-%m-%d %H:%M')}")
             db.session.add(session)
             db.session.commit()
@@ -400,6 +520,7 @@ def chat():
         # Initialize context variables
         context = ""
         context_results = []
+        retrieved_ids = None  # Only document-backed answers are cacheable
         
         try:
             # Enhanced context building for chunk-related queries
@@ -450,6 +571,7 @@ def chat():
                     if relevant_docs:
                         context = "\n\n".join([f"From {doc.name}: {doc.extracted_text[:500]}..." 
                                              for doc in relevant_docs])
+                    retrieved_ids = [str(doc.id) for doc in relevant_docs]
                     
                 except Exception as context_error:
                     print(f"Context retrieval failed: {context_error}")
@@ -489,12 +611,27 @@ Your role is to:
 When provided with document context, use it to give accurate, helpful responses. If no context is available, provide general educational assistance while being clear about the limitations."""
             
             # Try to generate response with LLM
+            # Bounded prior conversation: rolling summary plus the last few turns
+            try:
+                history = chat_memory.build_history(session)
+            except Exception as history_error:
+                print(f"Chat history unavailable: {history_error}")
+                history = []
+            
             print(f"🤖 Generating LLM response using {llm_service.provider}")
-            response = llm_service.generate_response(message, context, system_prompt)
-            print("✅ LLM response generated successfully")
+            response = llm_service.generate_response(message, context, system_prompt,
+                                                     chunk_ids=retrieved_ids, history=history)
+            response_cached = llm_service.last_cache_hit
+            response_provider = llm_service.last_provider
+            print("✅ LLM response served from cache" if response_cached else f"✅ LLM response generated by {response_provider}")
             
+        except LLMQueueRejected as queue_error:
+            print(f"⏳ LLM queue rejected chat request: {queue_error}")
+            return rejection_response(queue_error)
         except Exception as llm_error:
             print(f"⚠️ LLM generation failed: {llm_error}")
+            response_cached = False
+            response_provider = None
             
             # Provide intelligent fallback responses based on the query
             if "last document" in message.lower() or "recent document" in message.lower():
@@ -660,13 +797,16 @@ Or check if the Ollama service is running for full AI capabilities."""
                 session_id=session.id,
                 role='assistant',
                 content=response,
-                retrieved_chunks=[]  # Simplified for now
+                retrieved_chunks=retrieved_ids or []
             )
             
             db.session.add(user_message)
             db.session.add(assistant_message)
             db.session.commit()
             
+            # Fold turns that left the history window into the summary, off the request path
+            chat_memory.schedule_update(session.id)
+            
         except Exception as db_error:
             print(f"Failed to save chat messages: {db_error}")
             # Continue anyway - don't let database issues prevent the response
@@ -674,7 +814,9 @@ Or check if the Ollama service is running for full AI capabilities."""
         return jsonify({
             'response': response,
             'session_id': str(session.id),
-            'context_used': 0,  # Simplified for now
+            'context_used': len(retrieved_ids or []),
+            'cached': response_cached,
+            'provider': response_provider,
             'timestamp': datetime.now().isoformat()
         })
         
@@ -731,18 +873,14 @@ def onlyoffice_status():
     
     try:
         # Get OnlyOffice settings from database
-        from app.models import SystemSettings
-        settings = {s.key: s.value for s in SystemSettings.query.all()}
-        
-        onlyoffice_url = settings.get('onlyoffice_url', 'http://localhost:8000')
+        onlyoffice_url = settings_cache.get('onlyoffice_url', 'http://localhost:8000')
         
         # Test connection to OnlyOffice server
         try:
             if not REQUESTS_AVAILABLE:
                 raise ImportError("requests library not available")
                 
-            import requests
-            response = requests.get(f"{onlyoffice_url}/healthcheck", timeout=5)
+            response = http_client.get(f"{onlyoffice_url}/healthcheck", timeout=5)
             connected = response.status_code == 200
         except Exception as e:
             connected = False
@@ -907,9 +1045,12 @@ def reprocess_document(doc_id):
         document.ocr_method = None
         
         db.session.commit()
+        response_cache.invalidate_document(document.id)
+        if document.document_type == 'progression':
+            lesson_title_cache.invalidate(document.subject, document.class_level)
         
-        # Here you would trigger the actual reprocessing
-        # For now, we'll just mark it as pending
+        enqueue_document(document, document.file_path, document.name, document.filename,
+                         document.document_type)
         
         return jsonify({'success': True, 'message': 'Document queued for reprocessing'})
         
@@ -974,10 +1115,7 @@ def export_settings():
     """Export all settings as JSON"""
     
     try:
-        settings = SystemSettings.query.all()
-        settings_dict = {s.key: s.value for s in settings}
-        
-        response = jsonify(settings_dict)
+        response = jsonify(settings_cache.all())
         response.headers['Content-Disposition'] = 'attachment; filename=ocr_agent_settings.json'
         return response
         
@@ -1000,6 +1138,9 @@ def import_settings():
         settings_data = json.load(file)
         
         for key, value in settings_data.items():
+            # The version counter belongs to this database, not to the export
+            if key == SETTINGS_VERSION_KEY:
+                continue
             setting = SystemSettings.query.filter_by(key=key).first()
             if setting:
                 setting.value = value
@@ -1021,14 +1162,7 @@ def manage_settings():
     from app.models import SystemSettings
     
     if request.method == 'GET':
-        settings = SystemSettings.query.all()
-        return jsonify({
-            setting.key: {
-                'value': setting.value,
-                'description': setting.description,
-                'type': setting.setting_type
-            } for setting in settings
-        })
+        return jsonify(settings_cache.describe())
     
     elif request.method == 'POST':
         data = request.get_json()
@@ -1076,13 +1210,20 @@ def get_job_status(job_id):
     
     job = ProcessingJob.query.get_or_404(job_id)
     
+    progress = ProgressTracker.describe(job)
     return jsonify({
         'id': str(job.id),
         'job_type': job.job_type,
         'status': job.status,
         'progress': job.progress,
+        'message': progress['message'],
+        'stage': progress['stage'],
+        'stages': progress['stages'],
+        'eta_seconds': progress['eta_seconds'],
+        'attempts': job.attempts,
         'error_message': job.error_message,
         'created_at': job.created_at.isoformat(),
+        'updated_at': progress['updated_at'],
         'completed_at': job.completed_at.isoformat() if job.completed_at else None
     })
 
@@ -1239,6 +1380,8 @@ def generate_lesson():
             
             return jsonify(result)
             
+        except LLMQueueRejected as e:
+            return rejection_response(e)
         except Exception as e:
             return jsonify({
                 'success': False,
@@ -1276,24 +1419,26 @@ def extract_lesson_titles():
         # Get documents and extract lesson titles
         try:
             subject_data = lesson_service.get_subject_documents(subject, class_level)
-            documents = subject_data.get('documents', []) or []
+            progression = subject_data.get('progression_documents', []) or []
             
-            if not documents:
+            if not progression:
                 return jsonify({
                     'success': True,
                     'lessons': [],
                     'message': 'No documents found for the specified subject and class'
                 })
             
-            # Extract lesson titles using AI
-            lesson_titles = lesson_service.extract_lesson_titles(documents)
+            # Extract lesson titles from the progression text
+            lesson_titles = lesson_service.extract_lesson_titles(progression, subject, class_level)
             
             return jsonify({
                 'success': True,
                 'lessons': lesson_titles,
-                'document_count': len(documents)
+                'document_count': sum(subject_data.get('counts', {}).values())
             })
             
+        except LLMQueueRejected as e:
+            return rejection_response(e)
         except Exception as e:
             return jsonify({
                 'success': False,
@@ -1313,21 +1458,16 @@ def get_ollama_models():
     """Get available Ollama models"""
     
     try:
-        import requests
         from flask import current_app
         
         # Get Ollama URL from settings or config
         try:
-            ollama_url = SystemSettings.query.filter_by(key='llm_base_url').first()
-            if ollama_url:
-                base_url = ollama_url.value
-            else:
-                base_url = current_app.config.get('OLLAMA_URL', 'http://localhost:11434')
+            base_url = settings_cache.get('llm_base_url') or current_app.config.get('OLLAMA_URL', 'http://localhost:11434')
         except:
             base_url = 'http://localhost:11434'
         
         # Fetch models from Ollama
-        response = requests.get(f"{base_url}/api/tags", timeout=10)
+        response = http_client.get(f"{base_url}/api/tags", timeout=10)
         
         if response.status_code == 200:
             data = response.json()
@@ -1404,7 +1544,7 @@ def save_ai_settings():
         # Test the connection with new settings if it's Ollama
         if ai_settings['llm_provider'] == 'ollama':
             try:
-                response = requests.get(f"{ai_settings['llm_base_url']}/api/tags", timeout=5)
+                response = http_client.get(f"{ai_settings['llm_base_url']}/api/tags", timeout=5)
                 connection_test = response.status_code == 200
             except:
                 connection_test = False
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, jsonify, current_app
-from app.models import Document, DocumentChunk, SystemSettings, ChatSession
+from app.models import Document, DocumentChunk, ChatSession
 from app import db
+from app.services.settings_cache import settings_cache
 import os
 from sqlalchemy.exc import OperationalError
 
@@ -19,7 +20,7 @@ def dashboard():
         chunk_count = DocumentChunk.query.count()
         
         # Get system settings
-        settings = {s.key: s.value for s in SystemSettings.query.all()}
+        settings = settings_cache.all()
         
         # Get session count for dashboard stats
         session_count = ChatSession.query.count()
@@ -68,7 +69,7 @@ def table_panel():
 def settings_panel():
     """Panel 3: System settings configuration with full GUI"""
     try:
-        settings_dict = {s.key: s.value for s in SystemSettings.query.all()}
+        settings_dict = settings_cache.all()
     except OperationalError:
         settings_dict = {}
     return render_template('settings_panel.html', settings=settings_dict)
@@ -86,7 +87,7 @@ def database_panel():
         chunk_count = DocumentChunk.query.count()
         
         # Get system settings
-        settings = {s.key: s.value for s in SystemSettings.query.all()}
+        settings = settings_cache.all()
         
         database_status = 'connected'
         database_error = None
@@ -117,8 +118,7 @@ def chatbot_panel():
 def prompt_panel():
     """Panel 6: Prompt configuration"""
     # Get current system prompt from settings
-    system_prompt_setting = SystemSettings.query.filter_by(key='system_prompt').first()
-    current_prompt = system_prompt_setting.value if system_prompt_setting else ""
+    current_prompt = settings_cache.get('system_prompt', "")
     
     return render_template('panels/prompt.html', current_prompt=current_prompt)
 
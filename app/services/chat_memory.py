@@ -0,0 +1,167 @@
+"""
+Chat Memory
+Bounded conversation history for /api/chat: the last N turns verbatim plus a
+rolling summary of everything older, folded in the background after each reply
+"""
+
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional
+
+from app.models import db, ChatSession, ChatMessage
+
+SUMMARY_SYSTEM_PROMPT = """You maintain a running summary of a conversation between a teacher and an AI assistant.
+Merge the new turns into the existing summary. Keep names, subjects, classes, documents and decisions;
+drop greetings and repetition. Reply with the updated summary only, as plain text."""
+
+
+class ChatMemory:
+    """Builds bounded history for a chat session and keeps its summary current"""
+
+    def __init__(self, recent_turns: int = 4, message_max_chars: int = 2000,
+                 summary_max_chars: int = 2000, enabled: bool = True,
+                 summarizer: Optional[Callable[[str, str], str]] = None):
+        self.recent_turns = recent_turns
+        self.message_max_chars = message_max_chars
+        self.summary_max_chars = summary_max_chars
+        self.enabled = enabled
+        self.summarizer = summarizer or self._llm_summarize
+
+        self._app = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chat-summary')
+        self._lock = threading.Lock()
+        self._pending = set()
+        self.updates = 0
+        self.failures = 0
+
+    def init_app(self, app):
+        """Apply memory settings from the Flask config"""
+        self._app = app
+        self.enabled = app.config.get('CHAT_MEMORY_ENABLED', self.enabled)
+        self.recent_turns = app.config.get('CHAT_HISTORY_TURNS', self.recent_turns)
+        self.message_max_chars = app.config.get('CHAT_HISTORY_MESSAGE_MAX_CHARS', self.message_max_chars)
+        self.summary_max_chars = app.config.get('CHAT_SUMMARY_MAX_CHARS', self.summary_max_chars)
+
+    @property
+    def window(self) -> int:
+        """Number of messages (user + assistant) kept verbatim"""
+        return self.recent_turns * 2
+
+    def build_history(self, session: ChatSession) -> List[Dict[str, str]]:
+        """History messages for the next prompt, bounded regardless of session length
+
+        Returns the rolling summary (as a system message) followed by the last
+        N turns. Messages between the summary and the verbatim window, which
+        exist only while a background update is catching up, are left out.
+        """
+        if not self.enabled or session is None:
+            return []
+
+        recent = (ChatMessage.query
+                  .filter_by(session_id=session.id)
+                  .order_by(ChatMessage.created_at.desc())
+                  .limit(self.window)
+                  .all())
+
+        history = []
+        if session.summary:
+            history.append({'role': 'system',
+                            'content': f"Summary of the earlier conversation:\n{session.summary}"})
+        for message in reversed(recent):
+            if message.role not in ('user', 'assistant'):
+                continue
+            history.append({'role': message.role,
+                            'content': self._truncate(message.content, self.message_max_chars)})
+        return history
+
+    @staticmethod
+    def digest(history: Optional[List[Dict[str, str]]]) -> str:
+        """Short stable hash of a history, for cache and coalescing keys"""
+        if not history:
+            return ""
+        raw = json.dumps(history, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+    def schedule_update(self, session_id) -> bool:
+        """Fold turns that left the verbatim window into the summary, in the background"""
+        if not self.enabled or self._app is None:
+            return False
+        with self._lock:
+            if session_id in self._pending:
+                return False
+            self._pending.add(session_id)
+        self._executor.submit(self._run_update, session_id)
+        return True
+
+    def _run_update(self, session_id):
+        try:
+            with self._app.app_context():
+                self.update_summary(session_id)
+        except Exception as e:
+            self.failures += 1
+            print(f"⚠️ Chat summary update failed for session {session_id}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(session_id)
+
+    def update_summary(self, session_id) -> bool:
+        """Incrementally summarise messages older than the verbatim window"""
+        session = ChatSession.query.get(session_id)
+        if session is None:
+            return False
+
+        total = ChatMessage.query.filter_by(session_id=session.id).count()
+        already = session.summarized_message_count or 0
+        fold_until = total - self.window
+        if fold_until <= already:
+            return False
+
+        # Only the turns not yet in the summary are sent to the model
+        new_messages = (ChatMessage.query
+                        .filter_by(session_id=session.id)
+                        .order_by(ChatMessage.created_at.asc())
+                        .offset(already)
+                        .limit(fold_until - already)
+                        .all())
+        transcript = "\n".join(
+            f"{'Teacher' if m.role == 'user' else 'Assistant'}: {self._truncate(m.content, self.message_max_chars)}"
+            for m in new_messages
+        )
+
+        summary = self.summarizer(session.summary or "", transcript)
+        session.summary = self._truncate(summary.strip(), self.summary_max_chars)
+        session.summarized_message_count = already + len(new_messages)
+        db.session.commit()
+        self.updates += 1
+        return True
+
+    def _llm_summarize(self, summary: str, transcript: str) -> str:
+        from app.services.llm_service import LLMService
+
+        prompt = (f"Existing summary:\n{summary or '(none)'}\n\n"
+                  f"New turns:\n{transcript}\n\n"
+                  f"Updated summary (at most {self.summary_max_chars} characters):")
+        return LLMService().generate_response(prompt, system_prompt=SUMMARY_SYSTEM_PROMPT)
+
+    @staticmethod
+    def _truncate(text: str, limit: int) -> str:
+        text = text or ""
+        return text if len(text) <= limit else text[:limit - 3] + "..."
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'enabled': self.enabled,
+            'recent_turns': self.recent_turns,
+            'summary_max_chars': self.summary_max_chars,
+            'summary_updates': self.updates,
+            'summary_failures': self.failures,
+            'pending_updates': pending
+        }
+
+
+# Global memory instance
+chat_memory = ChatMemory()
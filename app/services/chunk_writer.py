@@ -0,0 +1,184 @@
+"""
+Chunk Writer
+Bulk persistence of document chunks in fixed-size, separately committed
+batches: ``COPY`` on PostgreSQL, Core multi-row inserts elsewhere
+"""
+
+import csv
+import io
+import json
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+
+from sqlalchemy import insert
+
+from app.models import db, DocumentChunk
+
+COPY_COLUMNS = ('id', 'document_id', 'content', 'chunk_index', 'embedding', 'created_at')
+
+
+class DocumentChunkWriter:
+    """Buffers one document's chunks and writes them ``batch_size`` rows at a time
+
+    Rows are plain tuples, never ORM objects, and every batch is committed:
+    memory stays flat on huge documents and the chunks written so far
+    survive a crash later in the document.
+    """
+
+    def __init__(self, service: 'ChunkWriter', document_id, batch_size: int):
+        self.service = service
+        self.document_id = document_id
+        self.batch_size = batch_size
+        self.method = None
+
+        self._rows: List[Tuple[int, str, Any]] = []
+        self.rows = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    def write(self, chunks: List[Tuple[int, str, Any]]):
+        """Add ``(chunk_index, content, embedding)`` rows; full batches are written right away"""
+        self._rows.extend(chunks)
+        while len(self._rows) >= self.batch_size:
+            batch, self._rows = self._rows[:self.batch_size], self._rows[self.batch_size:]
+            self._flush(batch)
+
+    def close(self) -> Dict[str, Any]:
+        """Write the last partial batch; returns the write statistics"""
+        if self._rows:
+            batch, self._rows = self._rows, []
+            self._flush(batch)
+        stats = self.stats()
+        if self.rows:
+            print(f"💾 Wrote {self.rows} chunks for document {self.document_id} in {self.batches} batches "
+                  f"({stats['rows_per_second']} rows/s, {self.method})")
+        return stats
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'rows': self.rows,
+            'batches': self.batches,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows / self.seconds) if self.seconds else 0,
+            'method': self.method
+        }
+
+    def _flush(self, batch: List[Tuple[int, str, Any]]):
+        started = time.time()
+        if self.method is None:
+            self.method = 'copy' if self.service.can_copy() else 'insert'
+        if self.method == 'copy':
+            self.service.copy(self.document_id, batch)
+        else:
+            self.service.insert(self.document_id, batch)
+        db.session.commit()
+
+        elapsed = time.time() - started
+        self.rows += len(batch)
+        self.batches += 1
+        self.seconds += elapsed
+        self.service.record(len(batch), elapsed)
+
+
+class ChunkWriter:
+    """Creates per-document writers and keeps write throughput statistics"""
+
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    def init_app(self, app):
+        """Apply writer settings from the Flask config"""
+        self.batch_size = app.config.get('INGEST_WRITE_BATCH', self.batch_size)
+
+    def writer(self, document_id) -> DocumentChunkWriter:
+        return DocumentChunkWriter(self, document_id, self.batch_size)
+
+    @staticmethod
+    def can_copy() -> bool:
+        """PostgreSQL through psycopg2: the session's connection supports ``COPY``"""
+        dialect = db.session.connection().dialect
+        return dialect.name == 'postgresql' and dialect.driver == 'psycopg2'
+
+    @staticmethod
+    def insert(document_id, batch: List[Tuple[int, str, Any]]):
+        db.session.execute(insert(DocumentChunk.__table__), [
+            {'document_id': document_id, 'content': content, 'chunk_index': index, 'embedding': embedding}
+            for index, content, embedding in batch
+        ])
+
+    @staticmethod
+    def copy(document_id, batch: List[Tuple[int, str, Any]]):
+        # COPY runs on the session's own connection, so the batch commits with the session
+        dbapi_connection = db.session.connection().connection.dbapi_connection
+        with dbapi_connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {DocumentChunk.__tablename__} ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                copy_rows(document_id, batch)
+            )
+
+    def copy_document(self, source_document_id, document_id) -> Dict[str, Any]:
+        """Clone every chunk of one document onto another, a batch at a time
+
+        Used for duplicate uploads: the chunks and their embeddings are copied
+        instead of being produced again by OCR and the embedding model.
+        """
+        writer = self.writer(document_id)
+        last_index = -1
+        while True:
+            rows = (db.session.query(DocumentChunk.chunk_index, DocumentChunk.content, DocumentChunk.embedding)
+                    .filter(DocumentChunk.document_id == source_document_id,
+                            DocumentChunk.chunk_index > last_index)
+                    .order_by(DocumentChunk.chunk_index)
+                    .limit(self.batch_size)
+                    .all())
+            if not rows:
+                break
+            writer.write([tuple(row) for row in rows])
+            last_index = rows[-1][0]
+        return writer.close()
+
+    def record(self, rows: int, seconds: float):
+        with self._lock:
+            self.rows += rows
+            self.batches += 1
+            self.seconds += seconds
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'rows': self.rows,
+                'batches': self.batches,
+                'seconds': round(self.seconds, 2),
+                'rows_per_second': round(self.rows / self.seconds) if self.seconds else 0,
+                'batch_size': self.batch_size
+            }
+
+
+def copy_rows(document_id, batch: List[Tuple[int, str, Any]]) -> io.StringIO:
+    """``COPY ... FORMAT csv`` input for ``COPY_COLUMNS``"""
+    buffer = io.StringIO()
+    out = csv.writer(buffer)
+    now = datetime.utcnow().isoformat()
+    for index, content, embedding in batch:
+        out.writerow([
+            str(uuid.uuid4()),
+            str(document_id),
+            content,
+            index,
+            json.dumps(embedding) if embedding is not None else None,
+            now
+        ])
+    buffer.seek(0)
+    return buffer
+
+
+# Global writer instance
+chunk_writer = ChunkWriter()
@@ -0,0 +1,246 @@
+"""
+Curriculum Digest
+Map-reduce summarization of a subject's curriculum into one objectives digest
+per subject and class: sections are summarized in parallel (map), then the
+summaries are merged level by level until one digest fits the lesson prompt
+(reduce). Digests are stored and rebuilt only when curriculum documents change.
+"""
+
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional
+
+import requests
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.models import db, Document, CurriculumDigest
+from app.services.llm_queue import LLMQueueRejected
+from app.services.lesson_context import lesson_context, estimate_tokens
+from app.services.single_flight import SingleFlight
+
+MAP_PROMPT = """You summarize one section of an official school curriculum.
+Extract the learning objectives, competences, key content, methodology and evaluation criteria it states.
+Be faithful and concise; use short bullet points; do not invent anything. Reply with the bullet points only."""
+
+REDUCE_PROMPT = """You merge partial summaries of one school curriculum into a single objectives digest.
+Keep every distinct objective, competence and evaluation criterion; merge duplicates; keep the curriculum order.
+Use short bullet points grouped by theme, at most {max_words} words. Reply with the digest only."""
+
+
+class CurriculumDigester:
+    """Builds and caches the curriculum digest used by lesson note prompts
+
+    ``summarizer(instruction, text)`` returns the model's reply; by default it
+    calls Ollama through the lesson service (and so the LLM dispatch queue).
+    A digest is current while the curriculum documents' ids and versions
+    hash to its ``source_hash``; concurrent builds of one subject coalesce.
+    """
+
+    def __init__(self, section_tokens: int = 1500, max_tokens: int = 1000, parallel: int = 2,
+                 enabled: bool = True, summarizer: Optional[Callable[[str, str], str]] = None):
+        self.section_tokens = section_tokens
+        self.max_tokens = max_tokens
+        self.parallel = parallel
+        self.enabled = enabled
+        self.summarizer = summarizer
+
+        self._app = None
+        self._builds = SingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='curriculum-digest')
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+        self.failures = 0
+        self.summaries = 0
+
+    def init_app(self, app):
+        """Apply digest settings from the Flask config"""
+        self._app = app
+        self.enabled = app.config.get('CURRICULUM_DIGEST_ENABLED', self.enabled)
+        self.section_tokens = app.config.get('CURRICULUM_DIGEST_SECTION_TOKENS', self.section_tokens)
+        self.max_tokens = app.config.get('CURRICULUM_DIGEST_MAX_TOKENS', self.max_tokens)
+        self.parallel = app.config.get('CURRICULUM_DIGEST_PARALLEL', self.parallel)
+
+    @staticmethod
+    def source_hash(subject: str, class_level: str) -> Optional[str]:
+        """Hash of the curriculum documents and their versions; None without curriculum"""
+        rows = (db.session.query(Document.id, Document.updated_at, Document.processing_status)
+                .filter(Document.subject == subject, Document.class_level == class_level,
+                        Document.document_type == 'curriculum')
+                .all())
+        if not rows:
+            return None
+        raw = json.dumps(sorted([str(i), str(updated), status] for i, updated, status in rows))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, subject: str, class_level: str, service=None) -> Optional[str]:
+        """Current digest, built on demand; None when there is no curriculum or the build fails"""
+        if not self.enabled:
+            return None
+        try:
+            source_hash = self.source_hash(subject, class_level)
+            if source_hash is None:
+                return None
+            service = service or self._service()
+            model = service.ollama_model
+
+            entry = CurriculumDigest.query.filter_by(subject=subject, class_level=class_level).first()
+            if entry and entry.source_hash == source_hash and entry.model == model:
+                with self._lock:
+                    self.hits += 1
+                return entry.digest
+
+            key = SingleFlight.make_key('curriculum-digest', subject, class_level, source_hash, model)
+            return self._builds.do(key, lambda: self.build(subject, class_level, service, source_hash))
+        except (SQLAlchemyError, requests.RequestException, LLMQueueRejected, ValueError) as e:
+            # Database or LLM trouble degrades to raw curriculum chunks; programming errors surface
+            with self._lock:
+                self.failures += 1
+            print(f"⚠️ Curriculum digest unavailable for {subject} {class_level}: {e}")
+            return None
+
+    def build(self, subject: str, class_level: str, service=None, source_hash: Optional[str] = None) -> Optional[str]:
+        """Summarize the curriculum and store the digest"""
+        service = service or self._service()
+        source_hash = source_hash or self.source_hash(subject, class_level)
+        if source_hash is None:
+            return None
+
+        sections = self._sections(subject, class_level)
+        if not sections:
+            return None
+        summarize = self.summarizer or self._llm_summarizer(subject, class_level)
+
+        # Map: every section on its own, in parallel
+        summaries = self._parallel(summarize, MAP_PROMPT, sections)
+        # Reduce: merge groups that fit one section until a single digest remains
+        reduce_prompt = REDUCE_PROMPT.format(max_words=int(self.max_tokens * 0.6))
+        while len(summaries) > 1:
+            summaries = self._parallel(summarize, reduce_prompt, self._pack(summaries, self.section_tokens))
+        digest = summaries[0].strip()
+        if estimate_tokens(digest) > self.max_tokens:
+            digest = digest[:self.max_tokens * 3].rsplit('\n', 1)[0]
+
+        entry = CurriculumDigest.query.filter_by(subject=subject, class_level=class_level).first()
+        if entry is None:
+            entry = CurriculumDigest(subject=subject, class_level=class_level)
+            db.session.add(entry)
+        entry.source_hash = source_hash
+        entry.model = service.ollama_model
+        entry.digest = digest
+        entry.section_count = len(sections)
+        entry.created_at = datetime.utcnow()
+        db.session.commit()
+
+        with self._lock:
+            self.builds += 1
+        print(f"📚 Curriculum digest built for {subject} {class_level}: "
+              f"{len(sections)} sections -> {estimate_tokens(digest)} tokens")
+        return digest
+
+    def _parallel(self, summarize, instruction: str, texts: List[str]) -> List[str]:
+        if len(texts) == 1:
+            results = [summarize(instruction, texts[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, self.parallel),
+                                    thread_name_prefix='curriculum-map') as executor:
+                results = list(executor.map(lambda text: summarize(instruction, text), texts))
+        with self._lock:
+            self.summaries += len(texts)
+        if not all(r and r.strip() for r in results):
+            raise ValueError("Empty curriculum summary")
+        return results
+
+    def _sections(self, subject: str, class_level: str) -> List[str]:
+        """Curriculum text in sections of at most ``section_tokens``"""
+        pieces = [c['content'] for c in lesson_context.stored_chunks(subject, class_level, curriculum=True)]
+        if not pieces:
+            documents = (db.session.query(Document.extracted_text)
+                         .filter(Document.subject == subject, Document.class_level == class_level,
+                                 Document.document_type == 'curriculum',
+                                 Document.extracted_text.isnot(None))
+                         .order_by(Document.created_at)
+                         .all())
+            pieces = [p for (text,) in documents for p in text.split('\n\n') if p.strip()]
+        return self._pack(pieces, self.section_tokens)
+
+    @staticmethod
+    def _pack(pieces: List[str], max_tokens: int) -> List[str]:
+        """Join consecutive pieces into groups of at most ``max_tokens``; oversized pieces are split"""
+        groups, current = [], ""
+        for piece in pieces:
+            while estimate_tokens(piece) > max_tokens:
+                groups.append(piece[:max_tokens * 3])
+                piece = piece[max_tokens * 3:]
+            if current and estimate_tokens(current) + estimate_tokens(piece) > max_tokens:
+                groups.append(current)
+                current = ""
+            current = f"{current}\n\n{piece}" if current else piece
+        if current.strip():
+            groups.append(current)
+        return groups
+
+    @staticmethod
+    def _service():
+        from app.services.lesson_service import LessonNoteService
+        return LessonNoteService()
+
+    def _llm_summarizer(self, subject: str, class_level: str) -> Callable[[str, str], str]:
+        # A service of its own so the digest calls queue as one client, like batch generation
+        service = self._service()
+        service.queue_client_id = f"curriculum-digest-{subject}-{class_level}"
+
+        def summarize(instruction: str, text: str) -> str:
+            payload = {
+                "model": service.ollama_model,
+                "messages": [
+                    {"role": "system", "content": instruction},
+                    {"role": "user", "content": f"Subject: {subject}\nClass: {class_level}\n\n{text}"}
+                ],
+                "stream": False,
+                "options": {"temperature": 0.1, "num_ctx": service.lesson_num_ctx}
+            }
+            response = service._ollama_chat(payload, timeout=180)
+            response.raise_for_status()
+            return response.json().get('message', {}).get('content', '')
+
+        return summarize
+
+    def invalidate(self, subject: str, class_level: str) -> int:
+        """Drop the stored digest of a subject and class"""
+        deleted = CurriculumDigest.query.filter_by(subject=subject, class_level=class_level).delete()
+        db.session.commit()
+        return deleted
+
+    def schedule(self, subject: str, class_level: str) -> bool:
+        """Rebuild the digest in the background after a curriculum document is ingested"""
+        if not self.enabled or self._app is None or not subject or not class_level:
+            return False
+
+        def run():
+            try:
+                with self._app.app_context():
+                    self.get(subject, class_level)
+            except Exception as e:
+                print(f"⚠️ Curriculum digest rebuild failed for {subject} {class_level}: {e}")
+
+        self._executor.submit(run)
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'builds': self.builds,
+                'failures': self.failures,
+                'section_summaries': self.summaries,
+                'coalesced_builds': self._builds.coalesced
+            }
+
+
+# Global digester instance
+curriculum_digest = CurriculumDigester()
@@ -10,6 +10,7 @@ import os
 import json
 from typing import Optional, Dict, Any
 from flask import current_app
+from app.services.http_client import http_client
 
 class DeepSeekOCRManager:
     """Manages local DeepSeek OCR service"""
@@ -35,7 +36,7 @@ class DeepSeekOCRManager:
     def check_server_status(self) -> bool:
         """Check if DeepSeek OCR server is running"""
         try:
-            response = requests.get(f"{self.server_url}/health", timeout=5)
+            response = http_client.get(f"{self.server_url}/health", timeout=5)
             self.is_running = response.status_code == 200
             return self.is_running
         except requests.exceptions.RequestException:
@@ -121,7 +122,7 @@ class DeepSeekOCRManager:
         try:
             # In containerized setup, just check if the service is reachable
             # The actual server should be managed by Docker/Podman
-            response = requests.get(f"{self.server_url}/health", timeout=10)
+            response = http_client.get(f"{self.server_url}/health", timeout=10)
             if response.status_code == 200:
                 print("DeepSeek OCR container service is available")
                 return True
@@ -136,7 +137,7 @@ class DeepSeekOCRManager:
         """Get information about the DeepSeek OCR server"""
         try:
             if self.check_server_status():
-                response = requests.get(f"{self.server_url}/info", timeout=5)
+                response = http_client.get(f"{self.server_url}/info", timeout=5)
                 if response.status_code == 200:
                     return response.json()
         except requests.exceptions.RequestException:
@@ -168,7 +169,7 @@ class DeepSeekOCRManager:
                 }
             }
             
-            response = requests.post(
+            response = http_client.post(
                 f"{self.server_url}/api/ocr",
                 json=payload,
                 headers={"Content-Type": "application/json"},
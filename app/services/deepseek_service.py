@@ -10,7 +10,7 @@ import shutil
 import json
 import logging
 from typing import Dict, Any
-from app.models import SystemSettings
+from app.services.settings_cache import settings_cache
 
 logger = logging.getLogger(__name__)
 
@@ -38,8 +38,7 @@ class DeepSeekOCRService:
     def _get_settings_dict(self):
         """Get all settings as a dictionary"""
         try:
-            settings = SystemSettings.query.all()
-            return {setting.key: setting.value for setting in settings}
+            return settings_cache.all()
         except:
             return {}
         
@@ -0,0 +1,88 @@
+"""
+Document Counts Cache
+Per subject and class document counts by type, answered from one indexed
+grouped query and kept in memory until a document of that subject changes
+"""
+
+import threading
+import time
+from typing import Dict, Any, Tuple
+
+from sqlalchemy import func
+
+from app.models import db, Document
+
+EMPTY_COUNTS = {'documents_count': 0, 'curriculum_count': 0, 'progression_count': 0}
+
+
+class DocumentCountsCache:
+    """Caches ``{'documents_count', 'curriculum_count', 'progression_count'}``
+
+    Entries are dropped by ``invalidate`` when this process ingests a document
+    and expire after ``ttl`` seconds to pick up uploads handled by other
+    processes.
+    """
+
+    def __init__(self, ttl: int = 60):
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], Tuple[float, Dict[str, int]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """Apply cache settings from the Flask config"""
+        self.ttl = app.config.get('DOCUMENT_COUNTS_CACHE_TTL', self.ttl)
+
+    def get(self, subject: str, class_level: str) -> Dict[str, int]:
+        key = (subject, class_level)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self.hits += 1
+                return dict(entry[1])
+            self.misses += 1
+
+        counts = self._query(subject, class_level)
+        with self._lock:
+            self._entries[key] = (now, counts)
+        return dict(counts)
+
+    @staticmethod
+    def _query(subject: str, class_level: str) -> Dict[str, int]:
+        rows = (db.session.query(Document.document_type, func.count(Document.id))
+                .filter(Document.subject == subject, Document.class_level == class_level)
+                .group_by(Document.document_type)
+                .all())
+        counts = dict(EMPTY_COUNTS)
+        for document_type, count in rows:
+            if document_type in (None, 'textbook'):
+                counts['documents_count'] += count
+            elif document_type == 'curriculum':
+                counts['curriculum_count'] += count
+            elif document_type == 'progression':
+                counts['progression_count'] += count
+        return counts
+
+    def invalidate(self, subject: str, class_level: str):
+        with self._lock:
+            self._entries.pop((subject, class_level), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'ttl': self.ttl
+            }
+
+
+# Global counts cache
+document_counts = DocumentCountsCache()
@@ -0,0 +1,216 @@
+"""
+Document Ingestion
+OCR, chunking and embedding of uploaded documents, run by job queue workers;
+identical re-uploads get a copy of the first upload's chunks instead
+"""
+
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+from app.models import db, Document, DocumentChunk, ProcessingJob
+from app.services.chunk_writer import chunk_writer
+from app.services.curriculum_digest import curriculum_digest
+from app.services.document_counts import document_counts
+from app.services.embedding_service import EmbeddingService
+from app.services.ingestion_pipeline import ingestion_pipeline
+from app.services.job_events import job_events
+from app.services.job_queue import job_queue
+from app.services.lesson_index import lesson_indexer
+from app.services.lesson_title_cache import lesson_title_cache
+from app.services.progress_tracker import JobProgress
+from app.services.ocr_service import OCRService
+from app.services.response_cache import response_cache
+
+JOB_TYPE = 'ocr'
+CLONE_JOB_TYPE = 'clone'
+
+_services = None
+_services_lock = threading.Lock()
+
+
+def worker_services() -> Tuple[OCRService, EmbeddingService]:
+    """OCR and embedding services shared by every job of this process
+
+    Built on the first job: the embedding model and OCR setup are loaded once
+    per worker process instead of once per document.
+    """
+    global _services
+    with _services_lock:
+        if _services is None:
+            _services = (OCRService(), EmbeddingService())
+        return _services
+
+
+def enqueue_document(document: Document, file_path: str, document_name: str, filename: str,
+                     document_type: str, priority: int = 0) -> ProcessingJob:
+    """Queue OCR and embedding of an uploaded document"""
+    return job_queue.enqueue(JOB_TYPE, {
+        'file_path': file_path,
+        'document_name': document_name,
+        'filename': filename,
+        'document_type': document_type
+    }, document_id=document.id, priority=priority)
+
+
+def ingest_document(job: ProcessingJob) -> Dict[str, Any]:
+    """Process document OCR and embeddings for an ``ocr`` job"""
+    payload = job.payload or {}
+    document_id = job.document_id
+    file_path = payload.get('file_path')
+    document_name = payload.get('document_name')
+    filename = payload.get('filename')
+    document_type = payload.get('document_type')
+
+    print(f"Background processing started for document: {document_id}")
+
+    document = Document.query.get(document_id)
+    if not document:
+        print(f"Document {document_id} not found in database")
+        return {'skipped': 'document not found'}
+
+    document.processing_status = 'processing'
+    db.session.commit()
+    ocr_service, embedding_service = worker_services()
+
+    # A retried attempt starts from a clean set of chunks
+    DocumentChunk.query.filter_by(document_id=document_id).delete(synchronize_session=False)
+    db.session.commit()
+
+    def fallback_text(ocr_error=None):
+        # If OCR failed or returned minimal text, use filename as fallback
+        text = f"Document: {document_name}\nFile: {filename}\nType: {document_type}"
+        if ocr_error is not None:
+            text += f"\nOCR Error: {str(ocr_error)}"
+        return text
+
+    # Chunks are bulk written and committed in batches as they are embedded
+    writer = chunk_writer.writer(document_id)
+    progress = JobProgress(job.id, document_id=document_id)
+
+    def report(snapshot):
+        pages = f"{snapshot['pages']}/{snapshot['pages_total']}" if snapshot['pages_total'] else snapshot['pages']
+        progress.update(
+            # 100 is left for the job's completion
+            99 * snapshot['fraction'],
+            stage=snapshot['stage'],
+            message=f"OCR {pages} pages, {snapshot['embedded']} chunks embedded, {snapshot['written']} saved",
+            stages=progress_stages(snapshot)
+        )
+
+    # OCR, chunking, embedding and writes overlap: pages are chunked and
+    # embedded while later pages are still being OCRed
+    print(f"Starting OCR and embedding for document: {document_id} (Size: {document.file_size} bytes)")
+    result = ingestion_pipeline.run(file_path, ocr_service, embedding_service,
+                                    write=writer.write, fallback_text=fallback_text, progress=report)
+    result['write'] = writer.close()
+    stages = ', '.join(f"{stage} {seconds:.1f}s" for stage, seconds in result['stage_seconds'].items())
+    print(f"Processing completed in {result['seconds']/60:.1f} minutes ({stages}). "
+          f"Successfully processed {result['chunks']}/{result['chunks_total']} chunks for document: {document_id}")
+
+    # Update document with OCR results
+    document.extracted_text = result['text']
+    document.ocr_method = 'tesseract'
+
+    complete_document(document, result['chunks'])
+    progress.update(100, stage='completed', message=f"Completed: {result['chunks']} chunks",
+                    stages=progress_stages(result['progress']), force=True)
+    print(f"Document {document_id} processing completed successfully")
+
+    return {key: result[key] for key in ('pages', 'chunks', 'chunks_total', 'seconds', 'stage_seconds', 'write')}
+
+
+def find_duplicate(content_hash: str, exclude_id=None) -> Optional[Document]:
+    """An already processed document with identical file content"""
+    if not content_hash:
+        return None
+    query = Document.query.filter(Document.content_hash == content_hash,
+                                  Document.processing_status == 'completed')
+    if exclude_id is not None:
+        query = query.filter(Document.id != exclude_id)
+    return query.order_by(Document.created_at).first()
+
+
+def enqueue_clone(document: Document, source: Document) -> ProcessingJob:
+    """Queue copying a duplicate's text and chunks from ``source``; it runs ahead of OCR jobs"""
+    return job_queue.enqueue(CLONE_JOB_TYPE, {'source_document_id': str(source.id)},
+                             document_id=document.id, priority=10)
+
+
+def clone_document(job: ProcessingJob) -> Dict[str, Any]:
+    """Give a duplicate upload the text and chunks of the identical document processed before"""
+    document = Document.query.get(job.document_id)
+    source = Document.query.get((job.payload or {}).get('source_document_id'))
+    if not document:
+        return {'skipped': 'document not found'}
+    if not source or source.processing_status != 'completed':
+        # The original went away: process this upload from scratch instead
+        print(f"Duplicate source for document {document.id} is gone, queueing full processing")
+        enqueue_document(document, document.file_path, document.name, document.filename, document.document_type)
+        return {'requeued': True}
+
+    document.processing_status = 'processing'
+    DocumentChunk.query.filter_by(document_id=document.id).delete(synchronize_session=False)
+    db.session.commit()
+
+    write = chunk_writer.copy_document(source.id, document.id)
+    document.extracted_text = source.extracted_text
+    document.ocr_method = source.ocr_method
+    complete_document(document, write['rows'], duplicate_of=str(source.id))
+    print(f"♻️ Document {document.id} reused {write['rows']} chunks of identical document {source.id}")
+
+    return {'duplicate_of': str(source.id), 'chunks': write['rows'], 'write': write}
+
+
+def complete_document(document: Document, chunks: int, **extra):
+    """Mark a document processed and refresh everything derived from its subject's documents"""
+    document.processing_status = 'completed'
+    publish_document(document, chunks=chunks, **extra)
+    db.session.commit()
+
+    response_cache.invalidate_document(document.id)
+    document_counts.invalidate(document.subject, document.class_level)
+    if document.document_type == 'progression':
+        lesson_title_cache.invalidate(document.subject, document.class_level)
+    # Map lessons to this document's chunks in the background
+    lesson_indexer.schedule(document.subject, document.class_level, document.id, document.document_type)
+    if document.document_type == 'curriculum':
+        curriculum_digest.schedule(document.subject, document.class_level)
+
+
+def progress_stages(snapshot: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Done/total per ingestion stage; totals are estimates until chunking ends"""
+    return {
+        'ocr': {'done': snapshot['pages'], 'total': snapshot['pages_total']},
+        'embedding': {'done': snapshot['embedded'], 'total': snapshot['chunks_expected']},
+        'writing': {'done': snapshot['written'], 'total': snapshot['chunks_expected']}
+    }
+
+
+def publish_document(document: Document, **extra):
+    """Document status event: ends its SSE stream and refreshes other processes' caches"""
+    job_events.publish('document', document_id=document.id, status=document.processing_status,
+                       filename=document.filename, subject=document.subject, class_level=document.class_level,
+                       document_type=document.document_type, **extra)
+
+
+def document_changed(event: Dict[str, Any]):
+    """Drop this process's cached answers and counts for a document ingested elsewhere"""
+    if event.get('type') != 'document' or event.get('status') != 'completed':
+        return
+    response_cache.invalidate_document(event['document_id'])
+    if event.get('subject') and event.get('class_level'):
+        document_counts.invalidate(event['subject'], event['class_level'])
+
+
+def ingestion_failed(job: ProcessingJob, error: str):
+    """The last attempt failed: the document stays failed"""
+    document = Document.query.get(job.document_id) if job.document_id else None
+    if document:
+        document.processing_status = 'failed'
+        publish_document(document, error_message=error)
+    print(f"Background processing failed for document {job.document_id}: {error}")
+
+
+job_queue.register(JOB_TYPE, ingest_document, on_failure=ingestion_failed)
+job_queue.register(CLONE_JOB_TYPE, clone_document, on_failure=ingestion_failed)
+job_events.add_handler(document_changed)
@@ -205,29 +205,43 @@ class EmbeddingService:
     def create_chunks(self, text, chunk_size=None, overlap=None):
         """Split text into chunks for embedding"""
         
+        return list(self.iter_chunks([text], chunk_size, overlap))
+    
+    def iter_chunks(self, texts, chunk_size=None, overlap=None):
+        """Chunk text that arrives in pieces (e.g. OCRed pages), yielding each chunk once it is complete
+        
+        Yields the same chunks ``create_chunks`` returns for the joined pieces.
+        """
+        
         if chunk_size is None:
             chunk_size = current_app.config.get('CHUNK_SIZE', 500)
         if overlap is None:
             overlap = current_app.config.get('CHUNK_OVERLAP', 50)
         
-        if not text or len(text.strip()) == 0:
-            return []
+        # Start of the text, for the single-chunk fallback below
+        head = []
         
-        chunks = []
+        def pieces():
+            for text in texts:
+                if text and len("".join(head).lstrip()) < chunk_size:
+                    head.append(text)
+                yield text
         
-        # Split by sentences first for better chunk boundaries
-        sentences = self._split_into_sentences(text)
+        yielded = False
         
         current_chunk = ""
         current_length = 0
         
-        for sentence in sentences:
+        # Split by sentences first for better chunk boundaries
+        for sentence in self._iter_sentences(pieces()):
             sentence_length = len(sentence)
             
             # If adding this sentence would exceed chunk size
             if current_length + sentence_length > chunk_size and current_chunk:
-                # Save current chunk
-                chunks.append(current_chunk.strip())
+                # Save current chunk, skipping extremely short (meaningless) fragments
+                if len(current_chunk.strip()) > 10:
+                    yielded = True
+                    yield current_chunk.strip()
                 
                 # Start new chunk with overlap
                 if overlap > 0 and len(current_chunk) > overlap:
@@ -245,18 +259,29 @@ class EmbeddingService:
                 current_length += sentence_length
         
         # Add the final chunk
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
-        
-        # Filter out extremely short chunks (reduced from 50 to 10 chars)
-        # This allows more flexibility while still filtering meaningless fragments
-        chunks = [chunk for chunk in chunks if len(chunk.strip()) > 10]
+        if len(current_chunk.strip()) > 10:
+            yielded = True
+            yield current_chunk.strip()
         
-        # If no valid chunks created, create one from the original text
-        if not chunks and text and len(text.strip()) > 0:
-            chunks = [text.strip()[:chunk_size]]  # Take first chunk_size characters
+        # If no valid chunks created, create one from the start of the text
+        text = "".join(head).strip()
+        if not yielded and text:
+            yield text[:chunk_size]  # Take first chunk_size characters
+    
+    def _iter_sentences(self, texts):
+        """Sentences of the concatenated pieces; a sentence split across pieces is held until it ends"""
         
-        return chunks
+        tail = ""
+        for text in texts:
+            if not text:
+                continue
+            parts = re.split(r'(?<=[.!?])\s+', tail + text)
+            tail = parts.pop()
+            for sentence in parts:
+                if sentence.strip():
+                    yield sentence.strip()
+        if tail.strip():
+            yield tail.strip()
     
     def _split_into_sentences(self, text):
         """Split text into sentences"""
@@ -21,10 +21,9 @@ class GoogleService:
         
         # Try to get from database
         try:
-            from app.models import SystemSettings
-            setting = SystemSettings.query.filter_by(key='google_credentials').first()
-            if setting:
-                creds_dict = json.loads(setting.value)
+            from app.services.settings_cache import settings_cache
+            creds_dict = settings_cache.get_json('google_credentials')
+            if creds_dict:
                 return Credentials(**creds_dict)
         except Exception:
             pass
@@ -0,0 +1,171 @@
+"""
+Shared Outbound HTTP Client
+Pooled keep-alive sessions for Ollama, LM Studio, DeepSeek OCR and OnlyOffice calls
+"""
+
+import threading
+import time
+from typing import Dict, Any
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Upper bounds (seconds) of the per-host latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Methods that are safe to retry automatically; POST (LLM generation, OCR) is never replayed
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+
+class OutboundHTTPClient:
+    """Process-wide requests session with per-host connection pools and metrics"""
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10,
+                 connect_timeout: float = 5, read_timeout: float = 60,
+                 retries: int = 3, backoff_factor: float = 0.5):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+
+        self._lock = threading.Lock()
+        self._host_stats = {}
+        self._build_session()
+
+    def init_app(self, app):
+        """Apply pool, timeout and retry settings from the Flask config"""
+        self.pool_connections = app.config.get('HTTP_POOL_CONNECTIONS', self.pool_connections)
+        self.pool_maxsize = app.config.get('HTTP_POOL_MAXSIZE', self.pool_maxsize)
+        self.connect_timeout = app.config.get('HTTP_CONNECT_TIMEOUT', self.connect_timeout)
+        self.read_timeout = app.config.get('HTTP_READ_TIMEOUT', self.read_timeout)
+        self.retries = app.config.get('HTTP_RETRY_TOTAL', self.retries)
+        self.backoff_factor = app.config.get('HTTP_RETRY_BACKOFF', self.backoff_factor)
+        self._build_session()
+
+    def _build_session(self):
+        """(Re)create the pooled session with the current settings"""
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        old_session = getattr(self, 'session', None)
+        self.session = session
+        self._adapter = adapter
+        if old_session is not None:
+            old_session.close()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request through the shared pool, recording per-host latency"""
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = (self.connect_timeout, self.read_timeout)
+
+        host = urlsplit(url).netloc
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            self._record(host, time.perf_counter() - start, error=True)
+            raise
+        self._record(host, time.perf_counter() - start, error=response.status_code >= 500)
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', url, **kwargs)
+
+    def _record(self, host: str, elapsed: float, error: bool = False):
+        """Add one observation to the host's latency histogram"""
+        with self._lock:
+            stats = self._host_stats.get(host)
+            if stats is None:
+                stats = {
+                    'requests': 0,
+                    'errors': 0,
+                    'latency_sum': 0.0,
+                    'latency_max': 0.0,
+                    'buckets': [0] * (len(LATENCY_BUCKETS) + 1)
+                }
+                self._host_stats[host] = stats
+
+            stats['requests'] += 1
+            if error:
+                stats['errors'] += 1
+            stats['latency_sum'] += elapsed
+            stats['latency_max'] = max(stats['latency_max'], elapsed)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    stats['buckets'][i] += 1
+                    break
+            else:
+                stats['buckets'][-1] += 1
+
+    def _pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """Connection reuse counters taken from the urllib3 pools"""
+        pools = {}
+        pool_manager = self._adapter.poolmanager
+        for key in list(pool_manager.pools.keys()):
+            pool = pool_manager.pools.get(key)
+            if pool is None:
+                continue
+            port = pool.port
+            host = f"{pool.host}:{port}" if port else pool.host
+            opened = getattr(pool, 'num_connections', 0)
+            sent = getattr(pool, 'num_requests', 0)
+            pools[host] = {
+                'connections_opened': opened,
+                'requests_sent': sent,
+                'connections_reused': max(sent - opened, 0)
+            }
+        return pools
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-host latency histograms and connection reuse for /api/metrics"""
+        with self._lock:
+            hosts = {}
+            for host, stats in self._host_stats.items():
+                buckets = {f"<={bound}s": count for bound, count in zip(LATENCY_BUCKETS, stats['buckets'])}
+                buckets[f">{LATENCY_BUCKETS[-1]}s"] = stats['buckets'][-1]
+                hosts[host] = {
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'latency_avg': round(stats['latency_sum'] / stats['requests'], 4) if stats['requests'] else 0.0,
+                    'latency_max': round(stats['latency_max'], 4),
+                    'latency_histogram': buckets
+                }
+
+        return {
+            'pool_connections': self.pool_connections,
+            'pool_maxsize': self.pool_maxsize,
+            'timeouts': {'connect': self.connect_timeout, 'read': self.read_timeout},
+            'retries': self.retries,
+            'hosts': hosts,
+            'pools': self._pool_stats()
+        }
+
+
+# Global client instance
+http_client = OutboundHTTPClient()
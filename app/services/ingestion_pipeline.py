@@ -0,0 +1,346 @@
+"""
+Ingestion Pipeline
+Streams a document through OCR, chunking, embedding and database writes as
+concurrent stages joined by bounded queues
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from flask import current_app
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class PipelineAborted(Exception):
+    """Another stage failed; this one stops"""
+
+
+class _Run:
+    """State shared by the stages of one document"""
+
+    def __init__(self, queue_size: int):
+        self.pages: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.chunks: "queue.Queue" = queue.Queue(maxsize=queue_size * 4)
+        self.embedded: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.failed = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.text: List[str] = []
+        self.busy: Dict[str, float] = {'ocr': 0.0, 'chunk': 0.0, 'embed': 0.0, 'write': 0.0}
+        self.counts: Dict[str, int] = {'pages': 0, 'chunks': 0, 'embedded': 0, 'written': 0}
+        self.pages_total: Optional[int] = None
+        self.finished: set = set()
+        self.started = time.time()
+
+    def fail(self, error: BaseException):
+        if not self.failed.is_set():
+            self.error = error
+            self.failed.set()
+
+    def put(self, q: "queue.Queue", item):
+        # Blocks while the next stage is behind: that is the backpressure
+        while True:
+            if self.failed.is_set():
+                raise PipelineAborted()
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, q: "queue.Queue", timeout: Optional[float] = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.failed.is_set():
+                raise PipelineAborted()
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-stage counts and the fraction of the document done"""
+        counts = dict(self.counts)
+        if 'ocr' in self.finished:
+            ocr = 1.0
+        else:
+            ocr = min(counts['pages'] / self.pages_total, 1.0) if self.pages_total else 0.0
+        # Until chunking ends, the chunks still to come are estimated from the pages still to come
+        if 'chunk' in self.finished:
+            expected = counts['chunks']
+        else:
+            expected = counts['chunks'] / ocr if ocr else 0
+        embedded = min(counts['embedded'] / expected, 1.0) if expected else float('chunk' in self.finished)
+        written = min(counts['written'] / expected, 1.0) if expected else float('chunk' in self.finished)
+
+        if 'ocr' not in self.finished:
+            stage = 'ocr'
+        elif 'embed' not in self.finished:
+            stage = 'embedding'
+        else:
+            stage = 'writing'
+        return dict(counts, stage=stage, pages_total=self.pages_total,
+                    chunks_expected=round(expected), elapsed=round(time.time() - self.started, 1),
+                    # Stages overlap: the document is as far along as its slowest stage
+                    fraction=min(ocr, embedded, written))
+
+
+class IngestionPipeline:
+    """OCR → chunk → embed → write, one thread per stage
+
+    Each OCRed page goes to the chunker as soon as it is read, chunks are
+    embedded in batches of up to ``embed_batch`` and embedded batches are
+    handed to ``write`` in the calling thread (which owns the database
+    session). The queues between stages hold at most ``queue_size`` items, so
+    a slow stage stalls the ones before it instead of letting pages and
+    embeddings pile up in memory. A document then takes about as long as its
+    slowest stage rather than the sum of all of them.
+    """
+
+    def __init__(self, queue_size: int = 8, embed_batch: int = 32):
+        self.queue_size = queue_size
+        self.embed_batch = embed_batch
+
+        self._lock = threading.Lock()
+        self.documents = 0
+        self.failures = 0
+        self.pages = 0
+        self.chunks = 0
+        self.seconds = 0.0
+        self.stage_seconds: Dict[str, float] = {'ocr': 0.0, 'chunk': 0.0, 'embed': 0.0, 'write': 0.0}
+
+    def init_app(self, app):
+        """Apply pipeline settings from the Flask config"""
+        self.queue_size = app.config.get('INGEST_QUEUE_SIZE', self.queue_size)
+        self.embed_batch = app.config.get('INGEST_EMBED_BATCH', self.embed_batch)
+
+    def run(self, file_path: str, ocr_service, embedding_service,
+            write: Callable[[List[Tuple[int, str, List[float]]]], None],
+            fallback_text: Callable[[Optional[Exception]], str],
+            progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Ingest one file; returns the extracted text and per-stage timings
+
+        ``write`` receives lists of ``(chunk_index, content, embedding)``.
+        ``fallback_text(error)`` stands in for the document's text when OCR
+        fails before producing any, or produces almost none; an OCR error
+        after pages have been passed on is raised. ``progress``
+        gets a ``_Run.snapshot()`` from the calling thread after every write
+        and while waiting for one; it throttles itself.
+        """
+        run = _Run(self.queue_size)
+        app = current_app._get_current_object()
+        started = time.time()
+
+        stages = [
+            threading.Thread(target=self._stage, args=(app, run, self._ocr, run, ocr_service, file_path, fallback_text),
+                             name='ingest-ocr', daemon=True),
+            threading.Thread(target=self._stage, args=(app, run, self._chunk, run, embedding_service),
+                             name='ingest-chunk', daemon=True),
+            threading.Thread(target=self._stage, args=(app, run, self._embed, run, embedding_service),
+                             name='ingest-embed', daemon=True),
+        ]
+        for thread in stages:
+            thread.start()
+
+        try:
+            self._write(run, write, progress)
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            run.fail(e)
+        finally:
+            for thread in stages:
+                thread.join()
+
+        elapsed = time.time() - started
+        with self._lock:
+            self.documents += 1
+            if run.error is not None:
+                self.failures += 1
+            self.pages += run.counts['pages']
+            self.chunks += run.counts['written']
+            self.seconds += elapsed
+            for stage, busy in run.busy.items():
+                self.stage_seconds[stage] += busy
+
+        if run.error is not None:
+            raise run.error
+
+        return {
+            'text': "".join(run.text).strip(),
+            'pages': run.counts['pages'],
+            'chunks': run.counts['written'],
+            'chunks_total': run.counts['chunks'],
+            'seconds': round(elapsed, 2),
+            'stage_seconds': {stage: round(busy, 2) for stage, busy in run.busy.items()},
+            'progress': run.snapshot()
+        }
+
+    @staticmethod
+    def _stage(app, run: _Run, target, *args):
+        with app.app_context():
+            try:
+                target(*args)
+            except PipelineAborted:
+                pass
+            except BaseException as e:
+                run.fail(e)
+
+    @staticmethod
+    def _ocr(run: _Run, ocr_service, file_path: str, fallback_text):
+        # Pages are held back until there is real text: near-empty OCR output
+        # is replaced by the fallback text as a whole
+        held: List[str] = []
+        flowing = False
+        try:
+            run.pages_total = ocr_service.page_count(file_path)
+        except Exception:
+            run.pages_total = None
+        pages = iter(ocr_service.iter_pages(file_path))
+        while True:
+            started = time.time()
+            try:
+                page = next(pages)
+            except StopIteration:
+                break
+            except Exception as e:
+                run.busy['ocr'] += time.time() - started
+                print(f"OCR processing failed for {file_path}: {e}")
+                if flowing:
+                    # Some pages are already chunked: fail the job rather than keep a truncated document
+                    raise
+                held = [fallback_text(e)]
+                break
+            run.busy['ocr'] += time.time() - started
+            run.counts['pages'] += 1
+
+            if flowing:
+                run.text.append(page)
+                run.put(run.pages, page)
+                continue
+            held.append(page)
+            if len("".join(held).strip()) >= 3:
+                flowing = True
+                run.text.extend(held)
+                for piece in held:
+                    run.put(run.pages, piece)
+                held = []
+
+        if not flowing:
+            if not held or len("".join(held).strip()) < 3:
+                print(f"OCR returned minimal text for {file_path}, using fallback")
+                held = [fallback_text(None)]
+            run.text.extend(held)
+            for piece in held:
+                run.put(run.pages, piece)
+        run.finished.add('ocr')
+        run.put(run.pages, _DONE)
+
+    @staticmethod
+    def _chunk(run: _Run, embedding_service):
+        waited = [0.0]
+
+        def pages():
+            while True:
+                started = time.time()
+                page = run.get(run.pages)
+                waited[0] += time.time() - started
+                if page is _DONE:
+                    return
+                yield page
+
+        index = 0
+        started = time.time()
+        for chunk in embedding_service.iter_chunks(pages()):
+            run.put(run.chunks, (index, chunk))
+            run.counts['chunks'] += 1
+            index += 1
+        # Chunking time net of waiting for OCR (time blocked on the embedder included; it is small)
+        run.busy['chunk'] += time.time() - started - waited[0]
+        run.finished.add('chunk')
+        run.put(run.chunks, _DONE)
+
+    def _embed(self, run: _Run, embedding_service):
+        done = False
+        while not done:
+            # Block for the first chunk, then take whatever else is ready up to a full batch
+            batch = []
+            item = run.get(run.chunks)
+            while item is not _DONE:
+                batch.append(item)
+                if len(batch) >= self.embed_batch:
+                    break
+                try:
+                    item = run.chunks.get_nowait()
+                except queue.Empty:
+                    break
+            done = item is _DONE
+            if not batch:
+                continue
+
+            started = time.time()
+            embedded = self._embed_batch(embedding_service, batch)
+            run.busy['embed'] += time.time() - started
+            run.counts['embedded'] += len(embedded)
+            if embedded:
+                run.put(run.embedded, embedded)
+        run.finished.add('embed')
+        run.put(run.embedded, _DONE)
+
+    @staticmethod
+    def _embed_batch(embedding_service, batch):
+        texts = [content for _, content in batch]
+        try:
+            embeddings = embedding_service.get_embeddings_batch(texts)
+            return [(index, content, embedding) for (index, content), embedding in zip(batch, embeddings)]
+        except Exception as batch_error:
+            print(f"Batch embedding failed, embedding chunks one by one: {batch_error}")
+
+        embedded = []
+        for index, content in batch:
+            try:
+                embedded.append((index, content, embedding_service.get_embedding(content)))
+            except Exception as chunk_error:
+                print(f"Failed to process chunk {index}: {chunk_error}")
+        return embedded
+
+    @staticmethod
+    def _write(run: _Run, write, progress=None):
+        while True:
+            if progress is not None:
+                progress(run.snapshot())
+            try:
+                batch = run.get(run.embedded, timeout=0.5)
+            except queue.Empty:
+                continue
+            if batch is _DONE:
+                return
+            started = time.time()
+            write(batch)
+            run.busy['write'] += time.time() - started
+            before = run.counts['written']
+            run.counts['written'] += len(batch)
+            # Progress update for large documents
+            if run.counts['written'] // 20 > before // 20 and run.counts['chunks'] > 20:
+                print(f"Embedding progress: {run.counts['written']}/{run.counts['chunks']} chunks processed")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'documents': self.documents,
+                'failures': self.failures,
+                'pages': self.pages,
+                'chunks': self.chunks,
+                'seconds': round(self.seconds, 2),
+                'stage_seconds': {stage: round(busy, 2) for stage, busy in self.stage_seconds.items()},
+                'queue_size': self.queue_size,
+                'embed_batch': self.embed_batch
+            }
+
+
+# Global pipeline instance
+ingestion_pipeline = IngestionPipeline()
@@ -0,0 +1,271 @@
+"""
+Job Events
+Status and progress events of background jobs, pushed to browsers as
+Server-Sent Events. Job code publishes as it works; on PostgreSQL events
+travel between processes with LISTEN/NOTIFY, so web processes hear about
+jobs run by separate workers without polling the database.
+"""
+
+import json
+import select
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from flask import Response, stream_with_context
+from sqlalchemy import text
+
+from app.models import db
+
+CHANNEL = 'job_events'
+# pg_notify payloads are limited to 8000 bytes
+MAX_PAYLOAD = 7500
+
+
+class JobEventBus:
+    """Publishes job events and replays recent ones to SSE streams
+
+    Every process keeps the last ``buffer_size`` events it has seen with an
+    increasing sequence number; the SSE event id is ``<process epoch>:<seq>``.
+    A client reconnecting with ``Last-Event-ID`` gets the events it missed
+    from the buffer, or a fresh snapshot when the id is from another process
+    or too old. Streams send a comment every ``heartbeat`` seconds to keep
+    proxies from closing them and end after ``stream_seconds`` so the server
+    threads they hold are handed back; EventSource reconnects on its own.
+    """
+
+    def __init__(self, buffer_size: int = 1000, heartbeat: float = 15.0, stream_seconds: float = 300.0,
+                 max_streams: int = 4, retry_ms: int = 3000):
+        self.buffer_size = buffer_size
+        self.heartbeat = heartbeat
+        self.stream_seconds = stream_seconds
+        self.max_streams = max_streams
+        self.retry_ms = retry_ms
+        self.epoch = uuid.uuid4().hex[:8]
+
+        self._cond = threading.Condition()
+        self._events: deque = deque(maxlen=buffer_size)
+        self._seq = 0
+        self._handlers: List[Callable[[Dict[str, Any]], None]] = []
+        self._listener: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.streams = 0
+        self.published = 0
+        self.delivered = 0
+        self.notified = 0
+        self.rejected_streams = 0
+        self.listener_errors = 0
+
+    def init_app(self, app):
+        """Apply event settings from the Flask config"""
+        self.heartbeat = app.config.get('JOB_EVENTS_HEARTBEAT', self.heartbeat)
+        self.stream_seconds = app.config.get('JOB_EVENTS_STREAM_SECONDS', self.stream_seconds)
+        self.max_streams = app.config.get('JOB_EVENTS_MAX_STREAMS', self.max_streams)
+
+    def add_handler(self, handler: Callable[[Dict[str, Any]], None]):
+        """Call ``handler(event)`` for every event this process receives"""
+        self._handlers.append(handler)
+
+    def publish(self, event_type: str, **data):
+        """Send an event to every process's streams and handlers
+
+        On PostgreSQL the NOTIFY joins the caller's transaction: it goes out
+        when the session commits and is dropped if it rolls back, so
+        listeners never see state that was not saved.
+        """
+        event = {key: str(value) if isinstance(value, uuid.UUID) else value for key, value in data.items()}
+        event['type'] = event_type
+        event['at'] = datetime.utcnow().isoformat()
+        with self._lock:
+            self.published += 1
+
+        try:
+            if db.session.get_bind().dialect.name == 'postgresql':
+                payload = json.dumps(event, default=str)
+                if len(payload) > MAX_PAYLOAD:
+                    event.pop('stages', None)
+                    payload = json.dumps(event, default=str)[:MAX_PAYLOAD]
+                db.session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                   {'channel': CHANNEL, 'payload': payload})
+                with self._lock:
+                    self.notified += 1
+                return
+        except Exception as e:
+            print(f"⚠️ Job event notify failed, delivering locally: {e}")
+        self.deliver(event)
+
+    def deliver(self, event: Dict[str, Any]):
+        """Add an event to this process's buffer and wake its streams"""
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, event))
+            self._cond.notify_all()
+        with self._lock:
+            self.delivered += 1
+        for handler in self._handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"⚠️ Job event handler failed: {e}")
+
+    def position(self) -> int:
+        with self._cond:
+            return self._seq
+
+    def resume_position(self, last_event_id: Optional[str]) -> Optional[int]:
+        """Sequence number to replay from, or None when the buffer cannot cover the gap"""
+        if not last_event_id or ':' not in last_event_id:
+            return None
+        epoch, _, seq = last_event_id.partition(':')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        with self._cond:
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            if seq > self._seq or seq < oldest - 1:
+                return None
+        return seq
+
+    def wait(self, seq: int, timeout: float) -> Optional[List[Tuple[int, Dict[str, Any]]]]:
+        """Events after ``seq``, waiting up to ``timeout`` for one; None if some were already dropped"""
+        with self._cond:
+            if self._seq == seq:
+                self._cond.wait(timeout)
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            if seq < oldest - 1:
+                return None
+            return [(s, event) for s, event in self._events if s > seq]
+
+    def format(self, seq: int, event: Dict[str, Any]) -> str:
+        return f"id: {self.epoch}:{seq}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+    def open_stream(self) -> bool:
+        """Reserve one of ``max_streams`` stream slots (each holds a server thread)"""
+        with self._lock:
+            if self.streams >= self.max_streams:
+                self.rejected_streams += 1
+                return False
+            self.streams += 1
+            return True
+
+    def close_stream(self):
+        with self._lock:
+            self.streams -= 1
+
+    def response(self, snapshot: Callable[[], Dict[str, Any]], matches: Callable[[Dict[str, Any]], bool],
+                 last_event_id: Optional[str] = None,
+                 until: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Optional[Response]:
+        """SSE response for one client (see ``stream``), or None when every stream slot is taken
+
+        The slot is given back when the server closes the response, which
+        also happens when the stream never started: HEAD requests and
+        clients that leave before the first event.
+        """
+        if not self.open_stream():
+            return None
+        response = Response(stream_with_context(self.stream(snapshot, matches, last_event_id, until)),
+                            mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        response.call_on_close(self.close_stream)
+        return response
+
+    def stream(self, snapshot: Callable[[], Dict[str, Any]], matches: Callable[[Dict[str, Any]], bool],
+               last_event_id: Optional[str] = None,
+               until: Optional[Callable[[Dict[str, Any]], bool]] = None):
+        """SSE text for one client; the caller reserves a slot with ``open_stream`` and releases it
+
+        ``snapshot()`` gives the current state when the client cannot resume
+        from ``last_event_id``; only events passing ``matches`` are sent and
+        the stream ends after an event passing ``until``.
+        """
+        yield f"retry: {self.retry_ms}\n\n"
+        seq = self.resume_position(last_event_id)
+        if seq is None:
+            seq = self.position()
+            yield self.format(seq, dict(snapshot(), type='snapshot'))
+
+        deadline = time.monotonic() + self.stream_seconds
+        while time.monotonic() < deadline:
+            events = self.wait(seq, min(self.heartbeat, max(deadline - time.monotonic(), 0.01)))
+            if events is None:
+                # Fell behind the buffer: start over from the current state
+                seq = self.position()
+                yield self.format(seq, dict(snapshot(), type='snapshot'))
+                continue
+            if not events:
+                yield ": heartbeat\n\n"
+                continue
+            for s, event in events:
+                seq = s
+                if matches(event):
+                    yield self.format(s, event)
+                    if until is not None and until(event):
+                        return
+
+    def start_listener(self, app):
+        """LISTEN for events from other processes (PostgreSQL only)"""
+        with app.app_context():
+            if db.engine.dialect.name != 'postgresql':
+                return
+        if self._listener is not None:
+            return
+        self._listener = threading.Thread(target=self._listen, args=(app,), name='job-events-listener', daemon=True)
+        self._listener.start()
+
+    def _listen(self, app):
+        while True:
+            raw = None
+            try:
+                with app.app_context():
+                    # A connection of its own, taken out of the pool for good
+                    raw = db.engine.raw_connection()
+                    raw.detach()
+                connection = raw.dbapi_connection
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                print(f"📡 Listening for job events on '{CHANNEL}'")
+
+                while True:
+                    if select.select([connection], [], [], 30.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notification = connection.notifies.pop(0)
+                        try:
+                            self.deliver(json.loads(notification.payload))
+                        except ValueError:
+                            continue
+            except Exception as e:
+                with self._lock:
+                    self.listener_errors += 1
+                print(f"⚠️ Job event listener error, reconnecting: {e}")
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+                time.sleep(5)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'streams': self.streams,
+                'max_streams': self.max_streams,
+                'rejected_streams': self.rejected_streams,
+                'published': self.published,
+                'notified': self.notified,
+                'delivered': self.delivered,
+                'listening': self._listener is not None,
+                'listener_errors': self.listener_errors
+            }
+        with self._cond:
+            stats['buffered'] = len(self._events)
+        return stats
+
+
+# Global event bus instance
+job_events = JobEventBus()
@@ -0,0 +1,339 @@
+"""
+Job Queue
+Durable background jobs on the processing_jobs table: the web process only
+enqueues, worker processes (worker.py) claim jobs by priority, run them with a
+bounded number of threads and retry failures with exponential backoff
+"""
+
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List, Optional
+
+from sqlalchemy import func
+
+from app.models import db, ProcessingJob
+from app.services.job_events import job_events
+
+
+class JobQueue:
+    """Enqueue, claim and settle ``ProcessingJob`` rows
+
+    Handlers are registered per job type as ``handler(job)`` and run inside
+    an app context; raising marks the attempt failed. A failed job goes back
+    to ``pending`` with ``run_after`` pushed out by ``retry_backoff * 2 **
+    (attempts - 1)`` seconds until ``max_attempts``, then ``on_failure(job,
+    error)`` is called and it stays ``failed``.
+
+    Claims use ``FOR UPDATE SKIP LOCKED`` on PostgreSQL, so concurrent workers
+    never block on or double-claim a row. SQLite has a single writer anyway:
+    claims there are serialized in-process and made safe across processes by
+    a conditional update on ``status``.
+    """
+
+    def __init__(self, max_attempts: int = 3, retry_backoff: float = 30.0, max_backoff: float = 3600.0,
+                 lock_timeout: float = 7200.0):
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.lock_timeout = lock_timeout
+
+        self._handlers: Dict[str, Dict[str, Callable]] = {}
+        self._claim_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.claimed = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self.recovered = 0
+
+    def init_app(self, app):
+        """Apply queue settings from the Flask config"""
+        self.max_attempts = app.config.get('JOB_MAX_ATTEMPTS', self.max_attempts)
+        self.retry_backoff = app.config.get('JOB_RETRY_BACKOFF', self.retry_backoff)
+        self.max_backoff = app.config.get('JOB_MAX_BACKOFF', self.max_backoff)
+        self.lock_timeout = app.config.get('JOB_LOCK_TIMEOUT', self.lock_timeout)
+
+    def register(self, job_type: str, handler: Callable[[ProcessingJob], Any],
+                 on_failure: Optional[Callable[[ProcessingJob, str], None]] = None):
+        """Run ``handler`` for jobs of ``job_type``; its return value becomes ``result_data``"""
+        self._handlers[job_type] = {'handler': handler, 'on_failure': on_failure}
+
+    @property
+    def job_types(self) -> List[str]:
+        return sorted(self._handlers)
+
+    def enqueue(self, job_type: str, payload: Optional[Dict[str, Any]] = None, document_id=None,
+                priority: int = 0, max_attempts: Optional[int] = None, commit: bool = True) -> ProcessingJob:
+        """Add a pending job; workers pick it up"""
+        job = ProcessingJob(
+            job_type=job_type,
+            status='pending',
+            document_id=document_id,
+            payload=payload or {},
+            priority=priority,
+            attempts=0,
+            max_attempts=max_attempts or self.max_attempts,
+            run_after=datetime.utcnow()
+        )
+        db.session.add(job)
+        db.session.flush()
+        self._publish(job)
+        if commit:
+            db.session.commit()
+        with self._lock:
+            self.enqueued += 1
+        return job
+
+    def claim(self, worker_id: str, job_types: Optional[List[str]] = None) -> Optional[ProcessingJob]:
+        """Lock the next runnable job for ``worker_id``, or None when there is none"""
+        job_types = job_types or self.job_types
+        if not job_types:
+            return None
+
+        now = datetime.utcnow()
+        query = (ProcessingJob.query
+                 .filter(ProcessingJob.status == 'pending',
+                         ProcessingJob.job_type.in_(job_types),
+                         db.or_(ProcessingJob.run_after.is_(None), ProcessingJob.run_after <= now))
+                 .order_by(ProcessingJob.priority.desc(), ProcessingJob.created_at))
+
+        if db.engine.dialect.name == 'postgresql':
+            job = query.with_for_update(skip_locked=True).first()
+            if job is None:
+                db.session.rollback()
+                return None
+            self._mark_claimed(job, worker_id, now)
+            self._publish(job)
+            db.session.commit()
+        else:
+            with self._claim_lock:
+                job = query.first()
+                if job is None:
+                    db.session.rollback()
+                    return None
+                # Another process may have taken it since the select
+                taken = (ProcessingJob.query
+                         .filter(ProcessingJob.id == job.id, ProcessingJob.status == 'pending')
+                         .update({'status': 'running', 'locked_by': worker_id, 'locked_at': now},
+                                 synchronize_session=False))
+                if not taken:
+                    db.session.rollback()
+                    return None
+                self._mark_claimed(job, worker_id, now)
+                self._publish(job)
+                db.session.commit()
+
+        with self._lock:
+            self.claimed += 1
+        return job
+
+    @staticmethod
+    def _mark_claimed(job: ProcessingJob, worker_id: str, now: datetime):
+        job.status = 'running'
+        job.locked_by = worker_id
+        job.locked_at = now
+        job.started_at = job.started_at or now
+        job.attempts = (job.attempts or 0) + 1
+        job.error_message = None
+
+    def run(self, job: ProcessingJob):
+        """Run a claimed job's handler and settle it"""
+        entry = self._handlers.get(job.job_type)
+        if entry is None:
+            self.fail(job, f"No handler registered for job type '{job.job_type}'", retry=False)
+            return
+        try:
+            result = entry['handler'](job)
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Job {job.id} ({job.job_type}) attempt {job.attempts} failed: {e}")
+            traceback.print_exc()
+            self.fail(job, str(e))
+            return
+        self.complete(job, result)
+
+    def complete(self, job: ProcessingJob, result: Any = None):
+        job.status = 'completed'
+        job.progress = 100
+        job.completed_at = datetime.utcnow()
+        job.locked_by = None
+        job.locked_at = None
+        if result is not None:
+            job.result_data = result
+        self._publish(job)
+        db.session.commit()
+        with self._lock:
+            self.completed += 1
+
+    def fail(self, job: ProcessingJob, error: str, retry: bool = True):
+        """Retry the job after a backoff, or fail it for good after its last attempt"""
+        job = db.session.merge(job)
+        job.error_message = error
+        job.locked_by = None
+        job.locked_at = None
+        attempts = job.attempts or 0
+        if retry and attempts < (job.max_attempts or self.max_attempts):
+            delay = min(self.retry_backoff * 2 ** max(attempts - 1, 0), self.max_backoff)
+            job.status = 'pending'
+            job.status_message = f"Attempt {attempts} failed, retrying in {delay:.0f}s"
+            job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+            self._publish(job, status='retrying', retry_in=delay)
+            db.session.commit()
+            with self._lock:
+                self.retried += 1
+            print(f"🔁 Job {job.id} retries in {delay:.0f}s (attempt {attempts}/{job.max_attempts})")
+            return
+
+        job.status = 'failed'
+        job.status_message = f"Failed after {attempts} attempts" if retry else "Failed"
+        job.completed_at = datetime.utcnow()
+        self._publish(job)
+        db.session.commit()
+        with self._lock:
+            self.failed += 1
+        on_failure = (self._handlers.get(job.job_type) or {}).get('on_failure')
+        if on_failure:
+            try:
+                on_failure(job, error)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"⚠️ Failure handler for job {job.id} raised: {e}")
+
+    @staticmethod
+    def _publish(job: ProcessingJob, **extra):
+        """Job status event for SSE streams; sent when the caller commits"""
+        event = {
+            'job_id': job.id,
+            'document_id': job.document_id,
+            'job_type': job.job_type,
+            'status': job.status,
+            'progress': job.progress or 0,
+            'attempts': job.attempts or 0,
+            'message': job.status_message,
+            'error_message': job.error_message
+        }
+        event.update(extra)
+        job_events.publish('status', **event)
+
+    def recover_stale(self) -> int:
+        """Return jobs locked by workers that died (no progress for ``lock_timeout``) to the queue"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lock_timeout)
+        recovered = (ProcessingJob.query
+                     .filter(ProcessingJob.status == 'running',
+                             ProcessingJob.locked_by.isnot(None),
+                             ProcessingJob.locked_at < cutoff)
+                     .update({'status': 'pending', 'locked_by': None, 'locked_at': None,
+                              'run_after': datetime.utcnow()},
+                             synchronize_session=False))
+        db.session.commit()
+        if recovered:
+            with self._lock:
+                self.recovered += recovered
+            print(f"♻️ Requeued {recovered} jobs abandoned by stopped workers")
+        return recovered
+
+    def depth(self) -> Dict[str, int]:
+        """Jobs per status for the queue's job types"""
+        rows = (db.session.query(ProcessingJob.status, func.count(ProcessingJob.id))
+                .filter(ProcessingJob.job_type.in_(self.job_types))
+                .group_by(ProcessingJob.status)
+                .all())
+        return {status: count for status, count in rows}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'job_types': self.job_types,
+                'enqueued': self.enqueued,
+                'claimed': self.claimed,
+                'completed': self.completed,
+                'retried': self.retried,
+                'failed': self.failed,
+                'recovered': self.recovered
+            }
+        try:
+            stats['depth'] = self.depth()
+        except Exception:
+            db.session.rollback()
+        return stats
+
+
+class WorkerPool:
+    """``concurrency`` threads that claim and run jobs until stopped"""
+
+    def __init__(self, app, queue: JobQueue, concurrency: int = 2, poll_interval: float = 1.0,
+                 job_types: Optional[List[str]] = None, name: Optional[str] = None):
+        self.app = app
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.job_types = job_types
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._recovered_at = 0.0
+
+    def start(self):
+        with self.app.app_context():
+            self.queue.recover_stale()
+        self._recovered_at = time.monotonic()
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, args=(f"{self.name}:{i}",),
+                                      name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"👷 Job workers started: {self.concurrency} x {', '.join(self.job_types or self.queue.job_types)}")
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        """Finish running jobs, then stop claiming"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def wait(self):
+        while not self._stop.is_set():
+            self._stop.wait(1.0)
+
+    def run_once(self, worker_id: Optional[str] = None) -> bool:
+        """Claim and run one job; False when the queue had nothing runnable"""
+        with self.app.app_context():
+            return self._run_next(worker_id or self.name)
+
+    def _run_next(self, worker_id: str) -> bool:
+        try:
+            job = self.queue.claim(worker_id, self.job_types)
+            if job is None:
+                return False
+            self.queue.run(job)
+            return True
+        finally:
+            # Hand the connection back to the pool between jobs
+            db.session.remove()
+
+    def _loop(self, worker_id: str):
+        # One app context for the thread's lifetime: no per-job setup
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    if self._run_next(worker_id):
+                        continue
+                    # Any idle worker periodically requeues jobs of dead workers
+                    if time.monotonic() - self._recovered_at > self.queue.lock_timeout / 4:
+                        self._recovered_at = time.monotonic()
+                        self.queue.recover_stale()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️ Job worker {worker_id} error: {e}")
+                self._stop.wait(self.poll_interval)
+
+
+# Global queue instance
+job_queue = JobQueue()
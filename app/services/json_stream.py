@@ -0,0 +1,256 @@
+"""
+JSON Stream
+Tolerant, incremental extraction of the JSON value an LLM is asked to return:
+skips surrounding prose and code fences, reports finished array items and
+object fields while tokens are still arriving, and repairs common
+malformations (raw newlines in strings, trailing commas, missing closers,
+Python literals) without another LLM call
+"""
+
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+_PYTHON_LITERALS = re.compile(r"\b(True|False|None)\b")
+_LITERAL_MAP = {'True': 'true', 'False': 'false', 'None': 'null'}
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+def _find_root(text: str) -> int:
+    """Index of the first '{' or '[' that can start the answer, or -1"""
+    for match in re.finditer(r"[\[{]", text):
+        rest = text[match.end():].lstrip()
+        # "[" in prose ("see [1]") is not a JSON array of objects or strings
+        if match.group() == '{' or not rest or rest[0] in '{"]\'':
+            return match.start()
+    return -1
+
+
+def _repair(fragment: str) -> str:
+    """Close and clean a possibly truncated or sloppy JSON fragment"""
+    out = []
+    stack = []
+    in_string = False
+    escape = False
+
+    for c in fragment:
+        if in_string:
+            if escape:
+                escape = False
+            elif c == '\\':
+                escape = True
+            elif c == '"':
+                in_string = False
+            elif c == '\n':
+                c = '\\n'
+            elif c == '\r':
+                c = '\\r'
+            elif c == '\t':
+                c = '\\t'
+            out.append(c)
+            continue
+
+        if c == '"':
+            in_string = True
+        elif c in '{[':
+            stack.append(c)
+        elif c in '}]':
+            _drop_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(c)
+            if not stack:
+                break
+            continue
+        out.append(c)
+
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+    text = "".join(out).rstrip()
+    if text.endswith(':'):
+        text += ' null'
+    chars = list(text)
+    _drop_trailing_comma(chars)
+    text = "".join(chars)
+    return text + "".join(_CLOSERS[b] for b in reversed(stack))
+
+
+def _drop_trailing_comma(chars: List[str]):
+    i = len(chars) - 1
+    while i >= 0 and chars[i].isspace():
+        i -= 1
+    if i >= 0 and chars[i] == ',':
+        del chars[i:]
+
+
+def _replace_literals(text: str) -> str:
+    """True/False/None outside strings become JSON literals"""
+    parts = re.split(r'("(?:[^"\\]|\\.)*")', text)
+    return "".join(p if i % 2 else _PYTHON_LITERALS.sub(lambda m: _LITERAL_MAP[m.group()], p)
+                   for i, p in enumerate(parts))
+
+
+def loads_lenient(text: str) -> Any:
+    """Parse the JSON value in an LLM reply, repairing it if needed
+
+    Raises ValueError when no JSON value can be recovered.
+    """
+    text = (text or "").strip()
+    # strict=False: raw newlines and tabs inside strings (multi-line mainBody) are kept as they are
+    for attempt in (text, _replace_literals(text)):
+        try:
+            return json.loads(attempt, strict=False)
+        except ValueError:
+            pass
+
+    start = _find_root(text)
+    if start < 0:
+        raise ValueError("No JSON value found in response")
+    fragment = text[start:].replace('“', '"').replace('”', '"')
+
+    candidate = _replace_literals(_repair(fragment))
+    for _ in range(8):
+        try:
+            return json.loads(candidate, strict=False)
+        except ValueError:
+            # Drop the last, incomplete member and close again
+            cut = candidate.rstrip('}] \n').rfind(',')
+            if cut <= 0:
+                break
+            candidate = _replace_literals(_repair(candidate[:cut]))
+    raise ValueError("Could not repair JSON response")
+
+
+class JSONStreamParser:
+    """Incremental parser for a streamed JSON object or array
+
+    ``feed`` returns events as they become available:
+
+    - ``('item', index, value)``: a top-level array element finished
+    - ``('field', key, value)``: a top-level object member finished
+    - ``('partial', key, text)``: a top-level string value still being streamed
+
+    ``close`` returns the whole value, repaired if necessary.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.done = False
+        self._pos = 0
+        self._root = None          # '{' or '['
+        self._root_start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = None
+        self._items = 0
+        self._key = None
+        self._key_start = None
+        self._expect_key = False
+        self._value_start = None
+        self._string_start = None  # start of a top-level string value
+        self._partial = None
+
+    def feed(self, chunk: str) -> List[Tuple]:
+        events = []
+        if self.done or not chunk:
+            return events
+        self.text += chunk
+
+        if self._root is None:
+            start = _find_root(self.text)
+            if start < 0:
+                return events
+            self._root = self.text[start]
+            self._root_start = start
+            self._depth = 1
+            self._member_start = start + 1
+            self._expect_key = self._root == '{'
+            self._pos = start + 1
+
+        text = self.text
+        while self._pos < len(text) and not self.done:
+            i, c = self._pos, text[self._pos]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._key = self._decode(text[self._key_start:i + 1])
+                        self._key_start = None
+                        self._expect_key = False
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._root == '{':
+                    if self._expect_key:
+                        self._key_start = i
+                    elif self._value_start is not None and not text[self._value_start:i].strip():
+                        self._string_start = i
+            elif c in '{[':
+                self._depth += 1
+            elif c in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_member(i, events)
+                    self.done = True
+            elif c == ',' and self._depth == 1:
+                self._finish_member(i, events)
+                self._member_start = i + 1
+                self._expect_key = self._root == '{'
+            elif c == ':' and self._depth == 1 and self._root == '{':
+                self._value_start = i + 1
+
+        self._emit_partial(events)
+        return events
+
+    def _finish_member(self, end: int, events: List[Tuple]):
+        """The top-level member that started at ``_member_start`` ends at ``end``"""
+        member = self.text[self._member_start:end]
+        self._string_start = None
+        self._partial = None
+        if not member.strip():
+            return
+        try:
+            if self._root == '[':
+                events.append(('item', self._items, loads_lenient(member)))
+                self._items += 1
+            elif self._key is not None and self._value_start is not None:
+                events.append(('field', self._key, loads_lenient(self.text[self._value_start:end])))
+        except ValueError:
+            pass
+        finally:
+            self._key = None
+            self._value_start = None
+
+    def _emit_partial(self, events: List[Tuple]):
+        if not (self._in_string and self._string_start is not None and self._key is not None):
+            return
+        raw = self.text[self._string_start + 1:]
+        if raw.endswith('\\'):
+            raw = raw[:-1]
+        value = self._decode('"' + raw.replace('\n', '\\n') + '"', default=raw)
+        if value != self._partial:
+            self._partial = value
+            events.append(('partial', self._key, value))
+
+    @staticmethod
+    def _decode(literal: str, default: Optional[str] = None) -> Any:
+        try:
+            return json.loads(literal.replace('\n', '\\n'))
+        except ValueError:
+            return default if default is not None else literal.strip('"')
+
+    def close(self) -> Any:
+        """The complete value (repaired); raises ValueError when there is none"""
+        if self._root_start is None:
+            return loads_lenient(self.text)
+        return loads_lenient(self.text[self._root_start:])
@@ -10,12 +10,14 @@ from werkzeug.utils import secure_filename
 from flask import current_app, request
 import uuid
 from datetime import datetime
+from werkzeug.exceptions import HTTPException
+from app.services.upload_stream import upload_receiver, UploadSink, COPY_BUFFER
 
 class LargeFileUploadService:
     """Service for handling large file uploads"""
     
     def __init__(self):
-        self.max_file_size = 500 * 1024 * 1024  # 500MB
+        self.max_file_size = upload_receiver.max_file_size  # 500MB unless UPLOAD_MAX_FILE_SIZE is set
         self.allowed_extensions = {
             'pdf', 'png', 'jpg', 'jpeg', 'tiff', 'bmp', 'gif', 
             'txt', 'doc', 'docx', 'rtf'
@@ -65,22 +67,37 @@ class LargeFileUploadService:
             # Ensure upload directory exists
             os.makedirs(upload_folder, exist_ok=True)
             
-            # Save file
-            file.save(file_path)
+            # Uploads to streaming endpoints were received, hashed and size-checked
+            # straight into the upload folder while the request was parsed
+            sink = file.stream
+            if not isinstance(sink, UploadSink):
+                sink = upload_receiver.open(upload_folder)
+                try:
+                    for chunk in iter(lambda: file.stream.read(COPY_BUFFER), b""):
+                        sink.write(chunk)
+                except Exception:
+                    sink.close()
+                    raise
+            
+            # fsync and rename into place: the file is complete or absent, never partial
+            sink.commit(file_path)
+            upload_receiver.record(sink)
             
             # Get file info
             file_info = {
                 'original_name': filename,
                 'saved_name': unique_filename,
                 'file_path': file_path,
-                'file_size': os.path.getsize(file_path),
-                'mime_type': mimetypes.guess_type(filename)[0],
+                'file_size': sink.size,
+                'mime_type': file.content_type or mimetypes.guess_type(filename)[0],
                 'upload_time': datetime.utcnow(),
-                'file_hash': self._calculate_file_hash(file_path)
+                'file_hash': sink.hexdigest
             }
             
             return file_info, None
             
+        except HTTPException:
+            raise
         except Exception as e:
             return None, str(e)
     
@@ -0,0 +1,255 @@
+"""
+Batch Lesson Note Generation
+Generates every lesson of a progression as one resumable ProcessingJob, with
+bounded concurrency against the LLM queue and a checkpoint per finished note
+"""
+
+import copy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from flask import current_app
+
+from app.models import db, ProcessingJob
+from app.services.lesson_index import lesson_indexer
+from app.services.llm_queue import LLMQueueRejected
+
+JOB_TYPE = 'lesson_batch'
+
+
+class LessonBatchRunner:
+    """Runs lesson_batch jobs on background threads
+
+    The job's ``result_data`` is the checkpoint::
+
+        {'subject': ..., 'class_level': ..., 'lessons': [{'lesson': ...}, ...] or None,
+         'completed': {lesson: {...}}, 'failed': {lesson: error}}
+
+    Workers run in an app context of their own so lesson context and the
+    curriculum digest can read chunks; only the runner thread writes, and it
+    commits the checkpoint after every finished lesson, so a crashed or
+    failed run resumes with just the lessons still missing.
+    """
+
+    def __init__(self, concurrency: int = 2, queue_retries: int = 5, output_dir: str = 'lesson_notes'):
+        self.concurrency = concurrency
+        self.queue_retries = queue_retries
+        self.output_dir = output_dir
+
+        self._app = None
+        self._lock = threading.Lock()
+        self._active = set()
+
+    def init_app(self, app):
+        """Apply batch settings from the Flask config"""
+        self._app = app
+        self.concurrency = app.config.get('LESSON_BATCH_CONCURRENCY', self.concurrency)
+        self.queue_retries = app.config.get('LESSON_BATCH_QUEUE_RETRIES', self.queue_retries)
+        self.output_dir = app.config.get('LESSON_NOTES_FOLDER', self.output_dir)
+
+    @staticmethod
+    def normalize_lessons(lessons: Optional[List[Any]]) -> Optional[List[Dict[str, str]]]:
+        """Accept lesson dicts or plain titles; drop blanks and duplicates"""
+        if not lessons:
+            return None
+        normalized, seen = [], set()
+        for lesson in lessons:
+            title = lesson.get('lesson', '') if isinstance(lesson, dict) else str(lesson)
+            title = title.strip()
+            if title and title not in seen:
+                seen.add(title)
+                normalized.append({'lesson': title})
+        return normalized or None
+
+    def create_job(self, subject: str, class_level: str, lessons: Optional[List[Any]] = None) -> ProcessingJob:
+        """Create a pending batch job; no lessons means every lesson in the progression"""
+        job = ProcessingJob(
+            job_type=JOB_TYPE,
+            status='pending',
+            progress=0,
+            result_data={
+                'subject': subject,
+                'class_level': class_level,
+                'lessons': self.normalize_lessons(lessons),
+                'completed': {},
+                'failed': {}
+            }
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    def is_active(self, job_id) -> bool:
+        with self._lock:
+            return str(job_id) in self._active
+
+    def start(self, job_id) -> bool:
+        """Run the job on a background thread unless it is already running here"""
+        with self._lock:
+            if str(job_id) in self._active:
+                return False
+            self._active.add(str(job_id))
+
+        thread = threading.Thread(target=self._run_in_context, args=(job_id,), daemon=True)
+        thread.start()
+        return True
+
+    def _run_in_context(self, job_id):
+        try:
+            with self._app.app_context():
+                self.run(job_id)
+        finally:
+            with self._lock:
+                self._active.discard(str(job_id))
+
+    def run(self, job_id) -> Optional[ProcessingJob]:
+        """Generate every lesson not yet checkpointed as completed"""
+        from app.services.lesson_service import LessonNoteService
+
+        job = ProcessingJob.query.get(job_id)
+        if job is None or job.job_type != JOB_TYPE:
+            return None
+
+        data = copy.deepcopy(job.result_data or {})
+        data['failed'] = {}  # failed lessons are retried on every run
+        job.status = 'running'
+        job.error_message = None
+        job.started_at = job.started_at or datetime.utcnow()
+        job.result_data = data
+        db.session.commit()
+
+        app = current_app._get_current_object()
+        client_id = f"lesson-batch-{job.id}"
+
+        def make_service():
+            service = LessonNoteService()
+            # Batch calls queue as one client so interactive users keep their fair share
+            service.queue_client_id = client_id
+            return service
+
+        try:
+            service = make_service()
+            documents_data = service.get_subject_documents(data['subject'], data['class_level']) or {}
+
+            if not data.get('lessons'):
+                progression = documents_data.get('progression_documents') or []
+                data['lessons'] = self.normalize_lessons(
+                    lesson_indexer.lessons(data['subject'], data['class_level']) or self._with_queue_retries(
+                        lambda: service.extract_lesson_titles(progression, data['subject'], data['class_level'])))
+                if not data['lessons']:
+                    raise Exception('No lessons could be extracted from progression documents')
+                self._checkpoint(job, data)
+
+            todo = [l for l in data['lessons'] if l['lesson'] not in data['completed']]
+            print(f"📚 Lesson batch {job.id}: {len(todo)} of {len(data['lessons'])} lessons to generate")
+
+            with ThreadPoolExecutor(max_workers=max(1, self.concurrency),
+                                    thread_name_prefix='lesson-batch') as executor:
+                futures = {
+                    executor.submit(self._generate_in_context, app, make_service, data, lesson, documents_data): lesson
+                    for lesson in todo
+                }
+                for future in as_completed(futures):
+                    title = futures[future]['lesson']
+                    try:
+                        data['completed'][title] = future.result()
+                    except Exception as e:
+                        data['failed'][title] = str(e)
+                        print(f"❌ Lesson batch {job.id}: '{title}' failed: {e}")
+                    self._checkpoint(job, data)
+
+            job.status = 'failed' if data['failed'] else 'completed'
+            if data['failed']:
+                job.error_message = f"{len(data['failed'])} lesson(s) failed; resume the job to retry them"
+        except Exception as e:
+            db.session.rollback()
+            job.status = 'failed'
+            job.error_message = str(e)
+
+        job.completed_at = datetime.utcnow()
+        self._checkpoint(job, data)
+        return job
+
+    def _generate_in_context(self, app, make_service, *args) -> Dict[str, Any]:
+        # Executor threads have no app context: retrieval reads the database.
+        # A service per lesson: its last_generation_stats must not be overwritten by another worker
+        with app.app_context():
+            return self._generate_one(make_service(), *args)
+
+    def _generate_one(self, service, data: Dict[str, Any], lesson: Dict[str, str],
+                      documents_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate and save one note (runs on a worker thread, reads only)"""
+        lesson_note = self._with_queue_retries(lambda: service.generate_lesson_note(
+            subject=data['subject'],
+            class_level=data['class_level'],
+            lesson_info=lesson,
+            documents=documents_data.get('documents') or [],
+            curriculum=documents_data.get('curriculum_documents') or []
+        ))
+        if 'error' in lesson_note:
+            raise Exception(lesson_note['error'])
+
+        file_path = service.save_lesson_note_locally(lesson_note, output_dir=self.output_dir)
+        return {
+            'title': lesson_note.get('lessonTitle', lesson['lesson']),
+            'file_path': file_path,
+            'lesson_note': lesson_note,
+            'generation_stats': service.last_generation_stats,
+            'generated_at': datetime.utcnow().isoformat()
+        }
+
+    def _with_queue_retries(self, fn):
+        """Batch work waits out a full LLM queue instead of failing the lesson"""
+        for attempt in range(self.queue_retries + 1):
+            try:
+                return fn()
+            except LLMQueueRejected as e:
+                if attempt == self.queue_retries:
+                    raise
+                time.sleep(e.retry_after or 10)
+
+    @staticmethod
+    def _checkpoint(job: ProcessingJob, data: Dict[str, Any]):
+        """Persist progress and finished notes"""
+        total = len(data.get('lessons') or [])
+        job.progress = int(len(data['completed']) * 100 / total) if total else 0
+        job.result_data = copy.deepcopy(data)
+        db.session.commit()
+
+    @staticmethod
+    def summarize(job: ProcessingJob) -> Dict[str, Any]:
+        """Status payload for the batch status endpoint"""
+        data = job.result_data or {}
+        lessons = data.get('lessons') or []
+        completed = data.get('completed') or {}
+        return {
+            'job_id': str(job.id),
+            'status': job.status,
+            'progress': job.progress,
+            'subject': data.get('subject'),
+            'class_level': data.get('class_level'),
+            'total_lessons': len(lessons),
+            'completed_lessons': len(completed),
+            'lessons': [
+                {
+                    'lesson': lesson['lesson'],
+                    'status': 'completed' if lesson['lesson'] in completed
+                    else 'failed' if lesson['lesson'] in (data.get('failed') or {}) else 'pending',
+                    'title': (completed.get(lesson['lesson']) or {}).get('title'),
+                    'file_path': (completed.get(lesson['lesson']) or {}).get('file_path'),
+                    'error': (data.get('failed') or {}).get(lesson['lesson'])
+                }
+                for lesson in lessons
+            ],
+            'error_message': job.error_message,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'completed_at': job.completed_at.isoformat() if job.completed_at else None
+        }
+
+
+# Global runner instance
+lesson_batch_runner = LessonBatchRunner()
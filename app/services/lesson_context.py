@@ -0,0 +1,281 @@
+"""
+Lesson Context
+Selects the textbook and curriculum chunks relevant to one lesson title, within
+a token budget, so lesson prompts stop carrying every document of the subject
+"""
+
+import math
+import re
+import threading
+import unicodedata
+import uuid
+from collections import Counter
+from typing import Dict, Any, List, Optional, Iterable
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.models import db, Document, DocumentChunk, LessonChunkMap
+
+# Document types that are not textbook material
+NON_TEXTBOOK_TYPES = ('curriculum', 'progression')
+
+# Common English and French words carry no topic signal
+STOPWORDS = frozenset("""
+a an and are as at be by for from in into is it of on or the their this to with
+lesson lessons chapter unit week term
+au aux avec ce ces dans de des du en est et la le les leur leurs par pour sa se ses
+sur un une lecon chapitre semaine trimestre
+""".split())
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~3 characters per token, conservative for French)"""
+    return len(text or "") // 3 + 1
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, accent-folded content words"""
+    folded = unicodedata.normalize('NFKD', (text or "").lower())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return [w for w in _WORD.findall(folded) if len(w) > 2 and w not in STOPWORDS]
+
+
+class LessonContextBuilder:
+    """Builds the per-lesson textbook and curriculum context for lesson notes
+
+    Lessons indexed in ``lesson_chunk_map`` are a lookup of their mapped
+    chunks. Otherwise chunks of the subject and class are ranked against the
+    lesson title with BM25 and the best ``top_k`` are kept while they fit the
+    token budget (``curriculum_share`` of it goes to curriculum). Selected
+    chunks keep their document order so the prompt reads like the source.
+    """
+
+    def __init__(self, top_k: int = 6, token_budget: int = 3000, curriculum_share: float = 0.35,
+                 passage_chars: int = 1200):
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.curriculum_share = curriculum_share
+        self.passage_chars = passage_chars
+
+        self._lock = threading.Lock()
+        self.contexts = 0
+        self.map_hits = 0
+        self.context_tokens_total = 0
+        self.generations = 0
+        self.prompt_tokens_total = 0
+        self.latency_total = 0.0
+
+    def init_app(self, app):
+        """Apply retrieval settings from the Flask config"""
+        self.top_k = app.config.get('LESSON_CONTEXT_TOP_K', self.top_k)
+        self.token_budget = app.config.get('LESSON_CONTEXT_TOKEN_BUDGET', self.token_budget)
+        self.curriculum_share = app.config.get('LESSON_CONTEXT_CURRICULUM_SHARE', self.curriculum_share)
+
+    def build(self, subject: str, class_level: str, lesson_title: str,
+              documents: Optional[List[Dict]] = None, curriculum: Optional[List[Dict]] = None,
+              include_curriculum: bool = True) -> Dict[str, Any]:
+        """Textbook and curriculum context for one lesson
+
+        Chunks come from the database for the subject and class; ``documents``
+        and ``curriculum`` (dicts with ``content``) are split into passages
+        when no chunks are stored for them. Without ``include_curriculum`` the
+        curriculum share of the budget is left to the caller (the digest).
+        """
+        curriculum_budget = int(self.token_budget * self.curriculum_share)
+        textbook_budget = self.token_budget - curriculum_budget
+        if not include_curriculum:
+            curriculum_budget = 0
+
+        mapped = self._mapped_chunks(subject, class_level, lesson_title)
+        if mapped is not None:
+            textbook_chunks = self.fit(mapped['textbook'], textbook_budget)
+            curriculum_chunks = self.fit(mapped['curriculum'], curriculum_budget)
+        else:
+            textbook_chunks = self.select(lesson_title, self._passages(subject, class_level, False, documents),
+                                          self.top_k, textbook_budget)
+            curriculum_chunks = self.select(lesson_title, self._passages(subject, class_level, True, curriculum),
+                                            self.curriculum_top_k, curriculum_budget) if include_curriculum else []
+
+        textbook = "\n\n".join(c['content'] for c in textbook_chunks)
+        curriculum_text = "\n\n".join(c['content'] for c in curriculum_chunks)
+        context_tokens = estimate_tokens(textbook) + estimate_tokens(curriculum_text)
+
+        with self._lock:
+            self.contexts += 1
+            self.map_hits += mapped is not None
+            self.context_tokens_total += context_tokens
+
+        return {
+            'textbook': textbook,
+            'curriculum': curriculum_text,
+            'chunk_ids': [c['id'] for c in textbook_chunks + curriculum_chunks if c.get('id')],
+            'context_tokens': context_tokens
+        }
+
+    @property
+    def curriculum_top_k(self) -> int:
+        return max(1, self.top_k // 2)
+
+    @staticmethod
+    def fit(passages: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+        """Leading passages that fit ``budget`` tokens"""
+        chosen, used = [], 0
+        for passage in passages:
+            cost = estimate_tokens(passage['content'])
+            if used + cost > budget:
+                break
+            chosen.append(passage)
+            used += cost
+        return chosen
+
+    def select(self, query: str, passages: List[Dict[str, Any]], top_k: int, budget: int) -> List[Dict[str, Any]]:
+        """Best-scoring passages for ``query`` that fit ``budget`` tokens, in source order"""
+        if not passages or budget <= 0:
+            return []
+
+        scores = self.score(query, [p['content'] for p in passages])
+        ranked = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+        relevant = scores[ranked[0]] > 0
+        if not relevant:
+            # Without any term overlap, fall back to the opening passages
+            ranked = list(range(len(passages)))
+
+        chosen, used = [], 0
+        for i in ranked:
+            if len(chosen) >= top_k or (relevant and scores[i] <= 0):
+                break
+            cost = estimate_tokens(passages[i]['content'])
+            if used + cost > budget:
+                if chosen:
+                    continue
+                # A single oversized passage is cut to the budget rather than dropped
+                passages[i] = dict(passages[i], content=passages[i]['content'][:budget * 3])
+                cost = budget
+            chosen.append(i)
+            used += cost
+
+        return [passages[i] for i in sorted(chosen)]
+
+    @staticmethod
+    def score(query: str, texts: List[str], k1: float = 1.5, b: float = 0.75) -> List[float]:
+        """BM25 score of every text against the query terms"""
+        terms = set(tokenize(query))
+        docs = [Counter(tokenize(t)) for t in texts]
+        if not terms or not docs:
+            return [0.0] * len(texts)
+
+        avg_len = sum(sum(d.values()) for d in docs) / len(docs) or 1.0
+        idf = {}
+        for term in terms:
+            df = sum(1 for d in docs if term in d)
+            idf[term] = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+
+        scores = []
+        for d in docs:
+            length = sum(d.values())
+            s = 0.0
+            for term in terms:
+                tf = d.get(term, 0)
+                if tf:
+                    s += idf[term] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+            scores.append(s)
+        return scores
+
+    def _passages(self, subject: str, class_level: str, curriculum: bool,
+                  fallback: Optional[Iterable[Dict]]) -> List[Dict[str, Any]]:
+        passages = self.stored_chunks(subject, class_level, curriculum)
+        if passages:
+            return passages
+        return [{'id': None, 'content': text}
+                for doc in (fallback or []) for text in self._split(doc.get('content') or '')]
+
+    def _mapped_chunks(self, subject: str, class_level: str, lesson_title: str) -> Optional[Dict[str, List[Dict]]]:
+        """Chunks precomputed for the lesson, or None when it is not indexed"""
+        try:
+            entry = LessonChunkMap.query.filter_by(subject=subject, class_level=class_level,
+                                                   lesson=lesson_title).first()
+            if entry is None:
+                return None
+            rows = self.chunks_by_id(entry.textbook_chunk_ids + entry.curriculum_chunk_ids)
+            # Chunks of deleted documents simply drop out
+            mapped = {
+                'textbook': [{'id': i, 'content': rows[i]} for i in entry.textbook_chunk_ids if i in rows],
+                'curriculum': [{'id': i, 'content': rows[i]} for i in entry.curriculum_chunk_ids if i in rows]
+            }
+            return mapped if mapped['textbook'] or mapped['curriculum'] else None
+        except SQLAlchemyError as e:
+            print(f"⚠️ Lesson chunk map lookup failed: {e}")
+            return None
+
+    @staticmethod
+    def chunks_by_id(chunk_ids: List[str]) -> Dict[str, str]:
+        """Content of the given chunks, keyed by id"""
+        if not chunk_ids:
+            return {}
+        rows = (db.session.query(DocumentChunk.id, DocumentChunk.content)
+                .filter(DocumentChunk.id.in_([uuid.UUID(i) for i in chunk_ids]))
+                .all())
+        return {str(chunk_id): content for chunk_id, content in rows}
+
+    @staticmethod
+    def stored_chunks(subject: str, class_level: str, curriculum: bool,
+                      document_ids: Optional[List] = None) -> List[Dict[str, Any]]:
+        """Chunks of the subject and class in source order, optionally of some documents only"""
+        try:
+            query = (db.session.query(DocumentChunk.id, DocumentChunk.content)
+                     .join(Document, DocumentChunk.document_id == Document.id)
+                     .filter(Document.subject == subject, Document.class_level == class_level))
+            if document_ids is not None:
+                query = query.filter(Document.id.in_(document_ids))
+            if curriculum:
+                query = query.filter(Document.document_type == 'curriculum')
+            else:
+                query = query.filter(db.or_(Document.document_type.is_(None),
+                                            Document.document_type.notin_(NON_TEXTBOOK_TYPES)))
+            rows = query.order_by(Document.created_at, DocumentChunk.chunk_index).all()
+            return [{'id': str(chunk_id), 'content': content} for chunk_id, content in rows if content]
+        except SQLAlchemyError as e:
+            print(f"⚠️ Could not load chunks for {subject} {class_level}: {e}")
+            return []
+
+    def _split(self, text: str) -> List[str]:
+        """Paragraph passages of at most ``passage_chars`` characters"""
+        passages, current = [], ""
+        for paragraph in re.split(r"\n\s*\n", text):
+            paragraph = paragraph.strip()
+            while len(paragraph) > self.passage_chars:
+                passages.append(paragraph[:self.passage_chars])
+                paragraph = paragraph[self.passage_chars:]
+            if current and len(current) + len(paragraph) + 2 > self.passage_chars:
+                passages.append(current)
+                current = ""
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current.strip():
+            passages.append(current)
+        return passages
+
+    def record_generation(self, prompt_tokens: int, latency: float):
+        """Account one lesson note generation"""
+        with self._lock:
+            self.generations += 1
+            self.prompt_tokens_total += prompt_tokens or 0
+            self.latency_total += latency
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'top_k': self.top_k,
+                'token_budget': self.token_budget,
+                'contexts_built': self.contexts,
+                'chunk_map_hits': self.map_hits,
+                'context_tokens_avg': round(self.context_tokens_total / self.contexts) if self.contexts else 0,
+                'lessons_generated': self.generations,
+                'prompt_tokens_avg': round(self.prompt_tokens_total / self.generations) if self.generations else 0,
+                'latency_avg': round(self.latency_total / self.generations, 3) if self.generations else 0.0
+            }
+
+
+# Global context builder
+lesson_context = LessonContextBuilder()
@@ -0,0 +1,182 @@
+"""
+Lesson Index
+Background stage that maps every progression lesson of a subject and class to
+its best-matching textbook and curriculum chunks once, at ingestion time
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.models import db, Document, LessonChunkMap
+from app.services.lesson_context import lesson_context
+
+_FULL = None  # pending marker: rebuild the whole subject and class
+
+
+class LessonIndexer:
+    """Maintains ``lesson_chunk_map`` for each subject and class
+
+    A new progression rebuilds the map from its lesson list. A new textbook
+    or curriculum document only re-ranks each lesson's mapped chunks together
+    with the new document's chunks, so older documents are not scanned again.
+    Work runs on one background worker and is coalesced per subject and class.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+
+        self._app = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='lesson-index')
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], Optional[set]] = {}
+        self.rebuilds = 0
+        self.updates = 0
+        self.failures = 0
+
+    def init_app(self, app):
+        """Apply indexing settings from the Flask config"""
+        self._app = app
+        self.enabled = app.config.get('LESSON_INDEX_ENABLED', self.enabled)
+
+    def schedule(self, subject: str, class_level: str, document_id=None, document_type: Optional[str] = None) -> bool:
+        """Queue an index update after ``document_id`` was ingested (a full rebuild for progressions)"""
+        if not self.enabled or self._app is None or not subject or not class_level:
+            return False
+
+        key = (subject, class_level)
+        full = document_id is None or document_type == 'progression'
+        with self._lock:
+            queued = key in self._pending
+            if full:
+                self._pending[key] = _FULL
+            elif not queued:
+                self._pending[key] = {document_id}
+            elif self._pending[key] is not _FULL:
+                self._pending[key].add(document_id)
+            if queued:
+                return True
+        self._executor.submit(self._run, key)
+        return True
+
+    def _run(self, key):
+        with self._lock:
+            document_ids = self._pending.pop(key, _FULL)
+        try:
+            with self._app.app_context():
+                if document_ids is _FULL:
+                    self.rebuild(*key)
+                else:
+                    self.update(*key, document_ids=list(document_ids))
+        except Exception as e:
+            self.failures += 1
+            print(f"⚠️ Lesson index update failed for {key[0]} {key[1]}: {e}")
+
+    def lessons(self, subject: str, class_level: str) -> List[Dict[str, str]]:
+        """Indexed lesson list in progression order"""
+        entries = (LessonChunkMap.query
+                   .filter_by(subject=subject, class_level=class_level)
+                   .order_by(LessonChunkMap.position)
+                   .all())
+        return [{'lesson': entry.lesson} for entry in entries]
+
+    def rebuild(self, subject: str, class_level: str) -> int:
+        """Map every lesson of the subject's progression; returns the number of lessons indexed"""
+        from app.services.lesson_service import LessonNoteService
+
+        progression = self._progression_lines(subject, class_level)
+        lessons = []
+        if progression:
+            service = LessonNoteService()
+            service.queue_client_id = f"lesson-index-{subject}-{class_level}"
+            lessons = service.extract_lesson_titles(progression, subject, class_level)
+
+        titles = []
+        for lesson in lessons or []:
+            title = (lesson.get('lesson') or '').strip()[:500]
+            if title and title not in titles:
+                titles.append(title)
+
+        textbook = lesson_context.stored_chunks(subject, class_level, curriculum=False)
+        curriculum = lesson_context.stored_chunks(subject, class_level, curriculum=True)
+        existing = {entry.lesson: entry for entry in
+                    LessonChunkMap.query.filter_by(subject=subject, class_level=class_level).all()}
+
+        for position, title in enumerate(titles):
+            entry = existing.pop(title, None) or LessonChunkMap(subject=subject, class_level=class_level, lesson=title)
+            entry.position = position
+            entry.textbook_chunk_ids = self._rank(title, textbook, lesson_context.top_k)
+            entry.curriculum_chunk_ids = self._rank(title, curriculum, lesson_context.curriculum_top_k)
+            db.session.add(entry)
+        for stale in existing.values():
+            db.session.delete(stale)
+
+        db.session.commit()
+        self.rebuilds += 1
+        print(f"🗂️ Lesson index rebuilt for {subject} {class_level}: {len(titles)} lessons")
+        return len(titles)
+
+    def update(self, subject: str, class_level: str, document_ids: List) -> int:
+        """Fold newly ingested documents into the existing map; returns lessons changed"""
+        entries = LessonChunkMap.query.filter_by(subject=subject, class_level=class_level).all()
+        if not entries:
+            return self.rebuild(subject, class_level)
+
+        new_textbook = lesson_context.stored_chunks(subject, class_level, False, document_ids)
+        new_curriculum = lesson_context.stored_chunks(subject, class_level, True, document_ids)
+        if not new_textbook and not new_curriculum:
+            return 0
+
+        # Only the currently mapped chunks compete with the new ones
+        mapped = lesson_context.chunks_by_id(list({i for entry in entries
+                                                   for i in entry.textbook_chunk_ids + entry.curriculum_chunk_ids}))
+
+        changed = 0
+        for entry in entries:
+            textbook = [{'id': i, 'content': mapped[i]} for i in entry.textbook_chunk_ids if i in mapped] + new_textbook
+            curriculum = [{'id': i, 'content': mapped[i]} for i in entry.curriculum_chunk_ids if i in mapped] + new_curriculum
+            textbook_ids = self._rank(entry.lesson, textbook, lesson_context.top_k)
+            curriculum_ids = self._rank(entry.lesson, curriculum, lesson_context.curriculum_top_k)
+            if textbook_ids != entry.textbook_chunk_ids or curriculum_ids != entry.curriculum_chunk_ids:
+                entry.textbook_chunk_ids = textbook_ids
+                entry.curriculum_chunk_ids = curriculum_ids
+                changed += 1
+
+        db.session.commit()
+        self.updates += 1
+        print(f"🗂️ Lesson index updated for {subject} {class_level}: {changed} lessons remapped")
+        return changed
+
+    @staticmethod
+    def _rank(title: str, passages: List[Dict[str, Any]], top_k: int) -> List[str]:
+        """Best chunk ids for a lesson, best first (the token budget is applied at generation)"""
+        if not passages:
+            return []
+        scores = lesson_context.score(title, [p['content'] for p in passages])
+        ranked = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+        return [passages[i]['id'] for i in ranked[:top_k] if scores[i] > 0]
+
+    @staticmethod
+    def _progression_lines(subject: str, class_level: str) -> List[Dict[str, str]]:
+        documents = (Document.query
+                     .filter_by(subject=subject, class_level=class_level, document_type='progression')
+                     .filter(Document.extracted_text.isnot(None))
+                     .order_by(Document.created_at)
+                     .all())
+        return [{'lesson': line.strip()} for doc in documents
+                for line in doc.extracted_text.splitlines() if line.strip()]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'enabled': self.enabled,
+            'rebuilds': self.rebuilds,
+            'incremental_updates': self.updates,
+            'failures': self.failures,
+            'pending': pending
+        }
+
+
+# Global indexer instance
+lesson_indexer = LessonIndexer()
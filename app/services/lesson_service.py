@@ -3,13 +3,23 @@ Lesson Note Generation Service
 Handles AI-powered lesson note creation with OnlyOffice integration
 """
 
-import requests
 import json
+import time
 import uuid
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional
 from flask import current_app
 from ..models import db, Document, DocumentChunk
-from sqlalchemy import text
+from .curriculum_digest import curriculum_digest
+from .document_counts import document_counts
+from .http_client import http_client
+from .json_stream import JSONStreamParser, loads_lenient
+from .lesson_context import lesson_context, estimate_tokens
+from .llm_queue import llm_queue, LLMQueueRejected
+from .lesson_title_cache import lesson_title_cache
+from .ollama_client import ollama_client
+from .progression_parser import parse_progression
+from .settings_cache import settings_cache
+from .single_flight import llm_single_flight
 
 class LessonNoteService:
     """Service for generating lesson notes using AI and OnlyOffice"""
@@ -17,21 +27,23 @@ class LessonNoteService:
     def __init__(self):
         # Get settings from database or use defaults
         self._load_ai_settings()
+        # LLM queue client for fair sharing; None uses the current request's identity
+        self.queue_client_id = None
+        self.parser_min_confidence = current_app.config.get('PROGRESSION_PARSER_MIN_CONFIDENCE', 0.7)
+        self.lesson_num_ctx = current_app.config.get('LESSON_NOTE_NUM_CTX', 8192)
+        # Prompt size, retrieved chunks and latency of the last generate_lesson_note call
+        self.last_generation_stats = None
         
     def _load_ai_settings(self):
         """Load AI/LLM settings from database"""
         try:
-            from app.models import SystemSettings
-            
-            # Get settings from database
-            settings = {s.key: s.value for s in SystemSettings.query.all()}
-            
+            # Settings are read from the process-wide cache, not the database
             self.onlyoffice_url = current_app.config.get('ONLYOFFICE_URL', 'http://localhost:8000')
-            self.ollama_url = settings.get('llm_base_url', 'http://localhost:11434')
-            self.ollama_model = settings.get('llm_model', 'llama3.3:latest')
-            self.temperature = float(settings.get('llm_temperature', '0.7'))
-            self.max_tokens = int(settings.get('llm_max_tokens', '2048'))
-            self.provider = settings.get('llm_provider', 'ollama')
+            self.ollama_url = settings_cache.get('llm_base_url', 'http://localhost:11434')
+            self.ollama_model = settings_cache.get('llm_model', 'llama3.3:latest')
+            self.temperature = settings_cache.get_float('llm_temperature', 0.7)
+            self.max_tokens = settings_cache.get_int('llm_max_tokens', 2048)
+            self.provider = settings_cache.get('llm_provider', 'ollama')
             
         except Exception as e:
             # Fallback to defaults if database is not available
@@ -43,65 +55,109 @@ class LessonNoteService:
             self.max_tokens = 2048
             self.provider = 'ollama'
         
+    def _ollama_chat(self, payload: Dict[str, Any], timeout: int = 120):
+        """Send a chat request to Ollama through the LLM dispatch queue
+        
+        Concurrent identical payloads (same model, messages and options) are
+        coalesced into one upstream call; every caller gets the same response,
+        whose body can be decoded independently with ``.json()``.
+        """
+        model = payload.get('model', self.ollama_model)
+        
+        def call():
+            with llm_queue.slot('ollama', model, client_id=self.queue_client_id):
+                return ollama_client.chat(payload, base_url=self.ollama_url, timeout=timeout)
+        
+        key = llm_single_flight.make_key('ollama', self.ollama_url, model,
+                                         payload.get('messages'), payload.get('options'))
+        return llm_single_flight.do(key, call)
+        
+    @staticmethod
+    def _context_size(prompt: str, reply_tokens: int = 1024, maximum: int = 16384) -> int:
+        """Smallest power-of-two context (from 2048) that fits the prompt and the reply"""
+        needed = len(prompt) // 3 + reply_tokens  # ~3 characters per token, conservative for French
+        size = 2048
+        while size < needed and size < maximum:
+            size *= 2
+        return size
+        
     def get_subject_documents(self, subject: str, class_level: str) -> Dict[str, Any]:
-        """Retrieve documents for a specific subject and class"""
+        """Retrieve documents for a specific subject and class
+        
+        Uses the indexed ``subject``/``class_level``/``document_type`` columns.
+        Textbook and curriculum entries are metadata only; the chunks a lesson
+        needs are retrieved per lesson by ``lesson_context``. Only progression
+        text is loaded, split into lines for lesson title extraction. Returns
+        ``{}`` when the subject and class have no documents.
+        """
         try:
-            # Build the query to get documents, progression, and curriculum
-            query = text("""
-                SELECT json_build_object(
-                  'documents', (
-                    SELECT json_agg(json_build_object(
-                        'content', content,
-                        'metadata', metadata
-                    ))
-                    FROM documents
-                    WHERE (metadata->>'class') = :class_level
-                      AND (metadata->>'subject') = :subject
-                  ),
-                  'progression_documents', (
-                    SELECT json_agg(json_build_object('lesson', trim(value)))
-                    FROM (
-                      SELECT unnest(string_to_array(content, E'\\n')) AS value
-                      FROM documents
-                      WHERE (metadata->>'class') = :class_level
-                        AND (metadata->>'subject') = :subject
-                        AND (metadata->>'type') = 'progression'
-                    ) t
-                    WHERE value <> ''
-                  ),
-                  'curriculum_documents', (
-                    SELECT json_agg(json_build_object(
-                        'content', content,
-                        'metadata', metadata
-                    ))
-                    FROM documents
-                    WHERE (metadata->>'class') = :class_level
-                      AND (metadata->>'subject') = :subject
-                      AND (metadata->>'type') = 'curriculum'
-                  )
-                ) AS result
-            """)
+            counts = document_counts.get(subject, class_level)
+            if not any(counts.values()):
+                return {}
+            
+            rows = (db.session.query(Document.id, Document.name, Document.document_type)
+                    .filter(Document.subject == subject, Document.class_level == class_level)
+                    .order_by(Document.created_at)
+                    .all())
             
-            result = db.session.execute(query, {
-                'class_level': class_level,
-                'subject': subject
-            }).fetchone()
+            progression_text = (db.session.query(Document.extracted_text)
+                                .filter(Document.subject == subject,
+                                        Document.class_level == class_level,
+                                        Document.document_type == 'progression',
+                                        Document.extracted_text.isnot(None))
+                                .order_by(Document.created_at)
+                                .all()) if counts['progression_count'] else []
             
-            return result[0] if result else {}
+            def describe(row):
+                return {'id': str(row.id), 'name': row.name, 'document_type': row.document_type}
+            
+            return {
+                'documents': [describe(r) for r in rows if r.document_type not in ('curriculum', 'progression')],
+                'progression_documents': [{'lesson': line.strip()} for (content,) in progression_text
+                                          for line in content.split('\n') if line.strip()],
+                'curriculum_documents': [describe(r) for r in rows if r.document_type == 'curriculum'],
+                'counts': counts
+            }
             
         except Exception as e:
             print(f"Error retrieving subject documents: {e}")
             return {}
     
-    def extract_lesson_titles(self, progression_data: List[Dict]) -> List[Dict]:
-        """Extract lesson titles from progression documents using AI"""
+    def extract_lesson_titles(self, progression_data: List[Dict], subject: Optional[str] = None,
+                              class_level: Optional[str] = None) -> List[Dict]:
+        """Extract lesson titles from progression documents
+        
+        Progressions that already list numbered lessons are parsed by rules;
+        only the rest go to the LLM. LLM results are cached per progression
+        text and model, so it only runs again when the progression changes.
+        ``subject`` and ``class_level`` let a new progression upload invalidate
+        the cached list.
+        """
+        if not progression_data:
+            return []
+        
+        # Combine all lessons into a single text
+        lessons_text = "\n".join([lesson.get('lesson') or lesson.get('content') or ''
+                                  for lesson in progression_data])
+        
+        parsed = parse_progression(lessons_text)
+        if parsed['confidence'] >= self.parser_min_confidence:
+            print(f"📋 Parsed {len(parsed['lessons'])} lessons without the LLM "
+                  f"({parsed['method']}, confidence {parsed['confidence']})")
+            return parsed['lessons']
+        
+        content_hash = lesson_title_cache.content_hash(lessons_text)
+        cached = lesson_title_cache.get(content_hash, self.ollama_model)
+        if cached is not None:
+            return cached
+        
+        lessons = self._extract_lesson_titles_llm(lessons_text)
+        lesson_title_cache.put(content_hash, self.ollama_model, lessons, subject, class_level)
+        return lessons
+    
+    def _extract_lesson_titles_llm(self, lessons_text: str) -> List[Dict]:
+        """Extract lesson titles from progression text using AI"""
         try:
-            if not progression_data:
-                return []
-            
-            # Combine all lessons into a single text
-            lessons_text = "\n".join([lesson.get('lesson', '') for lesson in progression_data])
-            
             # AI prompt for lesson extraction
             system_prompt = """You are an expert curriculum data extractor.
 
@@ -133,45 +189,52 @@ Example output:
                 "stream": False,
                 "options": {
                     "temperature": 0.2,
-                    "num_ctx": 2048
+                    "num_ctx": self._context_size(system_prompt + lessons_text)
                 }
             }
             
-            response = requests.post(
-                f"{self.ollama_url}/api/chat",
-                json=payload,
-                timeout=60
-            )
+            response = self._ollama_chat(payload, timeout=60)
             
             if response.status_code == 200:
                 result = response.json()
                 content = result.get('message', {}).get('content', '')
                 
-                # Parse JSON response
+                # Parse JSON response, repairing prose around it or a truncated end
                 try:
-                    lessons = json.loads(content)
+                    lessons = loads_lenient(content)
                     return lessons if isinstance(lessons, list) else []
-                except json.JSONDecodeError:
+                except ValueError:
                     print("Failed to parse AI response as JSON")
                     return []
             else:
                 print(f"Ollama API error: {response.status_code}")
                 return []
                 
+        except LLMQueueRejected:
+            raise
         except Exception as e:
             print(f"Error extracting lesson titles: {e}")
             return []
     
-    def generate_lesson_note(self, subject: str, class_level: str, lesson_info: Dict, 
-                           documents: List[Dict], curriculum: List[Dict]) -> Dict[str, Any]:
-        """Generate a complete lesson note using AI"""
-        try:
-            # Prepare document content
-            doc_content = "\n".join([doc.get('content', '') for doc in documents])
-            curriculum_content = "\n".join([cur.get('content', '') for cur in curriculum])
-            
-            # AI prompt for lesson note generation
-            system_prompt = f"""You are an expert {subject} teacher for {class_level} students.
+    def _lesson_note_request(self, subject: str, class_level: str, lesson_info: Dict,
+                             documents: List[Dict], curriculum: List[Dict]):
+        """Ollama chat payload for one lesson note, with the retrieved context"""
+        # Retrieve the chunks relevant to this lesson only
+        lesson_title = lesson_info.get('lesson', '')
+        # The subject's curriculum objectives digest replaces raw curriculum chunks
+        digest = curriculum_digest.get(subject, class_level, self)
+        context = lesson_context.build(subject, class_level, lesson_title, documents, curriculum,
+                                       include_curriculum=digest is None)
+        if digest is not None:
+            context['curriculum'] = digest
+            context['context_tokens'] += estimate_tokens(digest)
+        context['curriculum_digest'] = digest is not None
+        doc_content = context['textbook']
+        curriculum_content = context['curriculum']
+        
+        # The system prompt is identical for every lesson; subject and class go
+        # in the user message so Ollama can reuse the cached prompt prefix
+        system_prompt = """You are an expert teacher for the subject and class given in the request.
 
 Your task is to generate a **complete lesson note** for each lesson, strictly following the required structure.
 The lesson must be based on:
@@ -186,8 +249,8 @@ The lesson must be based on:
 
 ### Mandatory Lesson Note Template
 
-**Subject:** {subject}
-**Class:** {class_level}
+**Subject:** [subject from the request]
+**Class:** [class from the request]
 **Main Topic:** [From curriculum/textbook]
 **Sub-topic:** [From curriculum/textbook]
 
@@ -222,60 +285,142 @@ A short wrap-up, reinforcing key ideas. End with motivation to observe the conce
 
 Return the entire lesson as **valid JSON** with this structure:
 
-{{
-  "subject": "{subject}",
-  "classLevel": "{class_level}",
+{
+  "subject": "[subject from the request]",
+  "classLevel": "[class from the request]",
   "lessonTitle": "[lesson title]",
   "mainTopic": "[main topic]",
   "subTopic": "[sub topic]",
   "mainBody": "Full lesson text following the above structure (without markdown symbols)."
-}}
+}
 
 Do **not** include any text outside the JSON object.
 Ensure `mainBody` contains the formatted lesson note exactly as per the structure."""
 
-            user_content = f"""subject: {doc_content}
+        # Shared material first and the lesson last, so lessons of one subject share a prefix
+        # (the curriculum digest is the same for every lesson, the textbook chunks are not)
+        user_content = f"""Subject: {subject}
+Class: {class_level}
 curriculum: {curriculum_content}
-lesson: {lesson_info.get('lesson', '')}"""
+textbook: {doc_content}
+lesson: {lesson_title}"""
 
-            payload = {
-                "model": self.ollama_model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_content}
-                ],
-                "stream": False,
-                "options": {
-                    "temperature": 0.2,
-                    "num_ctx": 4096
-                }
+        payload = {
+            "model": self.ollama_model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content}
+            ],
+            "stream": False,
+            "options": {
+                "temperature": 0.2,
+                # Fixed per deployment: changing num_ctx makes Ollama reload the model
+                "num_ctx": self.lesson_num_ctx
             }
+        }
+        return payload, context, lesson_title
+    
+    def _record_generation(self, lesson_title: str, context: Dict[str, Any],
+                           result: Dict[str, Any], latency: float):
+        prompt_tokens = result.get('prompt_eval_count')
+        self.last_generation_stats = {
+            'lesson': lesson_title,
+            'chunk_ids': context['chunk_ids'],
+            'context_tokens': context['context_tokens'],
+            'curriculum_digest': context['curriculum_digest'],
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': result.get('eval_count'),
+            'latency': round(latency, 3)
+        }
+        lesson_context.record_generation(prompt_tokens, latency)
+        print(f"📝 Lesson '{lesson_title}': {len(context['chunk_ids'])} chunks, "
+              f"{prompt_tokens} prompt tokens, {latency:.1f}s")
+    
+    def generate_lesson_note(self, subject: str, class_level: str, lesson_info: Dict, 
+                           documents: List[Dict], curriculum: List[Dict]) -> Dict[str, Any]:
+        """Generate a complete lesson note using AI
+        
+        Only the textbook and curriculum chunks most relevant to the lesson
+        title are sent, within the LESSON_CONTEXT_TOKEN_BUDGET. Prompt tokens
+        and latency end up in ``last_generation_stats``.
+        """
+        self.last_generation_stats = None
+        try:
+            payload, context, lesson_title = self._lesson_note_request(
+                subject, class_level, lesson_info, documents, curriculum)
             
-            response = requests.post(
-                f"{self.ollama_url}/api/chat",
-                json=payload,
-                timeout=120
-            )
+            started = time.perf_counter()
+            response = self._ollama_chat(payload, timeout=120)
+            latency = time.perf_counter() - started
             
             if response.status_code == 200:
                 result = response.json()
                 content = result.get('message', {}).get('content', '')
+                self._record_generation(lesson_title, context, result, latency)
                 
-                # Parse JSON response
+                # Parse JSON response, repairing prose around it or a truncated end
                 try:
-                    lesson_note = json.loads(content)
+                    lesson_note = loads_lenient(content)
+                    if not isinstance(lesson_note, dict):
+                        raise ValueError("Lesson note is not a JSON object")
                     return lesson_note
-                except json.JSONDecodeError:
+                except ValueError:
                     print("Failed to parse AI lesson note as JSON")
                     return {"error": "Failed to parse lesson note"}
             else:
                 print(f"Ollama API error: {response.status_code}")
                 return {"error": "Ollama API failed"}
                 
+        except LLMQueueRejected:
+            raise
         except Exception as e:
             print(f"Error generating lesson note: {e}")
             return {"error": str(e)}
     
+    def stream_lesson_note(self, subject: str, class_level: str, lesson_info: Dict,
+                           documents: List[Dict], curriculum: List[Dict]) -> Iterator[Dict[str, Any]]:
+        """Generate a lesson note while streaming it, yielding events as fields arrive
+        
+        Events: ``{'type': 'started'}`` once the LLM queue admits the request,
+        ``{'type': 'partial', 'name', 'value'}`` while a text field is being
+        written, ``{'type': 'field', 'name', 'value'}`` when a field is complete,
+        then ``{'type': 'done', 'lesson_note', 'generation_stats'}`` or
+        ``{'type': 'error', 'error'}``. LLMQueueRejected is raised before the first event.
+        """
+        self.last_generation_stats = None
+        payload, context, lesson_title = self._lesson_note_request(
+            subject, class_level, lesson_info, documents, curriculum)
+        parser = JSONStreamParser()
+        final = {}
+        
+        with llm_queue.slot('ollama', payload['model'], client_id=self.queue_client_id):
+            yield {'type': 'started', 'lesson': lesson_title, 'chunk_ids': context['chunk_ids']}
+            started = time.perf_counter()
+            try:
+                for message in ollama_client.chat_stream(payload, base_url=self.ollama_url, timeout=120):
+                    if message.get('done'):
+                        final = message
+                        continue
+                    for kind, name, value in parser.feed(message.get('message', {}).get('content', '')):
+                        if kind in ('field', 'partial'):
+                            yield {'type': kind, 'name': name, 'value': value}
+            except Exception as e:
+                print(f"Error streaming lesson note: {e}")
+                yield {'type': 'error', 'error': str(e)}
+                return
+            latency = time.perf_counter() - started
+        
+        self._record_generation(lesson_title, context, final, latency)
+        try:
+            lesson_note = parser.close()
+            if not isinstance(lesson_note, dict):
+                raise ValueError("Lesson note is not a JSON object")
+        except ValueError:
+            print("Failed to parse AI lesson note as JSON")
+            yield {'type': 'error', 'error': 'Failed to parse lesson note'}
+            return
+        yield {'type': 'done', 'lesson_note': lesson_note, 'generation_stats': self.last_generation_stats}
+    
     def save_lesson_note_locally(self, lesson_note: Dict[str, Any], output_dir: str = 'lesson_notes') -> str:
         """Save lesson note as local file when OnlyOffice is not available"""
         try:
@@ -293,6 +438,12 @@ lesson: {lesson_info.get('lesson', '')}"""
             filename = f"{subject}_{lesson_title}_{timestamp}.txt"
             filepath = os.path.join(output_dir, filename)
             
+            # Notes generated in parallel can share a title and timestamp
+            counter = 1
+            while os.path.exists(filepath):
+                counter += 1
+                filepath = os.path.join(output_dir, f"{subject}_{lesson_title}_{timestamp}_{counter}.txt")
+            
             # Format lesson content
             content = f"""LESSON NOTE
 =====================================
@@ -346,6 +497,7 @@ Generated by OCR Agent - Lesson Note Generator
                     return {
                         "success": True,
                         "lesson_note": lesson_note,
+                        "generation_stats": self.last_generation_stats,
                         "storage_type": "onlyoffice",
                         "document_id": document_id,
                         "message": "Lesson note created in OnlyOffice successfully"
@@ -361,11 +513,14 @@ Generated by OCR Agent - Lesson Note Generator
                 return {
                     "success": True,
                     "lesson_note": lesson_note,
+                    "generation_stats": self.last_generation_stats,
                     "storage_type": "local",
                     "file_path": local_filepath,
                     "message": f"OnlyOffice unavailable. Lesson note saved locally: {local_filepath}"
                 }
                 
+        except LLMQueueRejected:
+            raise
         except Exception as e:
             return {
                 "success": False,
@@ -396,7 +551,7 @@ Subject: {lesson_note.get('subject', '')}
             }
             
             # Create document via OnlyOffice API
-            response = requests.post(
+            response = http_client.post(
                 f"{self.onlyoffice_url}/api/documents/create",
                 json=doc_payload,
                 headers={"Content-Type": "application/json"},
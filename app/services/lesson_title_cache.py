@@ -0,0 +1,138 @@
+"""
+Lesson Title Cache
+Persists lesson lists extracted from progression documents so repeat loads
+skip the LLM; keyed by a hash of the progression text and the model
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from app.models import db, LessonTitleCache as LessonTitleCacheEntry
+
+
+class LessonTitleCache:
+    """In-process LRU in front of the lesson_title_cache table"""
+
+    def __init__(self, max_memory_entries: int = 256, enabled: bool = True):
+        self.max_memory_entries = max_memory_entries
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # (content_hash, model) -> lessons
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        """Apply cache settings from the Flask config"""
+        self.enabled = app.config.get('LESSON_TITLE_CACHE_ENABLED', self.enabled)
+        self.max_memory_entries = app.config.get('LESSON_TITLE_CACHE_MEMORY_ENTRIES', self.max_memory_entries)
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        """Hash of the progression text, insensitive to surrounding whitespace"""
+        normalized = "\n".join(line.strip() for line in (text or "").splitlines() if line.strip())
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def get(self, content_hash: str, model: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached lessons for this progression text and model, if any"""
+        if not self.enabled:
+            return None
+
+        key = (content_hash, model)
+        with self._lock:
+            lessons = self._memory.get(key)
+            if lessons is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return lessons
+
+        try:
+            entry = LessonTitleCacheEntry.query.filter_by(content_hash=content_hash, model=model).first()
+        except Exception as e:
+            print(f"Lesson title cache lookup failed: {e}")
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.db_hits += 1
+            self._remember(key, entry.lessons)
+        return entry.lessons
+
+    def put(self, content_hash: str, model: str, lessons: List[Dict[str, Any]],
+            subject: Optional[str] = None, class_level: Optional[str] = None) -> None:
+        """Persist an extracted lesson list"""
+        if not self.enabled or not lessons:
+            return
+
+        try:
+            entry = LessonTitleCacheEntry.query.filter_by(content_hash=content_hash, model=model).first()
+            if entry is None:
+                entry = LessonTitleCacheEntry(content_hash=content_hash, model=model)
+                db.session.add(entry)
+            entry.lessons = lessons
+            entry.subject = subject
+            entry.class_level = class_level
+            db.session.commit()
+        except Exception as e:
+            # A concurrent extraction may have stored the same key first
+            db.session.rollback()
+            print(f"Lesson title cache store failed: {e}")
+
+        with self._lock:
+            self._remember((content_hash, model), lessons)
+
+    def invalidate(self, subject: Optional[str], class_level: Optional[str]) -> int:
+        """Drop cached lists for a subject and class after its progression changed"""
+        if not subject or not class_level:
+            return 0
+
+        try:
+            stale = LessonTitleCacheEntry.query.filter_by(subject=subject, class_level=class_level).all()
+            keys = [(entry.content_hash, entry.model) for entry in stale]
+            for entry in stale:
+                db.session.delete(entry)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Lesson title cache invalidation failed: {e}")
+            keys = []
+
+        with self._lock:
+            for key in keys:
+                self._memory.pop(key, None)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+    def _remember(self, key, lessons) -> None:
+        """Add to the in-process LRU (caller holds the lock)"""
+        self._memory[key] = lessons
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'memory_entries': len(self._memory),
+                'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.db_hits) / lookups, 3) if lookups else 0.0,
+                'invalidations': self.invalidations
+            }
+
+
+# Global cache instance
+lesson_title_cache = LessonTitleCache()
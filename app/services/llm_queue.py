@@ -0,0 +1,348 @@
+"""
+LLM Dispatch Queue
+Admission control in front of the local LLM: per provider/model concurrency
+limits, round-robin fairness between clients and deadline-based rejection
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple
+
+from flask import has_request_context, request, jsonify
+
+
+class LLMQueueRejected(Exception):
+    """Raised when an LLM request cannot be dispatched before its deadline"""
+
+    def __init__(self, message: str, lane: str = "", queue_position: Optional[int] = None,
+                 retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.lane = lane
+        self.queue_position = queue_position
+        self.retry_after = retry_after
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'success': False,
+            'error': str(self),
+            'queue': self.lane,
+            'queue_position': self.queue_position,
+            'retry_after': self.retry_after
+        }
+
+
+class _Waiter:
+    """A request waiting for (or holding) a dispatch slot"""
+
+    def __init__(self, ticket: str, client_id: str):
+        self.ticket = ticket
+        self.client_id = client_id
+        self.event = threading.Event()
+        self.enqueued_at = time.time()
+        self.started_at = None
+
+
+class _Lane:
+    """Queue and counters for one provider/model pair"""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self.clients = OrderedDict()  # client_id -> deque of waiters, in round-robin order
+
+        self.dispatched = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.service_avg = None  # EWMA of slot hold time in seconds
+
+    @property
+    def depth(self) -> int:
+        return sum(len(waiters) for waiters in self.clients.values())
+
+    def position_of(self, waiter: _Waiter) -> Optional[int]:
+        """1-based dispatch position under round-robin between clients"""
+        order = list(self.clients.keys())
+        if waiter.client_id not in self.clients:
+            return None
+        try:
+            index = list(self.clients[waiter.client_id]).index(waiter)
+        except ValueError:
+            return None
+
+        client_rank = order.index(waiter.client_id)
+        ahead = 0
+        for rank, client_id in enumerate(order):
+            queued = len(self.clients[client_id])
+            ahead += min(queued, index)
+            if rank < client_rank and queued > index:
+                ahead += 1
+        return ahead + 1
+
+    def next_waiter(self) -> Optional[_Waiter]:
+        """Pop the next waiter, rotating the served client to the back"""
+        if not self.clients:
+            return None
+        client_id, waiters = next(iter(self.clients.items()))
+        waiter = waiters.popleft()
+        if waiters:
+            self.clients.move_to_end(client_id)
+        else:
+            del self.clients[client_id]
+        return waiter
+
+    def remove(self, waiter: _Waiter) -> None:
+        waiters = self.clients.get(waiter.client_id)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self.clients[waiter.client_id]
+
+
+class LLMDispatchQueue:
+    """Bounded-concurrency dispatcher shared by every LLM call in the process"""
+
+    def __init__(self, default_limit: int = 1, limits: Optional[Dict[str, int]] = None,
+                 max_depth: int = 50, timeout: float = 90, enabled: bool = True,
+                 client_header: str = ''):
+        self.default_limit = default_limit
+        self.limits = limits or {}
+        self.max_depth = max_depth
+        self.timeout = timeout
+        self.enabled = enabled
+        # Header naming the client, set by a trusted proxy; clients are otherwise told apart by address
+        self.client_header = client_header
+
+        self._lock = threading.Lock()
+        self._lanes = {}
+        # ticket -> [(lane, waiter)]: one request may hold several slots (hedged or nested calls)
+        self._tickets: Dict[str, List[Tuple[_Lane, _Waiter]]] = {}
+
+    def init_app(self, app):
+        """Apply queue settings from the Flask config"""
+        self.enabled = app.config.get('LLM_QUEUE_ENABLED', self.enabled)
+        self.default_limit = app.config.get('LLM_CONCURRENCY_DEFAULT', self.default_limit)
+        self.limits = self.parse_limits(app.config.get('LLM_CONCURRENCY_LIMITS', ''))
+        self.max_depth = app.config.get('LLM_QUEUE_MAX_DEPTH', self.max_depth)
+        self.timeout = app.config.get('LLM_QUEUE_TIMEOUT', self.timeout)
+        self.client_header = app.config.get('LLM_QUEUE_CLIENT_HEADER', self.client_header)
+
+    @staticmethod
+    def parse_limits(spec: str) -> Dict[str, int]:
+        """Parse 'ollama=1,openai=8,ollama/llama3.3:latest=2' into a dict"""
+        limits = {}
+        for item in (spec or '').split(','):
+            if '=' not in item:
+                continue
+            name, value = item.rsplit('=', 1)
+            try:
+                limits[name.strip()] = max(1, int(value))
+            except ValueError:
+                continue
+        return limits
+
+    def _limit_for(self, provider: str, model: str) -> int:
+        return self.limits.get(f"{provider}/{model}",
+                               self.limits.get(provider, self.default_limit))
+
+    def _lane(self, provider: str, model: str) -> _Lane:
+        name = f"{provider}/{model}"
+        lane = self._lanes.get(name)
+        if lane is None:
+            lane = _Lane(name, self._limit_for(provider, model))
+            self._lanes[name] = lane
+        return lane
+
+    @contextmanager
+    def slot(self, provider: str, model: str, client_id: Optional[str] = None,
+             ticket: Optional[str] = None, timeout: Optional[float] = None):
+        """Hold one dispatch slot for the duration of an upstream LLM call"""
+        if not self.enabled:
+            yield None
+            return
+
+        if client_id is None or ticket is None:
+            request_client, request_ticket = request_identity()
+            client_id = client_id or request_client
+            ticket = ticket or request_ticket
+        timeout = self.timeout if timeout is None else timeout
+
+        waiter = self._acquire(provider, model, client_id, ticket, timeout)
+        try:
+            yield waiter
+        finally:
+            self._release(provider, model, waiter)
+
+    def _acquire(self, provider: str, model: str, client_id: str, ticket: str,
+                 timeout: float) -> _Waiter:
+        waiter = _Waiter(ticket, client_id)
+        deadline = waiter.enqueued_at + timeout
+
+        with self._lock:
+            lane = self._lane(provider, model)
+
+            if lane.active < lane.limit and not lane.clients:
+                lane.active += 1
+                self._start(lane, waiter)
+                self._track(lane, waiter)
+                return waiter
+
+            if lane.depth >= self.max_depth:
+                lane.rejected += 1
+                raise LLMQueueRejected(
+                    f"LLM queue for {lane.name} is full ({lane.depth} waiting)",
+                    lane=lane.name, queue_position=lane.depth + 1,
+                    retry_after=self._estimate_wait(lane, lane.depth + 1))
+
+            lane.clients.setdefault(client_id, deque()).append(waiter)
+            lane.max_depth = max(lane.max_depth, lane.depth)
+            self._track(lane, waiter)
+
+            # Reject up front when the expected wait already exceeds the deadline
+            position = lane.position_of(waiter)
+            expected_wait = self._estimate_wait(lane, position)
+            if expected_wait is not None and expected_wait > timeout:
+                lane.remove(waiter)
+                self._untrack(waiter)
+                lane.rejected += 1
+                raise LLMQueueRejected(
+                    f"Expected wait of {expected_wait}s for {lane.name} exceeds the {timeout:.0f}s deadline",
+                    lane=lane.name, queue_position=position, retry_after=expected_wait)
+
+        if waiter.event.wait(max(deadline - time.time(), 0)):
+            return waiter
+
+        with self._lock:
+            # The slot may have been granted between the timeout and taking the lock
+            if waiter.event.is_set():
+                return waiter
+            position = lane.position_of(waiter)
+            lane.remove(waiter)
+            self._untrack(waiter)
+            lane.rejected += 1
+        raise LLMQueueRejected(
+            f"Timed out after {timeout:.0f}s waiting for {lane.name}",
+            lane=lane.name, queue_position=position,
+            retry_after=self._estimate_wait(lane, position))
+
+    def _start(self, lane: _Lane, waiter: _Waiter) -> None:
+        """Record dispatch of a waiter (caller holds the lock)"""
+        waiter.started_at = time.time()
+        wait = waiter.started_at - waiter.enqueued_at
+        lane.dispatched += 1
+        lane.wait_total += wait
+        lane.wait_max = max(lane.wait_max, wait)
+
+    def _track(self, lane: _Lane, waiter: _Waiter) -> None:
+        """Make a waiter visible under its ticket (caller holds the lock)"""
+        self._tickets.setdefault(waiter.ticket, []).append((lane, waiter))
+
+    def _untrack(self, waiter: _Waiter) -> None:
+        """Forget a waiter, leaving other slots of the same ticket (caller holds the lock)"""
+        entries = [entry for entry in self._tickets.get(waiter.ticket, []) if entry[1] is not waiter]
+        if entries:
+            self._tickets[waiter.ticket] = entries
+        else:
+            self._tickets.pop(waiter.ticket, None)
+
+    def _release(self, provider: str, model: str, waiter: _Waiter) -> None:
+        with self._lock:
+            lane = self._lane(provider, model)
+            held = time.time() - (waiter.started_at or waiter.enqueued_at)
+            lane.service_avg = held if lane.service_avg is None else 0.8 * lane.service_avg + 0.2 * held
+            self._untrack(waiter)
+
+            next_waiter = lane.next_waiter()
+            if next_waiter is not None:
+                # Hand the slot straight over so no newcomer can overtake the queue
+                self._start(lane, next_waiter)
+                next_waiter.event.set()
+            else:
+                lane.active -= 1
+
+    @staticmethod
+    def _estimate_wait(lane: _Lane, position: Optional[int]) -> Optional[int]:
+        if lane.service_avg is None or not position:
+            return None
+        return int(lane.service_avg * position / max(lane.limit, 1)) + 1
+
+    def get_position(self, ticket: str) -> Optional[Dict[str, Any]]:
+        """Queue feedback for a client-supplied request ticket
+
+        A request holding several slots is running once any of them is,
+        otherwise it is reported at its best queue position.
+        """
+        with self._lock:
+            entries = self._tickets.get(ticket)
+            if not entries:
+                return None
+            for lane, waiter in entries:
+                if waiter.started_at is not None:
+                    return {'ticket': ticket, 'queue': lane.name, 'state': 'running', 'queue_position': 0}
+            lane, waiter = min(entries, key=lambda entry: entry[0].position_of(entry[1]) or 0)
+            position = lane.position_of(waiter)
+            return {
+                'ticket': ticket,
+                'queue': lane.name,
+                'state': 'queued',
+                'queue_position': position,
+                'estimated_wait': self._estimate_wait(lane, position),
+                'waited': round(time.time() - waiter.enqueued_at, 2)
+            }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and wait time metrics per lane"""
+        with self._lock:
+            lanes = {}
+            for name, lane in self._lanes.items():
+                lanes[name] = {
+                    'limit': lane.limit,
+                    'active': lane.active,
+                    'queue_depth': lane.depth,
+                    'max_queue_depth': lane.max_depth,
+                    'dispatched': lane.dispatched,
+                    'rejected': lane.rejected,
+                    'wait_avg': round(lane.wait_total / lane.dispatched, 3) if lane.dispatched else 0.0,
+                    'wait_max': round(lane.wait_max, 3),
+                    'service_avg': round(lane.service_avg, 3) if lane.service_avg is not None else None
+                }
+        return {
+            'enabled': self.enabled,
+            'default_limit': self.default_limit,
+            'max_depth': self.max_depth,
+            'timeout': self.timeout,
+            'lanes': lanes
+        }
+
+
+def request_identity():
+    """Client id and ticket for the current HTTP request, if any
+
+    Clients are queued fairly by address; a proxy that identifies users can
+    name them in the ``LLM_QUEUE_CLIENT_HEADER`` header instead. Clients may
+    send ``X-Request-Id`` to poll their position at /api/llm/queue/<ticket>.
+    """
+    if has_request_context():
+        trusted = request.headers.get(llm_queue.client_header) if llm_queue.client_header else None
+        client_id = trusted or request.remote_addr or 'anonymous'
+        ticket = request.headers.get('X-Request-Id') or str(uuid.uuid4())
+        return client_id, ticket
+    return f"thread-{threading.get_ident()}", str(uuid.uuid4())
+
+
+def rejection_response(error: LLMQueueRejected):
+    """503 response telling the client its queue position and when to retry"""
+    response = jsonify(error.to_dict())
+    response.status_code = 503
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+# Global queue instance
+llm_queue = LLMDispatchQueue()
@@ -0,0 +1,241 @@
+"""
+LLM Provider Router
+Latency- and error-aware routing across Ollama, LM Studio and OpenAI-compatible
+endpoints, with failover and hedged requests
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from app.services.llm_queue import LLMQueueRejected
+
+
+class NoProviderAvailable(Exception):
+    """Raised when no configured provider can serve a request"""
+
+
+class ProviderHealth:
+    """Rolling window of latency and outcome samples for one provider"""
+
+    def __init__(self, window: int = 50):
+        self.samples = deque(maxlen=window)  # (latency seconds, ok)
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # circuit breaker: skipped until this time
+        self.in_flight = 0
+
+    def record(self, latency: float, ok: bool, failure_threshold: int, cooldown: float):
+        self.samples.append((latency, ok))
+        if ok:
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+        else:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= failure_threshold:
+                self.open_until = time.time() + cooldown
+
+    @property
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    @property
+    def latency_avg(self) -> Optional[float]:
+        latencies = [latency for latency, ok in self.samples if ok]
+        return sum(latencies) / len(latencies) if latencies else None
+
+    def is_open(self) -> bool:
+        return time.time() < self.open_until
+
+
+class ProviderRouter:
+    """Pick the healthiest provider for a request and hedge slow calls"""
+
+    def __init__(self, window: int = 50, hedge_after: float = 30,
+                 failure_threshold: int = 3, cooldown: float = 30):
+        self.window = window
+        self.hedge_after = hedge_after
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._health = {}
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def init_app(self, app):
+        """Apply router settings from the Flask config"""
+        self.window = app.config.get('LLM_ROUTER_WINDOW', self.window)
+        self.hedge_after = app.config.get('LLM_HEDGE_AFTER', self.hedge_after)
+        self.failure_threshold = app.config.get('LLM_ROUTER_FAILURE_THRESHOLD', self.failure_threshold)
+        self.cooldown = app.config.get('LLM_ROUTER_COOLDOWN', self.cooldown)
+
+    def _get(self, provider: str) -> ProviderHealth:
+        health = self._health.get(provider)
+        if health is None:
+            health = ProviderHealth(self.window)
+            self._health[provider] = health
+        return health
+
+    def record(self, provider: str, latency: float, ok: bool):
+        with self._lock:
+            self._get(provider).record(latency, ok, self.failure_threshold, self.cooldown)
+
+    def rank(self, candidates: List[str], preferred: Optional[str] = None) -> List[str]:
+        """Order candidates healthiest first
+
+        Providers with an open circuit go last. Otherwise the score is the
+        rolling average latency inflated by the error rate; providers without
+        samples score as fast so they get probed. The preferred provider (the
+        one selected with ``switch_provider``) wins ties.
+        """
+        with self._lock:
+            def score(provider):
+                health = self._get(provider)
+                latency = health.latency_avg or 0.0
+                value = latency * (1 + 4 * health.error_rate) + health.error_rate
+                if provider == preferred:
+                    value *= 0.75
+                return (health.is_open(), value, provider != preferred)
+
+            return sorted(candidates, key=score)
+
+    def execute(self, candidates: List[str], call: Callable[[str], Any],
+                preferred: Optional[str] = None,
+                hedge_after: Optional[float] = None) -> Tuple[str, Any]:
+        """Run ``call(provider)`` on the best provider, hedging and failing over
+
+        Returns (provider, result) for the first successful call. If the first
+        provider has not answered after ``hedge_after`` seconds a second
+        request is sent to the next provider and whichever answers first wins.
+        A failed call falls over to the next provider immediately.
+        """
+        if not candidates:
+            raise NoProviderAvailable("No LLM provider satisfies the request constraints")
+
+        if len(candidates) == 1:
+            # Nothing to hedge or fail over to: call inline on the request thread
+            return candidates[0], self._timed_call(candidates[0], call)
+
+        hedge_after = self.hedge_after if hedge_after is None else hedge_after
+        remaining = self.rank(candidates, preferred)
+        pending = {}
+        errors = []
+        hedged = False
+        first = remaining[0]
+
+        def launch():
+            provider = remaining.pop(0)
+            pending[self._submit(provider, call)] = provider
+
+        launch()
+        while pending:
+            can_hedge = bool(remaining) and hedge_after and len(pending) == 1
+            done, _ = wait(list(pending), timeout=hedge_after if can_hedge else None,
+                           return_when=FIRST_COMPLETED)
+
+            if not done:
+                # Slow provider: hedge with the next healthiest one
+                with self._lock:
+                    self.hedges += 1
+                hedged = True
+                launch()
+                continue
+
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append((provider, e))
+                    if remaining and not pending:
+                        with self._lock:
+                            self.failovers += 1
+                        launch()
+                    continue
+
+                if hedged and provider != first:
+                    # The hedge beat the slow first request
+                    with self._lock:
+                        self.hedge_wins += 1
+                return provider, result
+
+        rejections = [e for _, e in errors if isinstance(e, LLMQueueRejected)]
+        if len(rejections) == len(errors):
+            # Every provider is saturated: surface the queue position as-is
+            raise rejections[0]
+        raise NoProviderAvailable(
+            "All LLM providers failed: " + "; ".join(f"{p}: {e}" for p, e in errors))
+
+    def _submit(self, provider: str, call: Callable[[str], Any]) -> Future:
+        """Run one attempt on its own thread
+
+        A thread per attempt rather than a fixed pool: attempts mostly wait in
+        the LLM queue, and a pool would add a second, invisible queue in front
+        of it. Losing hedged attempts finish in the background and still feed
+        the health stats.
+        """
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self._timed_call(provider, call))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True, name=f"llm-router-{provider}").start()
+        return future
+
+    def _timed_call(self, provider: str, call: Callable[[str], Any]) -> Any:
+        with self._lock:
+            self._get(provider).in_flight += 1
+        start = time.perf_counter()
+        try:
+            result = call(provider)
+        except LLMQueueRejected:
+            # Local admission control, not a provider fault
+            with self._lock:
+                self._get(provider).in_flight -= 1
+            raise
+        except Exception:
+            self._finish(provider, time.perf_counter() - start, False)
+            raise
+        self._finish(provider, time.perf_counter() - start, True)
+        return result
+
+    def _finish(self, provider: str, latency: float, ok: bool):
+        with self._lock:
+            health = self._get(provider)
+            health.in_flight -= 1
+            health.record(latency, ok, self.failure_threshold, self.cooldown)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            providers = {}
+            for provider, health in self._health.items():
+                latency = health.latency_avg
+                providers[provider] = {
+                    'samples': len(health.samples),
+                    'error_rate': round(health.error_rate, 3),
+                    'latency_avg': round(latency, 3) if latency is not None else None,
+                    'in_flight': health.in_flight,
+                    'circuit_open': health.is_open(),
+                    'consecutive_failures': health.consecutive_failures
+                }
+            return {
+                'hedge_after': self.hedge_after,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'failovers': self.failovers,
+                'providers': providers
+            }
+
+
+# Global router instance
+llm_router = ProviderRouter()
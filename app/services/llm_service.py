@@ -2,6 +2,18 @@ import requests
 import json
 from flask import current_app
 from typing import Optional, Dict, Any, List
+from app.services.http_client import http_client
+from app.services.llm_queue import llm_queue, request_identity
+from app.services.llm_router import llm_router
+from app.services.ollama_client import ollama_client
+from app.services.chat_memory import ChatMemory
+from app.services.response_cache import response_cache
+from app.services.single_flight import llm_single_flight
+
+VALID_PROVIDERS = ['ollama', 'lm_studio', 'openai']
+
+DEFAULT_OPENAI_BASE_URL = 'https://api.openai.com'
+
 
 class LLMService:
     """Service for interacting with various LLM providers"""
@@ -10,32 +22,136 @@ class LLMService:
         self.provider = current_app.config.get('DEFAULT_LLM_PROVIDER', 'ollama')
         self.ollama_url = current_app.config.get('OLLAMA_BASE_URL', 'http://localhost:11434')
         self.lm_studio_url = current_app.config.get('LM_STUDIO_BASE_URL', 'http://localhost:1234')
+        self.openai_url = (current_app.config.get('OPENAI_BASE_URL') or DEFAULT_OPENAI_BASE_URL).rstrip('/')
         self.openai_api_key = current_app.config.get('OPENAI_API_KEY')
+        self.models = {
+            'ollama': current_app.config.get('OLLAMA_MODEL', 'llama3.3:latest'),
+            'lm_studio': current_app.config.get('LM_STUDIO_MODEL', 'local-model'),
+            'openai': current_app.config.get('OPENAI_MODEL', 'gpt-3.5-turbo')
+        }
+        self.routed_providers = [
+            p.strip() for p in current_app.config.get('LLM_ROUTER_PROVIDERS', '').split(',')
+            if p.strip() in VALID_PROVIDERS
+        ]
+        self.provider_models = self._parse_provider_models(current_app.config.get('LLM_ROUTER_MODELS', ''))
+        self.last_cache_hit = False
+        self.last_provider = None
+    
+    @staticmethod
+    def _parse_provider_models(spec: str) -> Dict[str, List[str]]:
+        """Parse 'ollama=llama3.3:latest|mistral,openai=gpt-4o-mini' into a dict"""
+        models = {}
+        for item in (spec or '').split(','):
+            if '=' not in item:
+                continue
+            provider, names = item.split('=', 1)
+            models[provider.strip()] = [n.strip() for n in names.split('|') if n.strip()]
+        return models
     
-    def generate_response(self, message: str, context: str = "", system_prompt: str = "") -> str:
-        """Generate response using the configured LLM provider"""
+    def generate_response(self, message: str, context: str = "", system_prompt: str = "",
+                          chunk_ids: Optional[List[str]] = None,
+                          document_ids: Optional[List[str]] = None,
+                          model: Optional[str] = None,
+                          history: Optional[List[Dict[str, str]]] = None) -> str:
+        """Generate response using the configured LLM provider
         
-        try:
-            if self.provider == 'ollama':
-                return self._ollama_generate(message, context, system_prompt)
-            elif self.provider == 'lm_studio':
-                return self._lm_studio_generate(message, context, system_prompt)
-            elif self.provider == 'openai':
-                return self._openai_generate(message, context, system_prompt)
-            else:
-                raise ValueError(f"Unsupported LLM provider: {self.provider}")
-                
-        except Exception as e:
-            raise Exception(f"LLM generation failed: {str(e)}")
+        Passing ``chunk_ids`` (the ids of the retrieved context) opts the call
+        into the semantic response cache; ``document_ids`` are the documents the
+        answer cites, used to invalidate the entry when one of them changes.
+        ``model`` restricts routing to providers that serve that model.
+        ``history`` is prior conversation as role/content messages (see ChatMemory).
+        """
+        
+        self.last_cache_hit = False
+        cache_key = None
+        query_embedding = None
+        model_name = model or self.get_model_name()
+        history = history or []
+        history_digest = ChatMemory.digest(history)
+        
+        if chunk_ids is not None and response_cache.enabled:
+            cache_key = response_cache.make_key(self.provider, model_name,
+                                                system_prompt, chunk_ids, extra=history_digest)
+            query_embedding = response_cache.embed(message)
+            cached = response_cache.lookup(cache_key, query_embedding)
+            if cached:
+                self.last_cache_hit = True
+                return cached['response']
+        
+        # Identical concurrent prompts share one upstream call
+        flight_key = llm_single_flight.make_key(self.provider, model_name,
+                                                system_prompt, context, message, history_digest)
+        response = llm_single_flight.do(
+            flight_key, lambda: self._dispatch(message, context, system_prompt, model, history))
+        
+        if cache_key is not None:
+            response_cache.store(cache_key, query_embedding, response,
+                                 document_ids if document_ids is not None else chunk_ids)
+        
+        return response
+    
+    def _dispatch(self, message: str, context: str, system_prompt: str,
+                  model: Optional[str] = None,
+                  history: Optional[List[Dict[str, str]]] = None) -> str:
+        """Route the call to the healthiest eligible provider
+        
+        Each attempt holds an LLM queue slot for its provider. The router
+        hedges slow attempts and fails over on errors; with a single eligible
+        provider this is a plain call on the request thread.
+        """
+        
+        # Captured here because hedged attempts run outside the request context
+        client_id, ticket = request_identity()
+        
+        def attempt(provider: str) -> str:
+            model_name = model or self.get_model_name(provider)
+            # Queue rejections propagate unchanged so routes can answer 503 with the position
+            with llm_queue.slot(provider, model_name, client_id=client_id, ticket=ticket):
+                try:
+                    if provider == 'ollama':
+                        return self._ollama_generate(message, context, system_prompt, model_name, history)
+                    elif provider == 'lm_studio':
+                        return self._lm_studio_generate(message, context, system_prompt, model_name, history)
+                    elif provider == 'openai':
+                        return self._openai_generate(message, context, system_prompt, model_name, history)
+                    else:
+                        raise ValueError(f"Unsupported LLM provider: {provider}")
+                        
+                except Exception as e:
+                    raise Exception(f"LLM generation failed: {str(e)}")
+        
+        provider, response = llm_router.execute(self.get_candidate_providers(model), attempt,
+                                                preferred=self.provider)
+        self.last_provider = provider
+        return response
+    
+    def get_candidate_providers(self, model: Optional[str] = None) -> List[str]:
+        """Providers eligible for a request, optionally constrained to a model"""
+        
+        providers = list(self.routed_providers)
+        if self.provider not in providers:
+            providers.insert(0, self.provider)
+        
+        if model:
+            providers = [p for p in providers
+                         if model == self.get_model_name(p) or model in self.provider_models.get(p, [])]
+        return providers
     
-    def _ollama_generate(self, message: str, context: str, system_prompt: str) -> str:
+    def get_model_name(self, provider: Optional[str] = None) -> str:
+        """Default model of a provider (the current provider by default)"""
+        
+        return self.models.get(provider or self.provider, '')
+    
+    def _ollama_generate(self, message: str, context: str, system_prompt: str,
+                         model: Optional[str] = None,
+                         history: Optional[List[Dict[str, str]]] = None) -> str:
         """Generate response using Ollama"""
         
         # Build the prompt with context
-        full_prompt = self._build_rag_prompt(message, context, system_prompt)
+        full_prompt = self._build_rag_prompt(message, context, system_prompt, history)
         
         payload = {
-            "model": "deepseek-coder-v2:16b",  # Use the available model
+            "model": model or self.get_model_name('ollama'),
             "prompt": full_prompt,
             "stream": False,
             "options": {
@@ -46,11 +162,7 @@ class LLMService:
         }
         
         try:
-            response = requests.post(
-                f"{self.ollama_url}/api/generate",
-                json=payload,
-                timeout=60
-            )
+            response = ollama_client.generate(payload, base_url=self.ollama_url, timeout=60)
             response.raise_for_status()
             
             result = response.json()
@@ -59,27 +171,15 @@ class LLMService:
         except requests.exceptions.RequestException as e:
             raise Exception(f"Ollama API error: {str(e)}")
     
-    def _lm_studio_generate(self, message: str, context: str, system_prompt: str) -> str:
+    def _lm_studio_generate(self, message: str, context: str, system_prompt: str,
+                            model: Optional[str] = None,
+                            history: Optional[List[Dict[str, str]]] = None) -> str:
         """Generate response using LM Studio"""
         
-        messages = []
-        
-        # Add system prompt if provided
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        
-        # Add context if provided
-        if context:
-            messages.append({
-                "role": "system", 
-                "content": f"Context information:\n{context}\n\nPlease answer the following question using the context provided when relevant."
-            })
-        
-        # Add user message
-        messages.append({"role": "user", "content": message})
+        messages = self._build_chat_messages(message, context, system_prompt, history)
         
         payload = {
-            "model": "local-model",  # LM Studio default
+            "model": model or self.get_model_name('lm_studio'),
             "messages": messages,
             "temperature": 0.7,
             "max_tokens": 2000,
@@ -87,7 +187,7 @@ class LLMService:
         }
         
         try:
-            response = requests.post(
+            response = http_client.post(
                 f"{self.lm_studio_url}/v1/chat/completions",
                 json=payload,
                 headers={"Content-Type": "application/json"},
@@ -101,43 +201,30 @@ class LLMService:
         except requests.exceptions.RequestException as e:
             raise Exception(f"LM Studio API error: {str(e)}")
     
-    def _openai_generate(self, message: str, context: str, system_prompt: str) -> str:
-        """Generate response using OpenAI API"""
+    def _openai_generate(self, message: str, context: str, system_prompt: str,
+                         model: Optional[str] = None,
+                         history: Optional[List[Dict[str, str]]] = None) -> str:
+        """Generate response using OpenAI or an OpenAI-compatible endpoint"""
         
-        if not self.openai_api_key:
+        if not self.openai_api_key and self.openai_url == DEFAULT_OPENAI_BASE_URL:
             raise Exception("OpenAI API key not configured")
         
-        messages = []
-        
-        # Add system prompt if provided
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        
-        # Add context if provided
-        if context:
-            messages.append({
-                "role": "system", 
-                "content": f"Context information:\n{context}\n\nPlease answer the following question using the context provided when relevant."
-            })
-        
-        # Add user message
-        messages.append({"role": "user", "content": message})
+        messages = self._build_chat_messages(message, context, system_prompt, history)
         
         payload = {
-            "model": "gpt-3.5-turbo",
+            "model": model or self.get_model_name('openai'),
             "messages": messages,
             "temperature": 0.7,
             "max_tokens": 2000
         }
         
-        headers = {
-            "Authorization": f"Bearer {self.openai_api_key}",
-            "Content-Type": "application/json"
-        }
+        headers = {"Content-Type": "application/json"}
+        if self.openai_api_key:
+            headers["Authorization"] = f"Bearer {self.openai_api_key}"
         
         try:
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
+            response = http_client.post(
+                f"{self.openai_url}/v1/chat/completions",
                 json=payload,
                 headers=headers,
                 timeout=60
@@ -150,17 +237,56 @@ class LLMService:
         except requests.exceptions.RequestException as e:
             raise Exception(f"OpenAI API error: {str(e)}")
     
-    def _build_rag_prompt(self, message: str, context: str, system_prompt: str) -> str:
-        """Build a RAG prompt for single-prompt models like Ollama"""
+    def _build_chat_messages(self, message: str, context: str, system_prompt: str,
+                             history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """Build chat messages for OpenAI-compatible providers (LM Studio, OpenAI)"""
+        
+        messages = []
+        
+        # Add system prompt if provided
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        
+        # Earlier conversation: rolling summary, then the most recent turns
+        messages.extend(history or [])
+        
+        # Add context if provided
+        if context:
+            messages.append({
+                "role": "system", 
+                "content": f"Please answer the following question using the context provided when relevant.\n\nContext information:\n{context}"
+            })
+        
+        # Add user message
+        messages.append({"role": "user", "content": message})
+        
+        return messages
+    
+    def _build_rag_prompt(self, message: str, context: str, system_prompt: str,
+                          history: Optional[List[Dict[str, str]]] = None) -> str:
+        """Build a RAG prompt for single-prompt models like Ollama
+        
+        Parts are ordered from most to least stable (system prompt, conversation
+        history, fixed instruction, retrieved context, question) so consecutive
+        requests share the longest possible prefix and Ollama can reuse its KV cache.
+        """
         
         prompt_parts = []
         
         if system_prompt:
             prompt_parts.append(f"System: {system_prompt}")
         
+        for turn in history or []:
+            if turn['role'] == 'user':
+                prompt_parts.append(f"Human: {turn['content']}")
+            elif turn['role'] == 'assistant':
+                prompt_parts.append(f"Assistant: {turn['content']}")
+            else:
+                prompt_parts.append(turn['content'])
+        
         if context:
-            prompt_parts.append(f"Context information:\n{context}")
             prompt_parts.append("Please answer the following question using the context provided when relevant.")
+            prompt_parts.append(f"Context information:\n{context}")
         
         prompt_parts.append(f"Human: {message}")
         prompt_parts.append("Assistant:")
@@ -187,7 +313,7 @@ class LLMService:
     def _get_ollama_models(self) -> List[Dict[str, Any]]:
         """Get available Ollama models"""
         try:
-            response = requests.get(f"{self.ollama_url}/api/tags", timeout=10)
+            response = http_client.get(f"{self.ollama_url}/api/tags", timeout=10)
             response.raise_for_status()
             
             result = response.json()
@@ -199,7 +325,7 @@ class LLMService:
     def _get_lm_studio_models(self) -> List[Dict[str, Any]]:
         """Get available LM Studio models"""
         try:
-            response = requests.get(f"{self.lm_studio_url}/v1/models", timeout=10)
+            response = http_client.get(f"{self.lm_studio_url}/v1/models", timeout=10)
             response.raise_for_status()
             
             result = response.json()
@@ -221,21 +347,21 @@ class LLMService:
         
         try:
             if self.provider == 'ollama':
-                response = requests.get(f"{self.ollama_url}/api/tags", timeout=5)
+                response = http_client.get(f"{self.ollama_url}/api/tags", timeout=5)
                 response.raise_for_status()
                 return {"status": "connected", "provider": "ollama"}
                 
             elif self.provider == 'lm_studio':
-                response = requests.get(f"{self.lm_studio_url}/v1/models", timeout=5)
+                response = http_client.get(f"{self.lm_studio_url}/v1/models", timeout=5)
                 response.raise_for_status()
                 return {"status": "connected", "provider": "lm_studio"}
                 
             elif self.provider == 'openai':
-                if not self.openai_api_key:
+                if not self.openai_api_key and self.openai_url == DEFAULT_OPENAI_BASE_URL:
                     return {"status": "error", "message": "API key not configured"}
                 
-                headers = {"Authorization": f"Bearer {self.openai_api_key}"}
-                response = requests.get("https://api.openai.com/v1/models", 
+                headers = {"Authorization": f"Bearer {self.openai_api_key}"} if self.openai_api_key else {}
+                response = http_client.get(f"{self.openai_url}/v1/models", 
                                       headers=headers, timeout=5)
                 response.raise_for_status()
                 return {"status": "connected", "provider": "openai"}
@@ -249,8 +375,7 @@ class LLMService:
     def switch_provider(self, provider: str) -> bool:
         """Switch to a different LLM provider"""
         
-        valid_providers = ['ollama', 'lm_studio', 'openai']
-        if provider not in valid_providers:
+        if provider not in VALID_PROVIDERS:
             return False
         
         self.provider = provider
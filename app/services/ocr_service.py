@@ -7,9 +7,12 @@ import requests
 import base64
 import io
 import tempfile
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List
 from flask import current_app
 from .deepseek_service import DeepSeekOCRService
+from .http_client import http_client
+
+POPPLER_PATH = r"C:\Users\onefs\AppData\Local\Microsoft\WinGet\Packages\oschwartz10612.Poppler_Microsoft.Winget.Source_8wekyb3d8bbwe\poppler-25.07.0\Library\bin"
 
 class OCRService:
     """Service for OCR processing of documents using DeepSeek OCR and Tesseract"""
@@ -153,8 +156,7 @@ class OCRService:
         if len(extracted_text.strip()) < 100:  # Threshold for minimal text
             try:
                 # Convert PDF pages to images
-                poppler_path = r"C:\Users\onefs\AppData\Local\Microsoft\WinGet\Packages\oschwartz10612.Poppler_Microsoft.Winget.Source_8wekyb3d8bbwe\poppler-25.07.0\Library\bin"
-                images = convert_from_path(file_path, dpi=300, poppler_path=poppler_path)
+                images = convert_from_path(file_path, dpi=300, poppler_path=POPPLER_PATH)
                 
                 ocr_text = ""
                 for i, image in enumerate(images):
@@ -192,51 +194,94 @@ class OCRService:
         except Exception as e:
             raise Exception(f"OCR processing failed: {str(e)}")
     
+    def iter_pages(self, file_path: str) -> Iterator[str]:
+        """Yield a document's text page by page as each page is read or OCRed
+
+        The pieces join to what ``process_document`` returns, so callers can
+        chunk and embed early pages while later ones are still being OCRed.
+        """
+        
+        file_extension = os.path.splitext(file_path)[1].lower()
+        
+        try:
+            if file_extension == '.pdf':
+                yield from self._iter_pdf_pages(file_path)
+            elif file_extension in ['.png', '.jpg', '.jpeg', '.tiff', '.bmp']:
+                yield self._process_image(file_path)
+            else:
+                raise ValueError(f"Unsupported file type: {file_extension}")
+        except Exception as e:
+            raise Exception(f"OCR processing failed: {str(e)}")
+    
+    def page_count(self, file_path: str) -> Optional[int]:
+        """Pages ``iter_pages`` will go through, when known up front"""
+        
+        file_extension = os.path.splitext(file_path)[1].lower()
+        if file_extension in ['.png', '.jpg', '.jpeg', '.tiff', '.bmp']:
+            return 1
+        if file_extension == '.pdf':
+            with open(file_path, 'rb') as file:
+                return len(PyPDF2.PdfReader(file).pages)
+        return None
+    
     def _process_pdf(self, file_path: str) -> str:
         """Process PDF file - extract text and perform OCR on images"""
         
-        extracted_text = ""
+        return "".join(self._iter_pdf_pages(file_path)).strip()
+    
+    def _iter_pdf_pages(self, file_path: str) -> Iterator[str]:
+        """Extract PDF text per page, OCRing the page images when the PDF has no text layer"""
+        
+        pages = []
+        page_count = None
         
         # First try to extract text directly from PDF
         try:
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
+                page_count = len(pdf_reader.pages)
                 for page in pdf_reader.pages:
                     text = page.extract_text()
                     if text.strip():
-                        extracted_text += text + "\n"
+                        pages.append(text + "\n")
         except Exception as e:
             print(f"Direct PDF text extraction failed: {e}")
         
+        if len("".join(pages).strip()) >= 100:
+            yield from pages
+            return
+        
         # If no text extracted or minimal text, perform OCR on images
-        if len(extracted_text.strip()) < 100:  # Threshold for minimal text
-            try:
-                # Convert PDF pages to images
-                poppler_path = r"C:\Users\onefs\AppData\Local\Microsoft\WinGet\Packages\oschwartz10612.Poppler_Microsoft.Winget.Source_8wekyb3d8bbwe\poppler-25.07.0\Library\bin"
-                images = convert_from_path(file_path, dpi=300, poppler_path=poppler_path)
+        ocr_pages = 0
+        try:
+            # Render one page at a time: a page's text is handed on before the next is OCRed
+            if page_count:
+                images = (convert_from_path(file_path, dpi=300, poppler_path=POPPLER_PATH,
+                                            first_page=n, last_page=n)[0]
+                          for n in range(1, page_count + 1))
+            else:
+                images = convert_from_path(file_path, dpi=300, poppler_path=POPPLER_PATH)
+            
+            for i, image in enumerate(images):
+                # Use appropriate OCR method - prioritize DeepSeek OCR
+                if self._should_use_deepseek_ocr():
+                    page_text = self._deepseek_ocr(image)
+                elif self._should_use_tesseract():
+                    page_text = self._tesseract_ocr(image)
+                else:
+                    raise Exception("No OCR method available")
                 
-                ocr_text = ""
-                for i, image in enumerate(images):
-                    # Use appropriate OCR method - prioritize DeepSeek OCR
-                    if self._should_use_deepseek_ocr():
-                        page_text = self._deepseek_ocr(image)
-                    elif self._should_use_tesseract():
-                        page_text = self._tesseract_ocr(image)
-                    else:
-                        raise Exception("No OCR method available")
-                    
-                    ocr_text += f"\n--- Page {i+1} ---\n{page_text}\n"
+                ocr_pages += 1
+                yield f"\n--- Page {i+1} ---\n{page_text}\n"
                 
-                # Use OCR text if it's more substantial
-                if len(ocr_text.strip()) > len(extracted_text.strip()):
-                    extracted_text = ocr_text
-                    
-            except Exception as e:
-                print(f"PDF OCR failed: {e}")
-                if not extracted_text.strip():
-                    raise Exception("Both text extraction and OCR failed for PDF")
-        
-        return extracted_text.strip()
+        except Exception as e:
+            print(f"PDF OCR failed: {e}")
+            if ocr_pages:
+                # Pages were already handed on: stopping here would pass off part of the document as all of it
+                raise
+            if not "".join(pages).strip():
+                raise Exception("Both text extraction and OCR failed for PDF")
+            yield from pages
     
     def _process_image(self, file_path: str) -> str:
         """Process image file with OCR"""
@@ -396,7 +441,7 @@ class OCRService:
             }
             
             # Send request to DeepSeek OCR API
-            response = requests.post(
+            response = http_client.post(
                 f"{self.deepseek_ocr_url}/api/ocr",
                 json=payload,
                 headers={"Content-Type": "application/json"},
@@ -474,7 +519,7 @@ class OCRService:
         """Test connection to DeepSeek OCR service"""
         
         try:
-            response = requests.get(
+            response = http_client.get(
                 f"{self.deepseek_ocr_url}/health",
                 timeout=5
             )
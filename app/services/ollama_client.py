@@ -0,0 +1,171 @@
+"""
+Ollama Integration Layer
+Keeps configured models resident with keep_alive, warms them at startup and
+tracks cold-load versus warm latency per model
+"""
+
+import json
+import threading
+from typing import Dict, Any, Iterator, List, Optional
+
+import requests
+
+from app.services.http_client import http_client
+
+# A request whose load_duration exceeds this (seconds) had to load the model
+COLD_LOAD_THRESHOLD = 0.5
+
+
+class OllamaClient:
+    """Thin wrapper around Ollama's /api/generate and /api/chat"""
+
+    def __init__(self, base_url: str = 'http://localhost:11434', pinned_models: Optional[List[str]] = None,
+                 keep_alive: str = '-1', warm_on_startup: bool = True):
+        self.base_url = base_url
+        self.pinned_models = pinned_models or []
+        self.keep_alive = keep_alive
+        self.warm_on_startup = warm_on_startup
+
+        self._lock = threading.Lock()
+        self._model_stats = {}
+
+    def init_app(self, app):
+        """Apply residency settings from the Flask config"""
+        self.base_url = app.config.get('OLLAMA_BASE_URL', self.base_url)
+        pinned = app.config.get('OLLAMA_PINNED_MODELS', '')
+        self.pinned_models = [m.strip() for m in pinned.split(',') if m.strip()] or \
+            [app.config.get('OLLAMA_MODEL', 'llama3.3:latest')]
+        self.keep_alive = app.config.get('OLLAMA_KEEP_ALIVE', self.keep_alive)
+        self.warm_on_startup = app.config.get('OLLAMA_WARM_ON_STARTUP', self.warm_on_startup)
+
+    def _with_keep_alive(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Pinned models are asked to stay loaded after the request"""
+        if payload.get('model') in self.pinned_models and 'keep_alive' not in payload:
+            payload = dict(payload, keep_alive=self._keep_alive_value())
+        return payload
+
+    def _keep_alive_value(self):
+        # Ollama expects a number for "-1"/"0" and a duration string such as "30m" otherwise
+        try:
+            return int(self.keep_alive)
+        except (TypeError, ValueError):
+            return self.keep_alive
+
+    def generate(self, payload: Dict[str, Any], base_url: Optional[str] = None,
+                 timeout: int = 60) -> requests.Response:
+        """POST /api/generate (non-streaming) and record model latency"""
+        return self._post('/api/generate', payload, base_url, timeout)
+
+    def chat(self, payload: Dict[str, Any], base_url: Optional[str] = None,
+             timeout: int = 120) -> requests.Response:
+        """POST /api/chat (non-streaming) and record model latency"""
+        return self._post('/api/chat', payload, base_url, timeout)
+
+    def chat_stream(self, payload: Dict[str, Any], base_url: Optional[str] = None,
+                    timeout: int = 120) -> Iterator[Dict[str, Any]]:
+        """POST /api/chat with streaming, yielding Ollama's NDJSON messages as they arrive
+
+        The final message (``done: true``) carries the timings, which are recorded.
+        """
+        response = http_client.post(
+            f"{base_url or self.base_url}/api/chat",
+            json=dict(self._with_keep_alive(payload), stream=True),
+            timeout=timeout,
+            stream=True
+        )
+        try:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                message = json.loads(line)
+                if message.get('done'):
+                    self._record(payload.get('model', ''), message)
+                yield message
+        finally:
+            response.close()
+
+    def _post(self, path: str, payload: Dict[str, Any], base_url: Optional[str],
+              timeout: int) -> requests.Response:
+        response = http_client.post(
+            f"{base_url or self.base_url}{path}",
+            json=self._with_keep_alive(payload),
+            timeout=timeout
+        )
+        if response.status_code == 200 and not payload.get('stream'):
+            try:
+                self._record(payload.get('model', ''), response.json())
+            except ValueError:
+                pass
+        return response
+
+    def warm(self, model: str, base_url: Optional[str] = None) -> bool:
+        """Load a model into memory without generating anything"""
+        try:
+            response = self.generate({'model': model, 'prompt': '', 'stream': False},
+                                     base_url=base_url, timeout=300)
+            response.raise_for_status()
+            print(f"🔥 Ollama model {model} loaded")
+            return True
+        except Exception as e:
+            print(f"⚠️ Could not warm Ollama model {model}: {e}")
+            return False
+
+    def warm_pinned(self, background: bool = True):
+        """Warm every pinned model, by default on a background thread"""
+        def run():
+            for model in self.pinned_models:
+                self.warm(model)
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, daemon=True, name='ollama-warmup')
+        thread.start()
+        return thread
+
+    def _record(self, model: str, result: Dict[str, Any]):
+        """Classify a response as cold or warm from Ollama's own timings (nanoseconds)"""
+        total = result.get('total_duration')
+        if total is None:
+            return
+        load = (result.get('load_duration') or 0) / 1e9
+        total = total / 1e9
+        cold = load > COLD_LOAD_THRESHOLD
+
+        with self._lock:
+            stats = self._model_stats.get(model)
+            if stats is None:
+                stats = {'cold': 0, 'warm': 0, 'cold_total': 0.0, 'warm_total': 0.0,
+                         'load_total': 0.0, 'prompt_tokens': 0, 'requests': 0}
+                self._model_stats[model] = stats
+            kind = 'cold' if cold else 'warm'
+            stats[kind] += 1
+            stats[f'{kind}_total'] += total
+            stats['load_total'] += load
+            stats['prompt_tokens'] += result.get('prompt_eval_count') or 0
+            stats['requests'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {}
+            for model, stats in self._model_stats.items():
+                models[model] = {
+                    'cold_requests': stats['cold'],
+                    'warm_requests': stats['warm'],
+                    'cold_latency_avg': round(stats['cold_total'] / stats['cold'], 3) if stats['cold'] else None,
+                    'warm_latency_avg': round(stats['warm_total'] / stats['warm'], 3) if stats['warm'] else None,
+                    'load_time_total': round(stats['load_total'], 3),
+                    # Tokens Ollama actually evaluated; drops when the prompt prefix is reused
+                    'prompt_eval_avg': round(stats['prompt_tokens'] / stats['requests'], 1)
+                }
+        return {
+            'base_url': self.base_url,
+            'pinned_models': self.pinned_models,
+            'keep_alive': self.keep_alive,
+            'models': models
+        }
+
+
+# Global client instance
+ollama_client = OllamaClient()
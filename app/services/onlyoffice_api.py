@@ -9,6 +9,7 @@ import uuid
 import base64
 from typing import Dict, Any, Optional
 from flask import current_app
+from app.services.http_client import http_client
 
 class OnlyOfficeAPI:
     """OnlyOffice Document Server API client"""
@@ -206,7 +207,7 @@ class OnlyOfficeAPI:
     def check_server_status(self) -> Dict[str, Any]:
         """Check OnlyOffice server status"""
         try:
-            response = requests.get(f"{self.base_url}/healthcheck", timeout=5)
+            response = http_client.get(f"{self.base_url}/healthcheck", timeout=5)
             
             if response.status_code == 200:
                 return {
@@ -13,6 +13,7 @@ from werkzeug.utils import secure_filename
 
 try:
     import requests
+    from app.services.http_client import http_client
     REQUESTS_AVAILABLE = True
 except ImportError:
     REQUESTS_AVAILABLE = False
@@ -24,9 +25,9 @@ class OnlyOfficeService:
         self.load_settings()
     
     def load_settings(self):
-        """Load OnlyOffice settings from database or defaults"""
+        """Load OnlyOffice settings from the settings cache or defaults"""
         try:
-            from app.models import SystemSettings
+            from app.services.settings_cache import settings_cache
             self.enabled = self.get_setting('onlyoffice_enabled', 'false') == 'true'
             self.mode = self.get_setting('onlyoffice_mode', 'local_files')
             self.server_url = self.get_setting('onlyoffice_server_url', 'http://localhost:8000')
@@ -67,11 +68,10 @@ class OnlyOfficeService:
         self.temp_path.mkdir(parents=True, exist_ok=True)
     
     def get_setting(self, key: str, default: str) -> str:
-        """Get setting from database or return default"""
+        """Get setting from the settings cache or return default"""
         try:
-            from app.models import SystemSettings
-            setting = SystemSettings.query.filter_by(key=key).first()
-            return setting.value if setting else default
+            from app.services.settings_cache import settings_cache
+            return settings_cache.get(key, default)
         except:
             return default
     
@@ -85,7 +85,7 @@ class OnlyOfficeService:
             return False
         
         try:
-            response = requests.get(f"{self.server_url}/healthcheck", timeout=5)
+            response = http_client.get(f"{self.server_url}/healthcheck", timeout=5)
             return response.status_code == 200
         except:
             return False
@@ -279,7 +279,7 @@ class OnlyOfficeService:
                 return {'error': 'Requests library not available for document download'}
             
             # Download document from OnlyOffice
-            response = requests.get(download_url, timeout=30)
+            response = http_client.get(download_url, timeout=30)
             response.raise_for_status()
             
             # Save to storage
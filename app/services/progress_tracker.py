@@ -2,14 +2,18 @@
 Progress tracking for large file uploads and processing
 """
 
-from flask import jsonify
+import time
+from typing import Optional, Dict, Any
+
+from flask import current_app
 from app.models import ProcessingJob
 from app import db
+from app.services.job_events import job_events
 from datetime import datetime
 
 class ProgressTracker:
     """Track progress of file uploads and processing"""
-    
+
     @staticmethod
     def create_job(job_type, document_id, estimated_duration=None):
         """Create a new processing job"""
@@ -17,39 +21,115 @@ class ProgressTracker:
             job_type=job_type,
             document_id=document_id,
             status='pending',
-            progress_percentage=0,
+            progress=0,
             estimated_duration=estimated_duration
         )
         db.session.add(job)
         db.session.commit()
         return job.id
-    
+
     @staticmethod
-    def update_progress(job_id, progress_percentage, status=None, message=None):
-        """Update job progress"""
-        job = ProcessingJob.query.get(job_id)
-        if job:
-            job.progress_percentage = progress_percentage
+    def update_progress(job_id, progress, status=None, message=None, detail=None, estimated_duration=None,
+                        document_id=None):
+        """Update job progress and push it to event streams
+
+        A single UPDATE: the job row is not loaded, and objects of the
+        caller's session are left alone. Progress also renews a queue
+        worker's lock, so long jobs that keep reporting are not taken for
+        abandoned by ``JobQueue.recover_stale``.
+        """
+        now = datetime.utcnow()
+        values = {
+            'progress': progress,
+            'updated_at': now,
+            'locked_at': db.case((ProcessingJob.locked_by.isnot(None), now), else_=ProcessingJob.locked_at)
+        }
+        if status:
+            values['status'] = status
+        if message:
+            values['status_message'] = message[:255]
+        if detail is not None:
+            values['progress_detail'] = detail
+        if estimated_duration is not None:
+            values['estimated_duration'] = estimated_duration
+        updated = ProcessingJob.query.filter_by(id=job_id).update(values, synchronize_session=False)
+        if updated:
+            event = dict(detail or {}, job_id=job_id, document_id=document_id, progress=progress,
+                         message=values.get('status_message'))
             if status:
-                job.status = status
-            if message:
-                job.status_message = message
-            job.updated_at = datetime.utcnow()
-            db.session.commit()
-            return True
-        return False
-    
+                event['status'] = status
+            job_events.publish('progress', **event)
+        db.session.commit()
+        return bool(updated)
+
     @staticmethod
     def get_progress(job_id):
         """Get current job progress"""
         job = ProcessingJob.query.get(job_id)
         if job:
-            return {
-                'id': job.id,
-                'status': job.status,
-                'progress': job.progress_percentage,
-                'message': getattr(job, 'status_message', ''),
-                'created_at': job.created_at.isoformat(),
-                'updated_at': job.updated_at.isoformat()
-            }
+            return ProgressTracker.describe(job)
         return None
+
+    @staticmethod
+    def describe(job) -> Dict[str, Any]:
+        """Progress fields of a job for status responses"""
+        detail = job.progress_detail or {}
+        return {
+            'id': str(job.id),
+            'status': job.status,
+            'progress': job.progress or 0,
+            'message': job.status_message or '',
+            'stage': detail.get('stage'),
+            'stages': detail.get('stages', {}),
+            'eta_seconds': detail.get('eta_seconds'),
+            'estimated_duration': job.estimated_duration,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'updated_at': job.updated_at.isoformat() if job.updated_at else None
+        }
+
+
+class JobProgress:
+    """Throttled progress reports for one running job
+
+    ``update`` can be called as often as convenient (every page or batch):
+    the job row is written at most once per ``interval`` seconds, plus
+    whenever the stage changes, so progress never costs more than a handful
+    of commits per minute. The ETA extrapolates the time per percent so far.
+    """
+
+    def __init__(self, job_id, interval: Optional[float] = None, document_id=None):
+        self.job_id = job_id
+        self.document_id = document_id
+        if interval is None:
+            interval = current_app.config.get('JOB_PROGRESS_INTERVAL', 2.0)
+        self.interval = interval
+        self.started = time.monotonic()
+        self.writes = 0
+        self.skipped = 0
+
+        self._written_at = 0.0
+        self._last = None
+
+    def update(self, progress: int, stage: Optional[str] = None, message: Optional[str] = None,
+               stages: Optional[Dict[str, Any]] = None, force: bool = False) -> bool:
+        """Record ``progress`` (0-100) unless a write is not due yet; True when written"""
+        progress = max(0, min(int(progress), 100))
+        now = time.monotonic()
+        changed = self._last is None or (progress, stage, message) != self._last[:3]
+        stage_changed = self._last is None or stage != self._last[1]
+        if not force and not stage_changed and (not changed or now - self._written_at < self.interval):
+            self.skipped += 1
+            return False
+
+        elapsed = now - self.started
+        eta = round(elapsed * (100 - progress) / progress) if 0 < progress < 100 else None
+        detail = {'stage': stage, 'stages': stages or {}, 'eta_seconds': eta}
+        ProgressTracker.update_progress(
+            self.job_id, progress, message=message, detail=detail,
+            estimated_duration=round(elapsed + eta) if eta is not None else None,
+            document_id=self.document_id
+        )
+        self._written_at = now
+        self._last = (progress, stage, message)
+        self.writes += 1
+        return True
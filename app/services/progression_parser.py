@@ -0,0 +1,116 @@
+"""
+Progression Parser
+Rule-based extraction of lesson titles from progression documents, in English
+and French and tolerant of common OCR noise, tried before the LLM
+"""
+
+import re
+import unicodedata
+from typing import Dict, Any, List, Optional, Tuple
+
+# "Lesson", "Leçon", "Lecon" and OCR misreads such as "Lessen", "LESS0N", "Le9on", "Lecon"
+_LESSON_WORD = r"(?:l[e3€][s5$]{1,2}[o0e]n|l[e3€][cç9ςg][o0]n)"
+# "N°", "No.", "n°" between the keyword and the number
+_NUMBER_MARK = r"(?:n\s*[°o0º]\s*\.?\s*)?"
+# Digits, allowing O/o/l/I misread inside the number
+_NUMBER = r"([0-9][0-9oOlI]?|[lI][0-9])"
+_SEPARATOR = r"\s*(?:[:;.\-–—)|]+|\s)\s*"
+
+LESSON_LINE = re.compile(rf"^\W*{_LESSON_WORD}\s*{_NUMBER_MARK}{_NUMBER}{_SEPARATOR}(?P<title>.+)$", re.IGNORECASE)
+NUMBERED_LINE = re.compile(r"^\s*\|?\s*(\d{1,2})\s*(?:[.):\-–|]|\t|\s{2,})\s*(?P<title>.+)$")
+
+# Dotted leaders and page numbers ("Cells ........ 12"), trailing table cells and durations
+_LEADER = re.compile(r"\s*(?:\.{2,}|…+|_{2,})\s*\d*\s*$")
+_TRAILING_CELLS = re.compile(r"\s*(?:\||\t|\s{3,}).*$")
+_DURATION = re.compile(r"\s*\(?\b\d+\s*(?:h|hrs?|hours?|heures?|min)\b\)?\s*$", re.IGNORECASE)
+
+# Weight of each pattern: an explicit "Lesson"/"Leçon" keyword is stronger evidence than a numbered list
+PATTERN_WEIGHTS = {'lesson_keyword': 1.0, 'numbered_list': 0.85}
+
+
+def _normalize(line: str) -> str:
+    line = unicodedata.normalize('NFKC', line)
+    return re.sub(r"[  ]+", " ", line).rstrip()
+
+
+def _to_int(raw: str) -> Optional[int]:
+    digits = raw.translate(str.maketrans('oOlI', '0011'))
+    return int(digits) if digits.isdigit() else None
+
+
+def _clean_title(title: str) -> str:
+    title = _TRAILING_CELLS.sub("", title.strip().strip('|').strip())
+    title = _LEADER.sub("", title)
+    title = _DURATION.sub("", title)
+    return title.strip(" .:-–—;").strip()
+
+
+def _match(lines: List[str], pattern: re.Pattern) -> List[Tuple[int, str]]:
+    """(number, title) entries, joining OCR-wrapped continuation lines onto the title"""
+    entries = []
+    previous_blank = True
+    for line in lines:
+        if not line.strip():
+            previous_blank = True
+            continue
+        match = pattern.match(line)
+        if match:
+            number = _to_int(match.group(1))
+            title = _clean_title(match.group('title'))
+            if number is not None and title:
+                entries.append((number, title))
+                previous_blank = False
+                continue
+        stripped = line.strip()
+        # A lowercase line right under an entry is the rest of a wrapped title
+        if entries and not previous_blank and stripped[:1].islower() and len(stripped) < 80:
+            number, title = entries[-1]
+            entries[-1] = (number, _clean_title(f"{title} {stripped}"))
+        previous_blank = False
+    return entries
+
+
+def _sequence_score(numbers: List[int]) -> float:
+    """Share of steps that continue the numbering (restarts at 1 allowed for new terms)"""
+    if len(numbers) < 2:
+        return 0.5
+    good = sum(1 for a, b in zip(numbers, numbers[1:]) if b == a + 1 or (b == 1 and a > 1))
+    return good / (len(numbers) - 1)
+
+
+def parse_progression(text: str) -> Dict[str, Any]:
+    """Parse lesson titles from progression text
+
+    Returns ``{'lessons': [{'lesson': 'Lesson 1: ...'}, ...], 'confidence': 0-1,
+    'method': 'lesson_keyword' | 'numbered_list' | None}``; lessons are
+    renumbered sequentially, matching the LLM extraction format.
+    """
+    lines = [_normalize(line) for line in (text or "").splitlines()]
+    best = {'lessons': [], 'confidence': 0.0, 'method': None}
+
+    for method, pattern in (('lesson_keyword', LESSON_LINE), ('numbered_list', NUMBERED_LINE)):
+        entries = _match(lines, pattern)
+        if not entries:
+            continue
+
+        # Drop repeated headers/footers that OCR captures on every page
+        seen, unique = set(), []
+        for number, title in entries:
+            key = (number, title.lower())
+            if key not in seen:
+                seen.add(key)
+                unique.append((number, title))
+
+        numbers = [number for number, _ in unique]
+        size_score = min(1.0, len(unique) / 3)
+        confidence = PATTERN_WEIGHTS[method] * _sequence_score(numbers) * size_score
+        if confidence > best['confidence']:
+            best = {
+                'lessons': [{'lesson': f"Lesson {i}: {title}"} for i, (_, title) in enumerate(unique, 1)],
+                'confidence': round(confidence, 3),
+                'method': method
+            }
+        if method == 'lesson_keyword' and confidence >= PATTERN_WEIGHTS['numbered_list']:
+            break  # numbered lists cannot beat a clean keyword match
+
+    return best
@@ -0,0 +1,175 @@
+"""
+Semantic Response Cache
+Serves repeated chat questions from memory instead of a full LLM generation
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+
+class SemanticResponseCache:
+    """LRU + TTL cache of LLM answers matched by query embedding similarity.
+
+    Entries are bucketed by an exact key (provider, model, system prompt and the
+    ids of the retrieved chunks). Inside a bucket a lookup succeeds when the
+    cosine similarity between the new query embedding and a cached one is at
+    least ``similarity_threshold``.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: int = 3600,
+                 similarity_threshold: float = 0.92, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.enabled = enabled
+
+        self._entries = OrderedDict()  # entry_id -> entry dict, oldest first
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._embedding_service = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        """Apply cache settings from the Flask config"""
+        self.enabled = app.config.get('RESPONSE_CACHE_ENABLED', self.enabled)
+        self.max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', self.max_entries)
+        self.ttl_seconds = app.config.get('RESPONSE_CACHE_TTL', self.ttl_seconds)
+        self.similarity_threshold = app.config.get('RESPONSE_CACHE_SIMILARITY_THRESHOLD',
+                                                   self.similarity_threshold)
+
+    @staticmethod
+    def make_key(provider: str, model: str, system_prompt: str = "",
+                 chunk_ids: Optional[List[str]] = None, extra: str = "") -> str:
+        """Build the exact-match part of the cache key"""
+        ids = ",".join(sorted(str(c) for c in (chunk_ids or [])))
+        raw = "\x1f".join([provider or "", model or "", system_prompt or "", ids, extra or ""])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def embed(self, text: str) -> Optional[List[float]]:
+        """Embed a query with a process-wide EmbeddingService (loaded once)"""
+        try:
+            if self._embedding_service is None:
+                from app.services.embedding_service import EmbeddingService
+                self._embedding_service = EmbeddingService()
+            return self._embedding_service.get_embedding(text)
+        except Exception as e:
+            print(f"Response cache embedding failed: {e}")
+            return None
+
+    def lookup(self, key: str, query_embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Return the best cached entry for the key above the similarity threshold"""
+        if not self.enabled or query_embedding is None:
+            return None
+
+        query = np.asarray(query_embedding, dtype=float)
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return None
+
+        now = time.time()
+        best_id, best_score = None, -1.0
+
+        with self._lock:
+            self._expire(now)
+            for entry_id, entry in self._entries.items():
+                if entry['key'] != key:
+                    continue
+                score = float(np.dot(query, entry['embedding']) / (query_norm * entry['norm']))
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is not None and best_score >= self.similarity_threshold:
+                self._entries.move_to_end(best_id)
+                entry = self._entries[best_id]
+                entry['hits'] += 1
+                self.hits += 1
+                return {
+                    'response': entry['response'],
+                    'similarity': best_score,
+                    'document_ids': list(entry['document_ids']),
+                    'created_at': entry['created_at']
+                }
+
+            self.misses += 1
+            return None
+
+    def store(self, key: str, query_embedding: List[float], response: str,
+              document_ids: Optional[List[str]] = None) -> None:
+        """Cache a generated response"""
+        if not self.enabled or query_embedding is None or not response:
+            return
+
+        embedding = np.asarray(query_embedding, dtype=float)
+        norm = np.linalg.norm(embedding)
+        if norm == 0:
+            return
+
+        with self._lock:
+            self._next_id += 1
+            self._entries[self._next_id] = {
+                'key': key,
+                'embedding': embedding,
+                'norm': norm,
+                'response': response,
+                'document_ids': frozenset(str(d) for d in (document_ids or [])),
+                'created_at': time.time(),
+                'hits': 0
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_document(self, document_id) -> int:
+        """Drop every entry whose answer cites the given document"""
+        document_id = str(document_id)
+        with self._lock:
+            stale = [entry_id for entry_id, entry in self._entries.items()
+                     if document_id in entry['document_ids']]
+            for entry_id in stale:
+                del self._entries[entry_id]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def _expire(self, now: float) -> None:
+        """Remove entries older than the TTL (caller holds the lock)"""
+        if not self.ttl_seconds:
+            return
+        cutoff = now - self.ttl_seconds
+        # LRU order follows last access, not creation time, so check every entry
+        for entry_id in [i for i, e in self._entries.items() if e['created_at'] < cutoff]:
+            del self._entries[entry_id]
+            self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache metrics for the /api/metrics endpoint"""
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'similarity_threshold': self.similarity_threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+
+# Global cache instance
+response_cache = SemanticResponseCache()
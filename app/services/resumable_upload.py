@@ -0,0 +1,320 @@
+"""
+Resumable Uploads
+Large documents uploaded in chunks that can arrive in any order and be
+retried: an interrupted upload resumes from the bytes the server already
+has instead of starting over. Each upload is a directory under the upload
+folder holding the file being assembled and a manifest of received ranges.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from werkzeug.utils import secure_filename
+
+from app.services.upload_stream import upload_receiver, fsync_dir, COPY_BUFFER, INCOMING_DIR
+
+# Uploads being assembled live here, inside the upload folder so the final rename stays on one filesystem
+RESUMABLE_DIR = '.resumable'
+DATA_FILE = 'data'
+MANIFEST_FILE = 'upload.json'
+
+
+class UploadError(Exception):
+    """A resumable upload request that cannot be honoured; ``status`` is the HTTP status"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def add_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """Merge the byte range ``[start, end)`` into sorted, non-overlapping ``ranges``"""
+    if end <= start:
+        return ranges
+    merged = []
+    for range_start, range_end in sorted(ranges + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+
+def missing_ranges(ranges: List[List[int]], size: int) -> List[List[int]]:
+    """Byte ranges of ``[0, size)`` not covered by ``ranges``"""
+    missing, position = [], 0
+    for start, end in ranges:
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < size:
+        missing.append([position, size])
+    return missing
+
+
+class ResumableUploads:
+    """Init, chunk, status and finalize for chunked uploads, plus cleanup of abandoned ones
+
+    Chunks are written at their offset straight into the upload's data file
+    and fsynced before their range is recorded, so the manifest never
+    claims bytes that a crash could lose. Uploads untouched for ``ttl``
+    seconds are deleted; cleanup runs as new uploads start.
+    """
+
+    def __init__(self, chunk_size: int = 8 * 1024 * 1024, ttl: float = 24 * 3600,
+                 cleanup_interval: float = 3600):
+        self.chunk_size = chunk_size
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self.upload_folder = 'uploads'
+
+        self._lock = threading.Lock()
+        self._upload_locks: Dict[str, threading.Lock] = {}
+        self._cleaned_at = 0.0
+        self.started = 0
+        self.chunks = 0
+        self.bytes = 0
+        self.finalized = 0
+        self.expired = 0
+
+    def init_app(self, app):
+        """Apply resumable upload settings from the Flask config"""
+        self.chunk_size = app.config.get('UPLOAD_CHUNK_SIZE', self.chunk_size)
+        self.ttl = app.config.get('UPLOAD_RESUMABLE_TTL', self.ttl)
+        self.upload_folder = app.config['UPLOAD_FOLDER']
+
+    def create(self, filename: str, size: int, metadata: Optional[Dict[str, Any]] = None,
+               sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Start an upload of ``size`` bytes; ``metadata`` is kept for finalize"""
+        self.cleanup_if_due()
+        if size <= 0:
+            raise UploadError('File size is required')
+        if size > upload_receiver.max_file_size:
+            raise UploadError(f"File too large (max: {upload_receiver.max_file_size / (1024 * 1024):.0f}MB)", 413)
+        free = shutil.disk_usage(self._root()).free
+        if free - size < upload_receiver.min_free_space:
+            raise UploadError(f"Not enough disk space for uploads ({free / (1024 ** 3):.1f}GB free)", 507)
+
+        upload_id = uuid.uuid4().hex
+        directory = self._directory(upload_id)
+        os.makedirs(directory)
+        # Sparse file of the final size: chunks are written at their offsets
+        with open(os.path.join(directory, DATA_FILE), 'wb') as f:
+            f.truncate(size)
+        manifest = {
+            'upload_id': upload_id,
+            'filename': secure_filename(filename),
+            'size': size,
+            'sha256': sha256.lower() if sha256 else None,
+            'metadata': metadata or {},
+            'received': [],
+            'created_at': datetime.utcnow().isoformat(),
+            'updated_at': datetime.utcnow().isoformat()
+        }
+        self._save(manifest)
+        with self._lock:
+            self.started += 1
+        print(f"📤 Resumable upload {upload_id} started: {manifest['filename']} ({size / (1024 * 1024):.1f}MB)")
+        return self.describe(manifest)
+
+    def write_chunk(self, upload_id: str, offset: int, stream, length: Optional[int] = None) -> Dict[str, Any]:
+        """Write the chunk read from ``stream`` at ``offset``
+
+        Whatever arrived before a dropped connection is kept and recorded,
+        so the retry only needs the rest.
+        """
+        manifest = self._load(upload_id)
+        size = manifest['size']
+        if offset < 0 or offset > size or (length is not None and offset + length > size):
+            raise UploadError(f"Chunk outside the file ({size} bytes)", 416)
+
+        # Chunks write disjoint parts of the file, so only the manifest update is serialized
+        written = 0
+        try:
+            with open(os.path.join(self._directory(upload_id), DATA_FILE), 'r+b') as f:
+                f.seek(offset)
+                try:
+                    for block in iter(lambda: stream.read(COPY_BUFFER), b""):
+                        if offset + written + len(block) > size:
+                            raise UploadError(f"Chunk outside the file ({size} bytes)", 416)
+                        f.write(block)
+                        written += len(block)
+                finally:
+                    f.flush()
+                    os.fsync(f.fileno())
+        finally:
+            if written:
+                with self._upload_lock(upload_id):
+                    manifest = self._load(upload_id)
+                    manifest['received'] = add_range(manifest['received'], offset, offset + written)
+                    manifest['updated_at'] = datetime.utcnow().isoformat()
+                    self._save(manifest)
+                with self._lock:
+                    self.chunks += 1
+                    self.bytes += written
+        return self.describe(manifest)
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        return self.describe(self._load(upload_id))
+
+    def finalize(self, upload_id: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Move a complete upload into the upload folder
+
+        Returns ``file_info`` in the shape of ``LargeFileUploadService.save_file``
+        and the metadata given at init.
+        """
+        with self._upload_lock(upload_id):
+            manifest = self._load(upload_id)
+            missing = missing_ranges(manifest['received'], manifest['size'])
+            if missing:
+                raise UploadError(f"Upload incomplete: {sum(end - start for start, end in missing)} bytes missing",
+                                  409)
+
+            directory = self._directory(upload_id)
+            data_path = os.path.join(directory, DATA_FILE)
+            hash_sha256 = hashlib.sha256()
+            with open(data_path, 'rb') as f:
+                for block in iter(lambda: f.read(COPY_BUFFER), b""):
+                    hash_sha256.update(block)
+            file_hash = hash_sha256.hexdigest()
+            if manifest['sha256'] and manifest['sha256'] != file_hash:
+                # Something was corrupted on the way: start over rather than ingest it
+                self.discard(upload_id)
+                raise UploadError('Checksum mismatch: the uploaded file differs from the original', 422)
+
+            filename = manifest['filename']
+            name, ext = os.path.splitext(filename)
+            unique_filename = f"{uuid.uuid4()}_{name}{ext}"
+            file_path = os.path.join(self.upload_folder, unique_filename)
+            os.replace(data_path, file_path)
+            fsync_dir(self.upload_folder)
+            shutil.rmtree(directory, ignore_errors=True)
+
+        with self._lock:
+            self.finalized += 1
+            self._upload_locks.pop(upload_id, None)
+        print(f"✅ Resumable upload {upload_id} complete: {filename}")
+        file_info = {
+            'original_name': filename,
+            'saved_name': unique_filename,
+            'file_path': file_path,
+            'file_size': manifest['size'],
+            'mime_type': manifest['metadata'].get('mime_type'),
+            'upload_time': datetime.utcnow(),
+            'file_hash': file_hash
+        }
+        return file_info, manifest['metadata']
+
+    def discard(self, upload_id: str):
+        """Delete an upload and everything received for it"""
+        self._load(upload_id)
+        shutil.rmtree(self._directory(upload_id), ignore_errors=True)
+        with self._lock:
+            self._upload_locks.pop(upload_id, None)
+
+    def describe(self, manifest: Dict[str, Any]) -> Dict[str, Any]:
+        received = sum(end - start for start, end in manifest['received'])
+        missing = missing_ranges(manifest['received'], manifest['size'])
+        return {
+            'upload_id': manifest['upload_id'],
+            'filename': manifest['filename'],
+            'size': manifest['size'],
+            'bytes_received': received,
+            'received': manifest['received'],
+            'missing': missing,
+            'complete': not missing,
+            'chunk_size': self.chunk_size,
+            'expires_in': self.ttl,
+            'updated_at': manifest['updated_at']
+        }
+
+    def cleanup_if_due(self):
+        with self._lock:
+            if time.time() - self._cleaned_at < self.cleanup_interval:
+                return
+            self._cleaned_at = time.time()
+        self.cleanup()
+
+    def cleanup(self) -> int:
+        """Delete uploads (and stray streamed parts) untouched for ``ttl`` seconds"""
+        cutoff = time.time() - self.ttl
+        removed = 0
+        root = self._root()
+        for upload_id in os.listdir(root):
+            directory = os.path.join(root, upload_id)
+            try:
+                touched = os.path.getmtime(os.path.join(directory, MANIFEST_FILE))
+            except OSError:
+                touched = os.path.getmtime(directory)
+            if touched < cutoff:
+                shutil.rmtree(directory, ignore_errors=True)
+                removed += 1
+        incoming = os.path.join(self.upload_folder, INCOMING_DIR)
+        if os.path.isdir(incoming):
+            for name in os.listdir(incoming):
+                path = os.path.join(incoming, name)
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+        if removed:
+            with self._lock:
+                self.expired += removed
+            print(f"🧹 Removed {removed} abandoned uploads")
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'started': self.started,
+                'chunks': self.chunks,
+                'megabytes': round(self.bytes / (1024 * 1024), 1),
+                'finalized': self.finalized,
+                'expired': self.expired,
+                'chunk_size': self.chunk_size
+            }
+        try:
+            stats['in_progress'] = len(os.listdir(self._root()))
+        except OSError:
+            stats['in_progress'] = 0
+        return stats
+
+    def _root(self) -> str:
+        root = os.path.join(self.upload_folder, RESUMABLE_DIR)
+        os.makedirs(root, exist_ok=True)
+        return root
+
+    def _directory(self, upload_id: str) -> str:
+        if not upload_id.isalnum():
+            raise UploadError('Upload not found', 404)
+        return os.path.join(self._root(), upload_id)
+
+    def _upload_lock(self, upload_id: str) -> threading.Lock:
+        with self._lock:
+            return self._upload_locks.setdefault(upload_id, threading.Lock())
+
+    def _load(self, upload_id: str) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self._directory(upload_id), MANIFEST_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadError('Upload not found or expired', 404)
+
+    def _save(self, manifest: Dict[str, Any]):
+        # Written aside and renamed: a crash leaves the previous manifest, never half of one
+        path = os.path.join(self._directory(manifest['upload_id']), MANIFEST_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+
+# Global resumable upload instance
+resumable_uploads = ResumableUploads()
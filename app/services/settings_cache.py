@@ -0,0 +1,185 @@
+"""
+Settings Cache
+Process-wide, typed copy of the system_settings table. Loaded once and kept
+until settings change: commits touching SystemSettings drop the local copy and
+bump a version counter row that other processes poll to reload theirs.
+"""
+
+import json
+import threading
+import time
+import weakref
+from typing import Dict, Any, Optional
+
+from sqlalchemy import Integer, String, cast, event
+from sqlalchemy.orm import Session
+
+from app.models import db, SystemSettings
+
+# Row holding the settings version; never shown as a setting
+VERSION_KEY = 'settings_version'
+
+_TRUE = ('true', '1', 'yes', 'on')
+
+
+class SettingsCache:
+    """Typed reads of system settings from memory
+
+    Any commit that adds, changes or deletes a ``SystemSettings`` row
+    increments the ``settings_version`` row in the same transaction and
+    invalidates this process's copy. Other processes compare the stored
+    version at most every ``check_interval`` seconds and reload on change.
+    """
+
+    def __init__(self, check_interval: float = 2.0):
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._rows: Optional[Dict[str, Dict[str, Any]]] = None
+        self._version = None
+        self._engine = None
+        self._checked = 0.0
+        self.hits = 0
+        self.loads = 0
+        self.version_checks = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        """Apply cache settings from the Flask config"""
+        self.check_interval = app.config.get('SETTINGS_CACHE_CHECK_INTERVAL', self.check_interval)
+
+    def _current(self) -> Dict[str, Dict[str, Any]]:
+        engine = db.engine
+        now = time.monotonic()
+        with self._lock:
+            rows = self._rows
+            # A copy belongs to one database; another engine (app) loads its own
+            same_engine = self._engine is not None and self._engine() is engine
+            fresh = rows is not None and same_engine and now - self._checked < self.check_interval
+            if fresh:
+                self.hits += 1
+                return rows
+
+        if rows is not None and same_engine:
+            version = db.session.query(SystemSettings.value).filter_by(key=VERSION_KEY).scalar()
+            with self._lock:
+                self.version_checks += 1
+                if version == self._version and self._rows is rows:
+                    self._checked = now
+                    self.hits += 1
+                    return rows
+
+        return self._load(engine, now)
+
+    def _load(self, engine, now: float) -> Dict[str, Dict[str, Any]]:
+        rows, version = {}, None
+        for setting in SystemSettings.query.all():
+            if setting.key == VERSION_KEY:
+                version = setting.value
+                continue
+            rows[setting.key] = {
+                'value': setting.value,
+                'description': setting.description,
+                'type': setting.setting_type
+            }
+        with self._lock:
+            self._rows = rows
+            self._version = version
+            self._engine = weakref.ref(engine)
+            self._checked = now
+            self.loads += 1
+        return rows
+
+    def all(self) -> Dict[str, Optional[str]]:
+        """All settings as ``{key: value}``"""
+        return {key: row['value'] for key, row in self._current().items()}
+
+    def describe(self) -> Dict[str, Dict[str, Any]]:
+        """All settings with their description and type"""
+        return {key: dict(row) for key, row in self._current().items()}
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        row = self._current().get(key)
+        return row['value'] if row is not None and row['value'] is not None else default
+
+    def get_int(self, key: str, default: int) -> int:
+        try:
+            return int(self.get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    def get_float(self, key: str, default: float) -> float:
+        try:
+            return float(self.get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        value = self.get(key)
+        return default if value is None else str(value).strip().lower() in _TRUE
+
+    def get_json(self, key: str, default: Any = None) -> Any:
+        value = self.get(key)
+        if value is None:
+            return default
+        try:
+            return json.loads(value)
+        except ValueError:
+            return default
+
+    def invalidate(self):
+        """Drop this process's copy; the next read reloads"""
+        with self._lock:
+            self._rows = None
+            self.invalidations += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'loaded': self._rows is not None,
+                'settings': len(self._rows or {}),
+                'version': self._version,
+                'hits': self.hits,
+                'loads': self.loads,
+                'version_checks': self.version_checks,
+                'invalidations': self.invalidations,
+                'check_interval': self.check_interval
+            }
+
+
+# Global settings cache
+settings_cache = SettingsCache()
+
+
+@event.listens_for(Session, 'before_flush')
+def _bump_settings_version(session, flush_context, instances):
+    """Increment the settings version in the transaction that changes a setting"""
+    changed = [obj for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+               if isinstance(obj, SystemSettings) and obj.key != VERSION_KEY]
+    if not changed or session.info.get('settings_version_bumped'):
+        if changed:
+            session.info['settings_changed'] = True
+        return
+
+    bumped = (session.query(SystemSettings)
+              .filter(SystemSettings.key == VERSION_KEY)
+              .update({SystemSettings.value: cast(cast(SystemSettings.value, Integer) + 1, String)},
+                      synchronize_session=False))
+    if not bumped:
+        session.add(SystemSettings(key=VERSION_KEY, value='1', setting_type='integer',
+                                   description='Incremented on every settings change'))
+    session.info['settings_changed'] = True
+    session.info['settings_version_bumped'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _settings_committed(session):
+    session.info.pop('settings_version_bumped', None)
+    if session.info.pop('settings_changed', False):
+        settings_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _settings_rolled_back(session):
+    session.info.pop('settings_version_bumped', None)
+    session.info.pop('settings_changed', None)
@@ -0,0 +1,79 @@
+"""
+Single-Flight Request Coalescing
+Concurrent calls with the same key share one in-flight upstream call
+"""
+
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict
+
+
+class _Call:
+    """An in-flight call and the outcome its followers are waiting for"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Deduplicate concurrent identical calls (Go's singleflight pattern)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Stable key for (provider, model, prompt, options)-style tuples"""
+        raw = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run fn once per key at a time; concurrent callers get the same result"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            'upstream_calls': self.leaders,
+            'coalesced_calls': self.coalesced,
+            'in_flight': in_flight
+        }
+
+
+# Global instance shared by LLMService and LessonNoteService
+llm_single_flight = SingleFlight()
@@ -0,0 +1,196 @@
+"""
+Upload Stream
+Uploaded files written straight into the upload folder as the request body
+arrives: SHA-256 and size are computed in the same pass, limits are
+enforced while receiving, and finished files are fsynced and renamed into
+place so a crash never leaves a half-written document behind.
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Any, Optional
+
+from flask import Request, current_app
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+
+# Bytes per disk write while receiving uploads
+COPY_BUFFER = 1024 * 1024
+# Files being received live here, inside the upload folder so the final rename stays on one filesystem
+INCOMING_DIR = '.incoming'
+
+
+class InsufficientStorage(HTTPException):
+    """507: the upload folder's disk cannot take the upload"""
+    code = 507
+    description = 'Not enough disk space to store the upload.'
+
+
+class UploadSink:
+    """One file being received into ``folder``
+
+    Bytes go to a hidden ``.part`` file through a large write buffer and are
+    hashed as they are written. ``commit`` makes the file durable and
+    renames it into place; closing a sink that was never committed removes
+    the part, so abandoned or rejected uploads leave nothing on disk.
+    Readable and seekable, so it can back a werkzeug ``FileStorage``.
+    """
+
+    def __init__(self, folder: str, max_size: Optional[int] = None, buffer_size: int = COPY_BUFFER,
+                 on_reject: Optional[Callable[[], None]] = None):
+        incoming = os.path.join(folder, INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+        self.max_size = max_size
+        self.on_reject = on_reject
+        self.part_path = os.path.join(incoming, f"{uuid.uuid4()}.part")
+        self.path = None
+        self.size = 0
+        self.started = time.monotonic()
+        self.seconds = 0.0
+
+        self._hash = hashlib.sha256()
+        self._file = open(self.part_path, 'w+b', buffering=buffer_size)
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.close()
+            if self.on_reject:
+                self.on_reject()
+            raise RequestEntityTooLarge(f"File too large (max: {self.max_size / (1024 * 1024):.0f}MB)")
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    @property
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+    def commit(self, path: str) -> str:
+        """fsync the received bytes and atomically rename them to ``path``"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.part_path, path)
+        fsync_dir(os.path.dirname(path) or '.')
+        self.path = path
+        self.seconds = time.monotonic() - self.started
+        return path
+
+    def close(self):
+        """Release the file; an uncommitted part is deleted"""
+        if not self._file.closed:
+            self._file.close()
+        if self.path is None and os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+
+def fsync_dir(path: str):
+    """Persist a rename: fsync the directory entry (not possible on Windows)"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class UploadReceiver:
+    """Opens upload sinks, checks limits before receiving and keeps throughput statistics"""
+
+    def __init__(self, max_file_size: int = 500 * 1024 * 1024, min_free_space: int = 1024 * 1024 * 1024,
+                 endpoints=('api.upload_document',)):
+        self.max_file_size = max_file_size
+        self.min_free_space = min_free_space
+        # Endpoints whose multipart files are received straight into the upload folder
+        self.endpoints = set(endpoints)
+
+        self._lock = threading.Lock()
+        self.files = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.rejected = 0
+
+    def init_app(self, app):
+        """Apply upload limits from the Flask config and stream uploads through ``UploadRequest``"""
+        self.max_file_size = app.config.get('UPLOAD_MAX_FILE_SIZE', self.max_file_size)
+        self.min_free_space = app.config.get('UPLOAD_MIN_FREE_SPACE', self.min_free_space)
+        app.request_class = UploadRequest
+
+    def open(self, folder: str, expected_size: Optional[int] = None) -> UploadSink:
+        """A sink for one file, refused up front when ``expected_size`` bytes would not fit on disk
+
+        Requests over ``MAX_CONTENT_LENGTH`` are refused by Flask before any
+        body is read; the per-file limit is enforced by the sink as it writes.
+        """
+        os.makedirs(folder, exist_ok=True)
+        free = shutil.disk_usage(folder).free
+        if free - (expected_size or 0) < self.min_free_space:
+            self.reject()
+            raise InsufficientStorage(f"Not enough disk space for uploads ({free / (1024 ** 3):.1f}GB free)")
+        return UploadSink(folder, self.max_file_size, on_reject=self.reject)
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def record(self, sink: UploadSink):
+        with self._lock:
+            self.files += 1
+            self.bytes += sink.size
+            self.seconds += sink.seconds
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            megabytes = self.bytes / (1024 * 1024)
+            return {
+                'files': self.files,
+                'megabytes': round(megabytes, 1),
+                'seconds': round(self.seconds, 2),
+                'mb_per_second': round(megabytes / self.seconds, 1) if self.seconds else 0,
+                'rejected': self.rejected,
+                'max_file_size_mb': round(self.max_file_size / (1024 * 1024))
+            }
+
+
+class UploadRequest(Request):
+    """Request whose multipart files go to the upload folder, not a spooled temp file
+
+    Werkzeug normally spools large file parts to a temporary file that the
+    view then copies into place; for upload endpoints each part is written
+    once, to its final filesystem, while it is being parsed.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint not in upload_receiver.endpoints:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return upload_receiver.open(current_app.config['UPLOAD_FOLDER'], content_length or total_content_length)
+
+
+# Global receiver instance
+upload_receiver = UploadReceiver()
@@ -0,0 +1,41 @@
+"""Add rolling summary columns to chat sessions
+
+Revision ID: add_chat_session_summary
+Revises: replace_google_with_onlyoffice
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_chat_session_summary'
+down_revision = 'replace_google_with_onlyoffice'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    try:
+        op.add_column('chat_sessions', sa.Column('summary', sa.Text(), nullable=True))
+    except Exception:
+        pass
+    
+    try:
+        op.add_column('chat_sessions', sa.Column('summarized_message_count', sa.Integer(),
+                                                 nullable=True, server_default='0'))
+    except Exception:
+        pass
+
+
+def downgrade():
+    try:
+        op.drop_column('chat_sessions', 'summarized_message_count')
+    except Exception:
+        pass
+    
+    try:
+        op.drop_column('chat_sessions', 'summary')
+    except Exception:
+        pass
@@ -0,0 +1,41 @@
+"""Add curriculum digests table
+
+Revision ID: add_curriculum_digests
+Revises: add_document_lookup_indexes
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_curriculum_digests'
+down_revision = 'add_document_lookup_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    try:
+        op.create_table(
+            'curriculum_digests',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('subject', sa.String(100), nullable=False),
+            sa.Column('class_level', sa.String(50), nullable=False),
+            sa.Column('source_hash', sa.String(64), nullable=False),
+            sa.Column('model', sa.String(100), nullable=False),
+            sa.Column('digest', sa.Text(), nullable=False),
+            sa.Column('section_count', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.UniqueConstraint('subject', 'class_level', name='uq_curriculum_digest_subject_class')
+        )
+    except Exception:
+        pass
+
+
+def downgrade():
+    try:
+        op.drop_table('curriculum_digests')
+    except Exception:
+        pass
@@ -0,0 +1,40 @@
+"""Add content hash to documents for duplicate uploads
+
+Revision ID: add_document_content_hash
+Revises: add_job_progress_columns
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_document_content_hash'
+down_revision = 'add_job_progress_columns'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    try:
+        op.add_column('documents', sa.Column('content_hash', sa.String(64), nullable=True))
+    except Exception:
+        pass
+    
+    try:
+        op.create_index('ix_documents_content_hash', 'documents', ['content_hash'])
+    except Exception:
+        pass
+
+
+def downgrade():
+    try:
+        op.drop_index('ix_documents_content_hash', table_name='documents')
+    except Exception:
+        pass
+    
+    try:
+        op.drop_column('documents', 'content_hash')
+    except Exception:
+        pass
@@ -0,0 +1,40 @@
+"""Index documents by subject, class and type, and chunks by document
+
+Revision ID: add_document_lookup_indexes
+Revises: add_lesson_chunk_map
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_document_lookup_indexes'
+down_revision = 'add_lesson_chunk_map'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    try:
+        op.create_index('ix_documents_subject_class_type', 'documents',
+                        ['subject', 'class_level', 'document_type'])
+    except Exception:
+        pass
+    
+    try:
+        op.create_index('ix_document_chunks_document_id', 'document_chunks', ['document_id'])
+    except Exception:
+        pass
+
+
+def downgrade():
+    try:
+        op.drop_index('ix_document_chunks_document_id', table_name='document_chunks')
+    except Exception:
+        pass
+    
+    try:
+        op.drop_index('ix_documents_subject_class_type', table_name='documents')
+    except Exception:
+        pass
@@ -0,0 +1,40 @@
+"""Add progress columns to processing jobs
+
+Revision ID: add_job_progress_columns
+Revises: add_job_queue_columns
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_job_progress_columns'
+down_revision = 'add_job_queue_columns'
+branch_labels = None
+depends_on = None
+
+def _columns():
+    return [
+        sa.Column('status_message', sa.String(255), nullable=True),
+        sa.Column('progress_detail', sa.JSON(), nullable=True),
+        sa.Column('estimated_duration', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    ]
+
+
+def upgrade():
+    for column in _columns():
+        try:
+            op.add_column('processing_jobs', column)
+        except Exception:
+            pass
+
+
+def downgrade():
+    for column in reversed(_columns()):
+        try:
+            op.drop_column('processing_jobs', column.name)
+        except Exception:
+            pass
@@ -0,0 +1,53 @@
+"""Add job queue columns to processing jobs
+
+Revision ID: add_job_queue_columns
+Revises: add_settings_version
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_job_queue_columns'
+down_revision = 'add_settings_version'
+branch_labels = None
+depends_on = None
+
+def _columns():
+    return [
+        sa.Column('payload', sa.JSON(), nullable=True),
+        sa.Column('priority', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('attempts', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=True, server_default='3'),
+        sa.Column('run_after', sa.DateTime(), nullable=True),
+        sa.Column('locked_by', sa.String(100), nullable=True),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+    ]
+
+
+def upgrade():
+    for column in _columns():
+        try:
+            op.add_column('processing_jobs', column)
+        except Exception:
+            pass
+    
+    try:
+        op.create_index('ix_processing_jobs_claim', 'processing_jobs', ['status', 'priority', 'run_after'])
+    except Exception:
+        pass
+
+
+def downgrade():
+    try:
+        op.drop_index('ix_processing_jobs_claim', table_name='processing_jobs')
+    except Exception:
+        pass
+    
+    for column in reversed(_columns()):
+        try:
+            op.drop_column('processing_jobs', column.name)
+        except Exception:
+            pass
@@ -0,0 +1,41 @@
+"""Add lesson chunk map table
+
+Revision ID: add_lesson_chunk_map
+Revises: add_lesson_title_cache
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_lesson_chunk_map'
+down_revision = 'add_lesson_title_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    try:
+        op.create_table(
+            'lesson_chunk_map',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('subject', sa.String(100), nullable=False),
+            sa.Column('class_level', sa.String(50), nullable=False),
+            sa.Column('lesson', sa.String(500), nullable=False),
+            sa.Column('position', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('textbook_chunk_ids', sa.JSON(), nullable=False),
+            sa.Column('curriculum_chunk_ids', sa.JSON(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.UniqueConstraint('subject', 'class_level', 'lesson', name='uq_lesson_chunk_map_lesson')
+        )
+    except Exception:
+        pass
+
+
+def downgrade():
+    try:
+        op.drop_table('lesson_chunk_map')
+    except Exception:
+        pass
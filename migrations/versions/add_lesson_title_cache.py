@@ -0,0 +1,50 @@
+"""Add lesson title cache table
+
+Revision ID: add_lesson_title_cache
+Revises: add_chat_session_summary
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_lesson_title_cache'
+down_revision = 'add_chat_session_summary'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    try:
+        op.create_table(
+            'lesson_title_cache',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('content_hash', sa.String(64), nullable=False),
+            sa.Column('model', sa.String(100), nullable=False),
+            sa.Column('subject', sa.String(100), nullable=True),
+            sa.Column('class_level', sa.String(50), nullable=True),
+            sa.Column('lessons', sa.JSON(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.UniqueConstraint('content_hash', 'model', name='uq_lesson_title_cache_hash_model')
+        )
+    except Exception:
+        pass
+    
+    try:
+        op.create_index('ix_lesson_title_cache_subject', 'lesson_title_cache', ['subject'])
+    except Exception:
+        pass
+
+
+def downgrade():
+    try:
+        op.drop_index('ix_lesson_title_cache_subject', table_name='lesson_title_cache')
+    except Exception:
+        pass
+    
+    try:
+        op.drop_table('lesson_title_cache')
+    except Exception:
+        pass
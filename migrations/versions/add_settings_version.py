@@ -0,0 +1,33 @@
+"""Seed the settings version counter
+
+Revision ID: add_settings_version
+Revises: add_curriculum_digests
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_settings_version'
+down_revision = 'add_curriculum_digests'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    try:
+        op.execute(sa.text(
+            "INSERT INTO system_settings (key, value, description, setting_type) "
+            "VALUES ('settings_version', '1', 'Incremented on every settings change', 'integer')"
+        ))
+    except Exception:
+        pass
+
+
+def downgrade():
+    try:
+        op.execute(sa.text("DELETE FROM system_settings WHERE key = 'settings_version'"))
+    except Exception:
+        pass
@@ -89,6 +89,16 @@ def create_flask_app():
         print(f"❌ Flask app creation failed: {e}")
         raise
 
+def warm_llm_models(app):
+    """Load pinned Ollama models in the background so the first request is warm"""
+    if not app.config.get('OLLAMA_WARM_ON_STARTUP', True):
+        print("⏭️  Ollama model warm-up disabled")
+        return
+    
+    from app.services.ollama_client import ollama_client
+    print(f"🔥 Warming Ollama models: {', '.join(ollama_client.pinned_models)}")
+    ollama_client.warm_pinned()
+
 def start_server(app):
     """Start Waitress WSGI server with optimal configuration"""
     print("🌐 Starting Waitress WSGI server...")
@@ -100,7 +110,8 @@ def start_server(app):
         config = {
             'host': '0.0.0.0',
             'port': 5000,
-            'threads': 6,
+            # Request threads, plus one per open event stream (JOB_EVENTS_MAX_STREAMS)
+            'threads': 6 + app.config.get('JOB_EVENTS_MAX_STREAMS', 0),
             'connection_limit': 1000,
             'cleanup_interval': 30,
             'channel_timeout': 120,
@@ -157,7 +168,11 @@ def main():
         app = create_flask_app()
         print()
         
-        # Step 4: Start server
+        # Step 4: Warm pinned LLM models
+        warm_llm_models(app)
+        print()
+        
+        # Step 5: Start server
         start_server(app)
         
     except KeyboardInterrupt:
@@ -111,7 +111,7 @@ async function uploadDocument() {
             form.reset();
             
             // Start polling for status updates
-            pollDocumentStatus(data.document_id, data.filename);
+            watchDocumentStatus(data.document_id, data.filename);
             
             refreshDashboardStats();
         } else {
@@ -125,6 +125,72 @@ async function uploadDocument() {
     }
 }
 
+function describeProgress(progress) {
+    if (!progress || !progress.message) {
+        return '';
+    }
+    const eta = progress.eta_seconds ? `, about ${Math.ceil(progress.eta_seconds / 60)} min left` : '';
+    return `${progress.progress}% - ${progress.message}${eta}`;
+}
+
+function watchDocumentStatus(documentId, filename) {
+    // Status is pushed by the server; polling is the fallback when streams are unavailable
+    if (!window.EventSource) {
+        pollDocumentStatus(documentId, filename);
+        return;
+    }
+    
+    const statusTooltip = showPersistentNotification(
+        `Processing "${filename}"... This may take several minutes.`, 
+        'info',
+        true // persistent
+    );
+    const source = new EventSource(`/api/documents/${documentId}/events`);
+    let finished = false;
+    
+    const finish = (status, chunkCount, errorMessage) => {
+        finished = true;
+        source.close();
+        hidePersistentNotification(statusTooltip);
+        if (status === 'completed') {
+            showNotification(`"${filename}" processed successfully! Created ${chunkCount} text chunks.`, 'success');
+            refreshDashboardStats();
+        } else {
+            showNotification(`Processing failed for "${filename}": ${errorMessage || 'Unknown error'}`, 'error');
+        }
+    };
+    const update = (text) => {
+        if (text) {
+            updatePersistentNotification(statusTooltip, `Processing "${filename}"... ${text}`);
+        }
+    };
+    
+    source.addEventListener('snapshot', (event) => {
+        const data = JSON.parse(event.data);
+        if (data.processing_status === 'completed' || data.processing_status === 'failed') {
+            finish(data.processing_status, data.chunk_count, data.error_message);
+        } else {
+            update(describeProgress(data.progress) || `Status: ${data.processing_status}`);
+        }
+    });
+    source.addEventListener('progress', (event) => update(describeProgress(JSON.parse(event.data))));
+    source.addEventListener('status', (event) => {
+        const data = JSON.parse(event.data);
+        update(data.message || `Status: ${data.status}`);
+    });
+    source.addEventListener('document', (event) => {
+        const data = JSON.parse(event.data);
+        finish(data.status, data.chunks, data.error_message);
+    });
+    source.onerror = () => {
+        // EventSource reconnects by itself unless the server refused the stream
+        if (source.readyState === EventSource.CLOSED && !finished) {
+            hidePersistentNotification(statusTooltip);
+            pollDocumentStatus(documentId, filename);
+        }
+    };
+}
+
 async function pollDocumentStatus(documentId, filename) {
     const maxPolls = 60; // Poll for up to 60 times (30 minutes at 30-second intervals)
     let pollCount = 0;
@@ -162,9 +228,10 @@ async function pollDocumentStatus(documentId, filename) {
                     );
                 } else {
                     // Still processing - update the notification
+                    const detail = describeProgress(data.progress) || `Status: ${status}`;
                     updatePersistentNotification(
                         statusTooltip,
-                        `Processing "${filename}"... Status: ${status} (${data.extracted_text_length} characters extracted)`
+                        `Processing "${filename}"... ${detail}`
                     );
                 }
             } else {
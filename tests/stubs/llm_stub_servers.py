@@ -0,0 +1,159 @@
+"""
+Local stub servers for the LLM providers
+Ollama (/api/generate, /api/chat, /api/tags) and OpenAI-compatible
+(/v1/chat/completions, /v1/models, used by LM Studio and OpenAI) endpoints
+with configurable latency and failures, so routing can be tested offline.
+
+Run all three on their default ports:
+    python tests/stubs/llm_stub_servers.py
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLLMServer:
+    """One stub provider on a background thread
+
+    ``kind`` is 'ollama' or 'openai' (OpenAI-compatible, also LM Studio).
+    ``delay`` seconds are slept before every generation and ``fail=True``
+    answers generations with HTTP 500, as does ``fail_if(payload)`` returning
+    True for a single request. Ollama responses report
+    ``load_duration`` seconds of model loading. Streaming Ollama chat requests
+    get the reply in ``stream_chunk`` character pieces, ``stream_delay`` seconds
+    apart. All may be changed while running.
+    """
+
+    def __init__(self, kind: str = 'ollama', port: int = 0, delay: float = 0.0,
+                 fail: bool = False, reply: str = None, models=None, load_duration: float = 0.0):
+        self.kind = kind
+        self.delay = delay
+        self.fail = fail
+        self.load_duration = load_duration
+        self.fail_if = None
+        self.stream_chunk = 8
+        self.stream_delay = 0.0
+        self.reply = reply or f"reply from {kind} stub"
+        self.models = models or (['llama3.3:latest'] if kind == 'ollama' else ['local-model'])
+        self.requests = []
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream_chat(self, model, timings):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                pieces = [stub.reply[i:i + stub.stream_chunk]
+                          for i in range(0, len(stub.reply), stub.stream_chunk)]
+                messages = [{'model': model, 'done': False,
+                             'message': {'role': 'assistant', 'content': piece}} for piece in pieces]
+                messages.append(dict(timings, model=model, done=True,
+                                     message={'role': 'assistant', 'content': ''}))
+                for message in messages:
+                    line = (json.dumps(message) + '\n').encode('utf-8')
+                    self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                    self.wfile.flush()
+                    if stub.stream_delay:
+                        time.sleep(stub.stream_delay)
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_GET(self):
+                if stub.kind == 'ollama' and self.path == '/api/tags':
+                    self._send(200, {'models': [{'name': m, 'model': m} for m in stub.models]})
+                elif stub.kind == 'openai' and self.path == '/v1/models':
+                    self._send(200, {'object': 'list',
+                                     'data': [{'id': m, 'object': 'model'} for m in stub.models]})
+                else:
+                    self._send(404, {'error': 'not found'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                stub.requests.append((self.path, payload))
+
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if stub.fail or (stub.fail_if and stub.fail_if(payload)):
+                    self._send(500, {'error': f'{stub.kind} stub failure'})
+                    return
+
+                model = payload.get('model')
+                timings = {'prompt_eval_count': 10, 'eval_count': 5,
+                           'load_duration': int(stub.load_duration * 1e9),
+                           'total_duration': int((stub.delay + stub.load_duration) * 1e9)}
+                if stub.kind == 'ollama' and self.path == '/api/chat' and payload.get('stream'):
+                    self._stream_chat(model, timings)
+                elif stub.kind == 'ollama' and self.path == '/api/generate':
+                    self._send(200, dict(timings, model=model, response=stub.reply, done=True))
+                elif stub.kind == 'ollama' and self.path == '/api/chat':
+                    self._send(200, dict(timings, model=model, done=True,
+                                         message={'role': 'assistant', 'content': stub.reply}))
+                elif stub.kind == 'openai' and self.path == '/v1/chat/completions':
+                    self._send(200, {'id': 'stub', 'object': 'chat.completion', 'model': model,
+                                     'choices': [{'index': 0, 'finish_reason': 'stop',
+                                                  'message': {'role': 'assistant', 'content': stub.reply}}],
+                                     'usage': {'prompt_tokens': 10, 'completion_tokens': 5}})
+                else:
+                    self._send(404, {'error': 'not found'})
+
+        return Handler
+
+
+if __name__ == '__main__':
+    servers = [
+        StubLLMServer('ollama', port=11434).start(),
+        StubLLMServer('openai', port=1234, reply='reply from lm_studio stub').start(),
+        StubLLMServer('openai', port=8089, reply='reply from openai stub',
+                      models=['gpt-3.5-turbo']).start(),
+    ]
+    print("🧪 LLM stub servers running:")
+    print(f"   OLLAMA_BASE_URL={servers[0].url}")
+    print(f"   LM_STUDIO_BASE_URL={servers[1].url}")
+    print(f"   OPENAI_BASE_URL={servers[2].url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.stop()
@@ -0,0 +1,97 @@
+"""
+Unit tests for bounded chat history with incremental summarization
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from app import db
+from app.models import ChatSession, ChatMessage
+from app.services.chat_memory import ChatMemory
+from app.services.llm_service import LLMService
+
+
+@pytest.fixture
+def flask_app():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def _add_turns(session, count, start=0):
+    base = datetime(2026, 1, 1)
+    for i in range(start, start + count):
+        db.session.add(ChatMessage(session_id=session.id, role='user', content=f"question {i}",
+                                   created_at=base + timedelta(seconds=2 * i)))
+        db.session.add(ChatMessage(session_id=session.id, role='assistant', content=f"answer {i}",
+                                   created_at=base + timedelta(seconds=2 * i + 1)))
+    db.session.commit()
+
+
+def test_summary_folds_only_new_turns(flask_app):
+    calls = []
+
+    def summarizer(summary, transcript):
+        calls.append((summary, transcript))
+        return (summary + " | " if summary else "") + transcript.replace("\n", "; ")
+
+    memory = ChatMemory(recent_turns=2, summarizer=summarizer)
+    session = ChatSession(session_name="Biology")
+    db.session.add(session)
+    db.session.commit()
+
+    _add_turns(session, 2)
+    assert memory.update_summary(session.id) is False  # everything still fits the window
+
+    _add_turns(session, 2, start=2)
+    assert memory.update_summary(session.id) is True
+    assert session.summarized_message_count == 4
+    assert "question 0" in session.summary and "answer 1" in session.summary
+
+    _add_turns(session, 1, start=4)
+    memory.update_summary(session.id)
+    # The second update only sends the turn that just left the window
+    assert calls[1][0] == calls[0][1].replace("\n", "; ")
+    assert calls[1][1] == "Teacher: question 2\nAssistant: answer 2"
+    assert session.summarized_message_count == 6
+
+
+def test_history_stays_bounded(flask_app):
+    memory = ChatMemory(recent_turns=2, message_max_chars=50, summary_max_chars=100,
+                        summarizer=lambda summary, transcript: summary + transcript)
+    session = ChatSession(session_name="Long chat")
+    db.session.add(session)
+    db.session.commit()
+
+    sizes = []
+    for turn in range(30):
+        _add_turns(session, 1, start=turn)
+        memory.update_summary(session.id)
+        history = memory.build_history(session)
+        sizes.append(sum(len(m['content']) for m in history))
+
+    history = memory.build_history(session)
+    assert history[0]['role'] == 'system' and history[0]['content'].startswith("Summary of the earlier")
+    assert [m['content'] for m in history[1:]] == ["question 28", "answer 28", "question 29", "answer 29"]
+    assert len(session.summary) <= 100
+    assert max(sizes) <= 100 + len("Summary of the earlier conversation:\n") + 4 * 50
+
+
+def test_history_is_rendered_before_context(flask_app):
+    service = LLMService()
+    history = [{'role': 'system', 'content': 'Summary of the earlier conversation:\nPhotosynthesis'},
+               {'role': 'user', 'content': 'And respiration?'},
+               {'role': 'assistant', 'content': 'It releases energy.'}]
+
+    prompt = service._build_rag_prompt("Compare them", "chunk text", "You are a tutor.", history)
+    assert prompt.index("Human: And respiration?") < prompt.index("chunk text") < prompt.index("Human: Compare them")
+
+    messages = service._build_chat_messages("Compare them", "", "You are a tutor.", history)
+    assert [m['role'] for m in messages] == ['system', 'system', 'user', 'assistant', 'user']
+    assert ChatMemory.digest(history) != ChatMemory.digest(history[1:])
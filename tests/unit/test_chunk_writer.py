@@ -0,0 +1,86 @@
+"""
+Unit tests for bulk, batch-committed chunk persistence
+"""
+
+import csv
+import json
+import uuid
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+from app import db
+from app.models import Document, DocumentChunk
+from app.services.chunk_writer import ChunkWriter, copy_rows, COPY_COLUMNS
+
+
+@pytest.fixture
+def app(tmp_path):
+    # A file database so a second connection can see what was committed
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'chunks.db'}")
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def document(app):
+    document = Document(name='Biology', filename='biology.pdf', file_path='/tmp/biology.pdf',
+                        document_type='textbook', subject='Biology', class_level='Form 1')
+    db.session.add(document)
+    db.session.commit()
+    return document
+
+
+def committed_chunks():
+    with db.engine.connect() as connection:
+        return connection.execute(text("SELECT COUNT(*) FROM document_chunks")).scalar()
+
+
+def rows(start, stop):
+    return [(i, f"Chunk {i} about cells.", [float(i), 0.5]) for i in range(start, stop)]
+
+
+def test_batches_are_committed_as_they_fill(document):
+    service = ChunkWriter(batch_size=3)
+    writer = service.writer(document.id)
+
+    writer.write(rows(0, 2))
+    assert committed_chunks() == 0  # still buffered
+    writer.write(rows(2, 7))
+    assert committed_chunks() == 6  # two full batches are durable
+
+    stats = writer.close()
+    assert committed_chunks() == 7
+    assert stats['rows'] == 7 and stats['batches'] == 3 and stats['method'] == 'insert'
+    assert service.get_stats()['rows'] == 7
+
+    db.session.expire_all()
+    chunks = DocumentChunk.query.filter_by(document_id=document.id).order_by(DocumentChunk.chunk_index).all()
+    assert [c.chunk_index for c in chunks] == list(range(7))
+    assert chunks[4].content == "Chunk 4 about cells." and chunks[4].embedding == [4.0, 0.5]
+    assert all(c.id and c.created_at for c in chunks)
+
+
+def test_writes_keep_no_orm_objects_in_the_session(document):
+    writer = ChunkWriter(batch_size=50).writer(document.id)
+    writer.write(rows(0, 120))
+    writer.close()
+    assert not any(isinstance(obj, DocumentChunk) for obj in db.session.identity_map.values())
+
+
+def test_copy_rows_are_csv_for_copy_columns():
+    document_id = uuid.uuid4()
+    buffer = copy_rows(document_id, [(0, 'Says "hi",\nthen leaves', [0.1, 0.2]), (1, 'plain', None)])
+    parsed = list(csv.reader(buffer))
+
+    assert len(parsed) == 2 and all(len(row) == len(COPY_COLUMNS) for row in parsed)
+    record = dict(zip(COPY_COLUMNS, parsed[0]))
+    assert uuid.UUID(record['id']) and record['document_id'] == str(document_id)
+    assert record['content'] == 'Says "hi",\nthen leaves'
+    assert record['chunk_index'] == '0' and json.loads(record['embedding']) == [0.1, 0.2]
+    assert dict(zip(COPY_COLUMNS, parsed[1]))['embedding'] == ''  # NULL in COPY csv
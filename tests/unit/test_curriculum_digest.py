@@ -0,0 +1,180 @@
+"""
+Unit tests for the map-reduce curriculum objectives digest
+"""
+
+import json
+import re
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from app import db
+from app.models import CurriculumDigest, Document, DocumentChunk, SystemSettings
+from app.services.curriculum_digest import CurriculumDigester, curriculum_digest
+from app.services.lesson_context import estimate_tokens
+from app.services.lesson_service import LessonNoteService
+from tests.stubs.llm_stub_servers import StubLLMServer
+
+
+def add_document(doc_type, chunks, name=None):
+    name = name or doc_type
+    document = Document(name=name, filename=f"{name}.pdf", file_path=f"/tmp/{name}.pdf",
+                        document_type=doc_type, subject='Physics', class_level='Form 3',
+                        processing_status='completed')
+    db.session.add(document)
+    db.session.flush()
+    for i, content in enumerate(chunks):
+        db.session.add(DocumentChunk(document_id=document.id, content=content, chunk_index=i))
+    db.session.commit()
+    return document
+
+
+def long_curriculum(sections=6):
+    # Each chunk is ~700 tokens, far beyond what fits a lesson prompt in total
+    return [f"Module {i}: objective {i} " + "students measure and explain forces. " * 55
+            for i in range(sections)]
+
+
+class RecordingSummarizer:
+    """Summarizer that records calls and how many ran at once"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, instruction, text):
+        with self._lock:
+            self.calls.append((instruction, text))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if instruction.startswith('You merge'):
+            return "DIGEST: " + " | ".join(line.strip() for line in text.split('\n\n'))
+        return "\n".join(f"- {module} objectives" for module in re.findall(r"Module \d+", text))
+
+
+@pytest.fixture
+def stub():
+    with StubLLMServer('ollama', reply="- Measure forces\n- Explain motion") as server:
+        yield server
+
+
+@pytest.fixture
+def app(stub):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(SystemSettings(key='llm_base_url', value=stub.url))
+        db.session.commit()
+        yield app
+        db.session.remove()
+
+
+def test_sections_are_summarized_in_parallel_and_merged(app):
+    add_document('curriculum', long_curriculum())
+    summarizer = RecordingSummarizer()
+    digester = CurriculumDigester(section_tokens=1500, parallel=3, summarizer=summarizer)
+
+    digest = digester.get('Physics', 'Form 3')
+
+    map_calls = [c for c in summarizer.calls if c[0].startswith('You summarize')]
+    reduce_calls = [c for c in summarizer.calls if c[0].startswith('You merge')]
+    assert len(map_calls) == 3  # two ~700-token chunks per 1500-token section
+    assert all(estimate_tokens(text) <= 1500 for _, text in map_calls)
+    assert summarizer.max_active > 1
+    assert len(reduce_calls) == 1
+    assert digest.startswith("DIGEST: - Module 0 objectives")
+    assert "Module 4 objectives" in digest
+
+    entry = CurriculumDigest.query.filter_by(subject='Physics', class_level='Form 3').one()
+    assert entry.digest == digest
+    assert entry.section_count == 3
+
+
+def test_digest_is_cached_until_a_curriculum_document_changes(app):
+    curriculum = add_document('curriculum', long_curriculum(2))
+    summarizer = RecordingSummarizer(delay=0)
+    digester = CurriculumDigester(summarizer=summarizer)
+
+    first = digester.get('Physics', 'Form 3')
+    calls = len(summarizer.calls)
+    assert digester.get('Physics', 'Form 3') == first
+    assert len(summarizer.calls) == calls
+    assert digester.get_stats()['hits'] == 1
+
+    # Textbooks do not affect the digest
+    add_document('textbook', ["Forces are pushes or pulls."])
+    digester.get('Physics', 'Form 3')
+    assert len(summarizer.calls) == calls
+
+    # A new or reprocessed curriculum document does
+    add_document('curriculum', ["Module 9: objective 9 energy transfers."], name='annex')
+    second = digester.get('Physics', 'Form 3')
+    assert len(summarizer.calls) > calls
+    assert "Module 9" in second
+
+    calls = len(summarizer.calls)
+    curriculum.processing_status = 'processing'
+    db.session.commit()
+    digester.get('Physics', 'Form 3')
+    assert len(summarizer.calls) > calls
+
+    assert digester.invalidate('Physics', 'Form 3') == 1
+    assert CurriculumDigest.query.count() == 0
+
+
+def test_no_curriculum_or_failed_summary_gives_no_digest(app):
+    digester = CurriculumDigester(summarizer=lambda instruction, text: "")
+    assert digester.get('Physics', 'Form 3') is None
+
+    add_document('curriculum', long_curriculum(1))
+    assert digester.get('Physics', 'Form 3') is None
+    assert digester.get_stats()['failures'] == 1
+    assert CurriculumDigest.query.count() == 0
+
+
+def test_lesson_prompt_uses_the_digest_instead_of_raw_curriculum(app, stub):
+    add_document('curriculum', long_curriculum(3))
+    add_document('textbook', ["Newton's laws describe forces and motion."])
+    stub.reply = "- Explain Newton's laws"
+
+    # Default summarizer: the digest calls go to the configured Ollama
+    service = LessonNoteService()
+    payload, context, _ = service._lesson_note_request(
+        'Physics', 'Form 3', {'lesson': "Newton's laws"}, [], [])
+    summaries = len(stub.requests)
+    assert summaries >= 2  # map and reduce
+
+    user_content = payload['messages'][1]['content']
+    assert "curriculum: - Explain Newton's laws" in user_content
+    assert "students measure and explain forces" not in user_content
+    assert user_content.index('curriculum:') < user_content.index('textbook:')
+    assert context['curriculum_digest'] is True
+    assert "Newton's laws describe forces" in context['textbook']
+
+    # The next lesson reuses the stored digest
+    payload, _, _ = service._lesson_note_request('Physics', 'Form 3', {'lesson': 'Friction'}, [], [])
+    assert len(stub.requests) == summaries
+    assert curriculum_digest.get_stats()['hits'] >= 1
+
+
+def test_disabled_digest_keeps_retrieved_curriculum_chunks(app, stub, monkeypatch):
+    add_document('curriculum', ["Module 1: Newton's laws objectives for the term."])
+    monkeypatch.setattr(curriculum_digest, 'enabled', False)
+
+    payload, context, _ = LessonNoteService()._lesson_note_request(
+        'Physics', 'Form 3', {'lesson': "Newton's laws"}, [], [])
+
+    assert stub.requests == []
+    assert context['curriculum_digest'] is False
+    assert "Module 1: Newton's laws objectives" in payload['messages'][1]['content']
+    assert json.loads(json.dumps(context))  # stats stay serializable
@@ -0,0 +1,79 @@
+"""
+Unit tests for content-hash deduplication of uploads
+"""
+
+import hashlib
+import io
+import os
+
+import pytest
+from flask import Flask
+from werkzeug.datastructures import FileStorage
+
+from app import db
+from app.models import Document, DocumentChunk
+from app.services.chunk_writer import ChunkWriter
+from app.services.large_file_service import LargeFileUploadService
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def make_document(name, content_hash=None):
+    document = Document(name=name, filename=f"{name}.pdf", file_path=f"/tmp/{name}.pdf",
+                        document_type='textbook', subject='Biology', class_level='Form 1',
+                        content_hash=content_hash)
+    db.session.add(document)
+    db.session.commit()
+    return document
+
+
+def test_saved_upload_is_hashed_and_sized_in_one_pass(tmp_path):
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    upload = FileStorage(stream=io.BytesIO(data), filename='big book.pdf', content_type='application/pdf')
+
+    file_info, error = LargeFileUploadService().save_file(upload, str(tmp_path))
+
+    assert error is None
+    assert file_info['file_hash'] == hashlib.sha256(data).hexdigest()
+    assert file_info['file_size'] == len(data) == os.path.getsize(file_info['file_path'])
+    assert file_info['original_name'] == 'big_book.pdf' and file_info['mime_type'] == 'application/pdf'
+
+
+def test_identical_uploads_hash_alike(tmp_path):
+    service = LargeFileUploadService()
+    hashes = {service.save_file(FileStorage(stream=io.BytesIO(body), filename=name), str(tmp_path))[0]['file_hash']
+              for body, name in [(b'same bytes', 'a.pdf'), (b'same bytes', 'b.pdf'), (b'other bytes', 'a.pdf')]}
+    assert len(hashes) == 2
+
+
+def test_copy_document_clones_chunks_and_embeddings(app):
+    source = make_document('source', content_hash='abc')
+    clone = make_document('clone', content_hash='abc')
+    writer = ChunkWriter(batch_size=4).writer(source.id)
+    writer.write([(i, f"Chunk {i} about cells.", [float(i), 0.5]) for i in range(10)])
+    writer.close()
+
+    stats = ChunkWriter(batch_size=4).copy_document(source.id, clone.id)
+
+    assert stats['rows'] == 10 and stats['batches'] == 3
+    copied = (DocumentChunk.query.filter_by(document_id=clone.id)
+              .order_by(DocumentChunk.chunk_index).all())
+    assert [(c.chunk_index, c.content, c.embedding) for c in copied] == [
+        (i, f"Chunk {i} about cells.", [float(i), 0.5]) for i in range(10)]
+    assert DocumentChunk.query.filter_by(document_id=source.id).count() == 10
+
+
+def test_copy_of_a_document_without_chunks_writes_nothing(app):
+    source = make_document('empty')
+    clone = make_document('clone')
+    assert ChunkWriter().copy_document(source.id, clone.id)['rows'] == 0
+    assert DocumentChunk.query.count() == 0
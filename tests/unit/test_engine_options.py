@@ -0,0 +1,33 @@
+"""
+Unit tests for per-process database pool sizing
+"""
+
+from flask import Flask
+
+from app import engine_options
+
+
+def make_app(uri, **config):
+    app = Flask(__name__)
+    settings = dict(SQLALCHEMY_DATABASE_URI=uri, DB_POOL_SIZE=0, DB_MAX_OVERFLOW=5,
+                    DB_POOL_RECYCLE=1800, JOB_WORKERS_EMBEDDED=0)
+    app.config.update(settings, **config)
+    return app
+
+
+def test_pool_is_sized_to_the_threads_using_it():
+    worker = engine_options(make_app('postgresql://u:p@db/ocr'), threads=4)
+    assert worker == {'pool_size': 7, 'max_overflow': 5, 'pool_recycle': 1800, 'pool_pre_ping': True}
+
+    # Web process: request threads plus embedded job workers
+    web = engine_options(make_app('postgresql://u:p@db/ocr', JOB_WORKERS_EMBEDDED=2))
+    assert web['pool_size'] == 6 + 2 + 3
+
+
+def test_explicit_settings_win_and_sqlite_is_untouched():
+    app = make_app('postgresql://u:p@db/ocr', DB_POOL_SIZE=20,
+                   SQLALCHEMY_ENGINE_OPTIONS={'max_overflow': 0})
+    options = engine_options(app, threads=2)
+    assert options['pool_size'] == 20 and options['max_overflow'] == 0
+
+    assert engine_options(make_app('sqlite:///ocr_agent.db'), threads=8) == {}
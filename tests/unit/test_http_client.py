@@ -0,0 +1,138 @@
+"""
+Unit tests for the pooled outbound HTTP client
+"""
+
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from app.services.http_client import OutboundHTTPClient
+
+
+class DroppingServer:
+    """Accepts connections and closes them without answering, counting each one"""
+
+    def __init__(self):
+        self.connections = 0
+        self._socket = socket.socket()
+        self._socket.bind(('127.0.0.1', 0))
+        self._socket.listen(16)
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        host, port = self._socket.getsockname()
+        return f"http://{host}:{port}"
+
+    def _serve(self):
+        while True:
+            try:
+                connection, _ = self._socket.accept()
+            except OSError:
+                return
+            self.connections += 1
+            connection.recv(65536)
+            connection.close()
+
+    def stop(self):
+        self._socket.close()
+
+
+class KeepAliveServer:
+    """Answers every request with JSON over HTTP/1.1 keep-alive; ``fail=True`` answers 500"""
+
+    def __init__(self):
+        self.fail = False
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _answer(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                data = json.dumps({'path': self.path}).encode('utf-8')
+                self.send_response(500 if server.fail else 200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = _answer
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def dropping():
+    server = DroppingServer()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def stub():
+    server = KeepAliveServer()
+    yield server
+    server.stop()
+
+
+def test_connection_errors_are_retried_for_idempotent_methods_only(dropping):
+    client = OutboundHTTPClient(retries=2, backoff_factor=0)
+
+    with pytest.raises(requests.exceptions.RequestException):
+        client.get(f"{dropping.url}/api/tags")
+    assert dropping.connections == 3  # first try and two retries
+
+    dropping.connections = 0
+    with pytest.raises(requests.exceptions.RequestException):
+        client.post(f"{dropping.url}/api/generate", json={'prompt': 'hi'})
+    assert dropping.connections == 1  # a generation is never replayed
+
+
+def test_pooled_connection_is_reused(stub):
+    client = OutboundHTTPClient()
+    session = client.session
+    for _ in range(5):
+        assert client.get(f"{stub.url}/api/tags").status_code == 200
+    client.post(f"{stub.url}/api/generate", json={'model': 'llama3.3:latest', 'prompt': 'hi'})
+
+    assert client.session is session
+    pool = client.get_stats()['pools'][stub.url.split('//', 1)[1]]
+    assert pool['connections_opened'] == 1
+    assert pool['requests_sent'] == 6 and pool['connections_reused'] == 5
+
+
+def test_stats_count_requests_and_errors_per_host(stub, dropping):
+    client = OutboundHTTPClient(retries=0)
+    client.get(f"{stub.url}/api/tags")
+    client.post(f"{stub.url}/api/generate", json={'prompt': 'hi'})
+    stub.fail = True
+    assert client.post(f"{stub.url}/api/generate", json={'prompt': 'hi'}).status_code == 500
+    with pytest.raises(requests.exceptions.RequestException):
+        client.get(dropping.url)
+
+    hosts = client.get_stats()['hosts']
+    stub_host = hosts[stub.url.split('//', 1)[1]]
+    assert stub_host['requests'] == 3 and stub_host['errors'] == 1
+    assert sum(stub_host['latency_histogram'].values()) == 3
+    dropped_host = hosts[dropping.url.split('//', 1)[1]]
+    assert dropped_host['requests'] == 1 and dropped_host['errors'] == 1
@@ -0,0 +1,173 @@
+"""
+Unit tests for the streaming OCR → chunk → embed → write pipeline
+"""
+
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from app.services.embedding_service import EmbeddingService
+from app.services.ingestion_pipeline import IngestionPipeline
+
+
+class FakeOCR:
+    """Yields pages with a fixed OCR time per page"""
+
+    def __init__(self, pages, delay=0.0, fail_after=None):
+        self.pages = pages
+        self.delay = delay
+        self.fail_after = fail_after
+        self.produced = 0
+
+    def iter_pages(self, file_path):
+        for i, page in enumerate(self.pages):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise Exception("scanner on fire")
+            time.sleep(self.delay)
+            self.produced += 1
+            yield page
+
+    def page_count(self, file_path):
+        return len(self.pages)
+
+
+class FakeEmbedder(EmbeddingService):
+    """The real chunker with a slow, deterministic embedding model"""
+
+    def __init__(self, delay=0.0):
+        self.model = None
+        self._use_fallback_embedding = True
+        self.delay = delay
+        self.batches = []
+
+    def get_embeddings_batch(self, texts):
+        time.sleep(self.delay)
+        self.batches.append(len(texts))
+        return [[float(len(text))] for text in texts]
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(CHUNK_SIZE=120, CHUNK_OVERLAP=10)
+    with app.app_context():
+        yield app
+
+
+def page(n):
+    return f"\n--- Page {n} ---\n" + " ".join(f"Sentence {n}.{i} about photosynthesis." for i in range(8)) + "\n"
+
+
+def fallback(error=None):
+    return "Document: fallback" + (f"\nOCR Error: {error}" if error else "")
+
+
+def test_chunks_match_whole_document_chunking(app):
+    pages = [page(n) for n in range(1, 7)]
+    embedder = FakeEmbedder()
+    written = []
+
+    result = IngestionPipeline(queue_size=2, embed_batch=4).run(
+        'doc.pdf', FakeOCR(pages), embedder, write=written.extend, fallback_text=fallback)
+
+    expected = embedder.create_chunks("".join(pages).strip())
+    assert [content for _, content, _ in written] == expected
+    assert [index for index, _, _ in written] == list(range(len(expected)))
+    assert written[0][2] == [float(len(expected[0]))]
+    assert result['text'] == "".join(pages).strip()
+    assert result['pages'] == 6 and result['chunks'] == result['chunks_total'] == len(expected)
+    assert max(embedder.batches) <= 4
+
+
+def test_stages_overlap(app):
+    # 8 pages: OCR 0.05s each, embedding 0.05s per batch of one page's chunks
+    pages = [page(n) for n in range(1, 9)]
+    embedder = FakeEmbedder(delay=0.05)
+
+    started = time.time()
+    result = IngestionPipeline(queue_size=2, embed_batch=2).run(
+        'doc.pdf', FakeOCR(pages, delay=0.05), embedder, write=lambda batch: time.sleep(0.01),
+        fallback_text=fallback)
+    elapsed = time.time() - started
+
+    stages = result['stage_seconds']
+    # Stages ran at the same time: well under the sum of their busy times
+    assert elapsed < 0.85 * (stages['ocr'] + stages['embed'] + stages['write'])
+
+
+def test_slow_writer_holds_back_ocr(app):
+    pages = [page(n) for n in range(1, 41)]
+    ocr = FakeOCR(pages)
+    release = threading.Event()
+
+    def write(batch):
+        release.wait(5)
+
+    def ingest():
+        with app.app_context():
+            IngestionPipeline(queue_size=1, embed_batch=2).run(
+                'doc.pdf', ocr, FakeEmbedder(), write=write, fallback_text=fallback)
+
+    runner = threading.Thread(target=ingest)
+    runner.start()
+    time.sleep(0.3)
+    # The first write is blocked: bounded queues stop OCR well short of the end
+    assert ocr.produced < 15
+    release.set()
+    runner.join(10)
+    assert ocr.produced == 40
+
+
+def test_minimal_or_failed_ocr_uses_fallback_text(app):
+    written = []
+    result = IngestionPipeline().run('scan.png', FakeOCR([" ", "."]), FakeEmbedder(),
+                                     write=written.extend, fallback_text=fallback)
+    assert result['text'] == "Document: fallback"
+    assert [content for _, content, _ in written] == ["Document: fallback"]
+
+    result = IngestionPipeline().run('scan.png', FakeOCR([page(1)], fail_after=0), FakeEmbedder(),
+                                     write=lambda batch: None, fallback_text=fallback)
+    assert result['text'] == "Document: fallback\nOCR Error: scanner on fire"
+
+
+def test_ocr_error_after_pages_fails_the_document(app):
+    pipeline = IngestionPipeline(queue_size=2, embed_batch=2)
+    written = []
+
+    with pytest.raises(Exception, match="scanner on fire"):
+        pipeline.run('doc.pdf', FakeOCR([page(n) for n in range(1, 7)], fail_after=3), FakeEmbedder(),
+                     write=written.extend, fallback_text=fallback)
+    # Never a fallback, and never a truncated document passed off as complete
+    assert not any('fallback' in content for _, content, _ in written)
+    assert pipeline.get_stats()['failures'] == 1
+
+
+def test_writer_error_stops_the_pipeline(app):
+    pipeline = IngestionPipeline(queue_size=1, embed_batch=1)
+    ocr = FakeOCR([page(n) for n in range(1, 41)])
+
+    def write(batch):
+        raise RuntimeError("disk full")
+
+    with pytest.raises(RuntimeError, match="disk full"):
+        pipeline.run('doc.pdf', ocr, FakeEmbedder(), write=write, fallback_text=fallback)
+    assert ocr.produced < 40
+    assert pipeline.get_stats()['failures'] == 1
+
+
+def test_progress_snapshots_track_the_slowest_stage(app):
+    pages = [page(n) for n in range(1, 11)]
+    snapshots = []
+
+    result = IngestionPipeline(queue_size=1, embed_batch=2).run(
+        'doc.pdf', FakeOCR(pages, delay=0.02), FakeEmbedder(delay=0.01), write=lambda batch: time.sleep(0.01),
+        fallback_text=fallback, progress=snapshots.append)
+
+    fractions = [snapshot['fraction'] for snapshot in snapshots]
+    assert snapshots[0]['stage'] == 'ocr' and snapshots[0]['pages_total'] == 10
+    assert 0 < max(fractions) <= 1.0
+    assert all(s['fraction'] <= s['pages'] / 10 for s in snapshots if s['stage'] == 'ocr')
+    final = result['progress']
+    assert final['fraction'] == 1.0 and final['written'] == final['chunks'] == final['chunks_expected']
@@ -0,0 +1,151 @@
+"""
+Unit tests for job events and their Server-Sent Event streams
+"""
+
+import json
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from app import db
+from app.services.job_events import JobEventBus
+from app.services.job_queue import JobQueue
+from app.services import job_queue as job_queue_module
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def parse(chunks):
+    """SSE text to (id, event, data) tuples, skipping comments and retry hints"""
+    events = []
+    for chunk in chunks:
+        fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n') if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['id'], fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_stream_sends_snapshot_then_matching_events_until_done(app):
+    bus = JobEventBus(heartbeat=0.05, stream_seconds=5)
+    assert bus.open_stream()
+    stream = bus.stream(lambda: {'processing_status': 'processing'},
+                        matches=lambda event: event.get('document_id') == 'doc-1',
+                        until=lambda event: event['type'] == 'document')
+
+    assert next(stream).startswith('retry:')
+    chunks = [next(stream)]
+    bus.publish('progress', document_id='doc-2', progress=10)
+    bus.publish('progress', document_id='doc-1', progress=40, message='OCR 4/10 pages')
+    bus.publish('document', document_id='doc-1', status='completed', chunks=12)
+    chunks.extend(stream)  # ends after the document event
+
+    events = parse(chunks)
+    assert [(kind, data.get('progress')) for _, kind, data in events] == [
+        ('snapshot', None), ('progress', 40), ('document', None)]
+    assert events[0][2]['processing_status'] == 'processing'
+    assert events[2][2]['chunks'] == 12
+
+
+def test_reconnect_replays_missed_events_from_last_event_id(app):
+    bus = JobEventBus(heartbeat=0.05, stream_seconds=0.2)
+    bus.publish('status', job_id='j', status='running')
+    last_seen = f"{bus.epoch}:{bus.position()}"
+    bus.publish('progress', job_id='j', progress=50)
+    bus.publish('status', job_id='j', status='completed')
+
+    bus.open_stream()
+    events = parse(bus.stream(lambda: {'jobs': []}, matches=lambda event: True, last_event_id=last_seen))
+    assert [kind for _, kind, _ in events] == ['progress', 'status']
+    assert events[-1][0] == f"{bus.epoch}:3"
+
+    # An id from another process (or too old) gets a fresh snapshot instead
+    bus.open_stream()
+    events = parse(bus.stream(lambda: {'jobs': []}, matches=lambda event: True, last_event_id='other:2'))
+    assert [kind for _, kind, _ in events] == ['snapshot']
+
+
+def test_idle_streams_send_heartbeats_and_end(app):
+    bus = JobEventBus(heartbeat=0.05, stream_seconds=0.3)
+    bus.open_stream()
+    started = time.time()
+    chunks = list(bus.stream(lambda: {}, matches=lambda event: True))
+    assert time.time() - started < 2
+    assert sum(chunk.startswith(': heartbeat') for chunk in chunks) >= 3
+
+
+def test_waiting_stream_wakes_on_publish(app):
+    bus = JobEventBus(heartbeat=10, stream_seconds=10)
+    bus.open_stream()
+    stream = bus.stream(lambda: {}, matches=lambda event: True, until=lambda event: True)
+    next(stream), next(stream)  # retry hint, snapshot
+    threading.Timer(0.1, lambda: bus.deliver({'type': 'status', 'status': 'running'})).start()
+
+    started = time.time()
+    assert 'running' in next(stream)
+    assert time.time() - started < 2
+
+
+def test_stream_slots_are_limited(app):
+    bus = JobEventBus(max_streams=2)
+    assert bus.open_stream() and bus.open_stream()
+    assert not bus.open_stream()
+    bus.close_stream()
+    assert bus.open_stream()
+    assert bus.get_stats()['rejected_streams'] == 1
+
+
+def test_stream_slot_is_released_when_the_response_closes(app):
+    bus = JobEventBus(heartbeat=0.05, stream_seconds=0.2, max_streams=1)
+
+    @app.route('/events', methods=['GET'])
+    def events():
+        response = bus.response(lambda: {'jobs': []}, matches=lambda event: True)
+        return response if response is not None else ('', 503)
+
+    client = app.test_client()
+    for _ in range(3):
+        # The server closes HEAD responses without ever starting the stream
+        with client.head('/events') as response:
+            assert response.status_code == 200
+        assert bus.get_stats()['streams'] == 0
+
+    response = client.get('/events', buffered=False)
+    assert client.get('/events').status_code == 503
+    next(response.response)  # a client that leaves after the first event
+    response.close()
+    assert bus.get_stats()['streams'] == 0
+
+    with client.get('/events') as response:
+        assert 'snapshot' in response.get_data(as_text=True)
+    assert bus.get_stats()['streams'] == 0 and bus.get_stats()['rejected_streams'] == 1
+
+
+def test_job_lifecycle_is_published(app, monkeypatch):
+    bus = JobEventBus()
+    received = []
+    bus.add_handler(received.append)
+    monkeypatch.setattr(job_queue_module, 'job_events', bus)
+
+    queue = JobQueue(retry_backoff=10)
+    queue.register('ocr', lambda job: {'chunks': 3})
+    queue.register('sync', lambda job: 1 / 0)
+    done = queue.enqueue('ocr', {})
+    queue.run(queue.claim('w', ['ocr']))
+    broken = queue.enqueue('sync', {})
+    queue.run(queue.claim('w', ['sync']))
+
+    statuses = [(event['job_id'], event['status']) for event in received]
+    assert statuses == [(str(done.id), 'pending'), (str(done.id), 'running'), (str(done.id), 'completed'),
+                        (str(broken.id), 'pending'), (str(broken.id), 'running'), (str(broken.id), 'retrying')]
+    assert received[-1]['retry_in'] == 10 and 'division by zero' in received[-1]['error_message']
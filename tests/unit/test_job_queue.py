@@ -0,0 +1,157 @@
+"""
+Unit tests for the durable job queue and worker pool
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from app import db
+from app.models import ProcessingJob
+from app.services.job_queue import JobQueue, WorkerPool
+from app.services.progress_tracker import JobProgress
+
+
+@pytest.fixture
+def app(tmp_path):
+    # A file database: worker threads use their own connections
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'jobs.db'}")
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def test_jobs_are_claimed_by_priority_and_survive_a_restart(app):
+    queue = JobQueue()
+    queue.register('ocr', lambda job: None)
+    low = queue.enqueue('ocr', {'n': 1})
+    high = queue.enqueue('ocr', {'n': 2}, priority=5)
+    queue.enqueue('sync', {'n': 3})  # no handler: never claimed
+
+    # A new process (queue instance) sees the same jobs
+    restarted = JobQueue()
+    restarted.register('ocr', lambda job: None)
+    first = restarted.claim('worker-a')
+    second = restarted.claim('worker-b')
+
+    assert (first.id, second.id) == (high.id, low.id)
+    assert first.status == 'running' and first.locked_by == 'worker-a' and first.attempts == 1
+    assert restarted.claim('worker-a') is None
+
+
+def test_failures_retry_with_backoff_then_fail(app):
+    failures = []
+    queue = JobQueue(max_attempts=3, retry_backoff=10)
+    queue.register('ocr', lambda job: 1 / 0, on_failure=lambda job, error: failures.append(error))
+    job = queue.enqueue('ocr', {})
+
+    queue.run(queue.claim('w'))
+    db.session.refresh(job)
+    assert job.status == 'pending' and job.attempts == 1
+    assert 'division by zero' in job.error_message
+    assert job.run_after > datetime.utcnow() + timedelta(seconds=8)
+    assert queue.claim('w') is None  # still backing off
+
+    job.run_after = datetime.utcnow()
+    db.session.commit()
+    queue.run(queue.claim('w'))
+    db.session.refresh(job)
+    assert job.run_after > datetime.utcnow() + timedelta(seconds=18)  # doubled
+
+    job.run_after = datetime.utcnow()
+    db.session.commit()
+    queue.run(queue.claim('w'))
+    db.session.refresh(job)
+    assert job.status == 'failed' and job.attempts == 3
+    assert len(failures) == 1
+    assert queue.get_stats()['retried'] == 2
+
+
+def test_handler_result_completes_the_job(app):
+    queue = JobQueue()
+    queue.register('ocr', lambda job: {'chunks': job.payload['pages'] * 2})
+    job = queue.enqueue('ocr', {'pages': 4})
+
+    queue.run(queue.claim('w'))
+    db.session.refresh(job)
+    assert job.status == 'completed' and job.result_data == {'chunks': 8}
+    assert job.locked_by is None and job.progress == 100
+
+
+def test_depth_counts_only_the_queue_job_types(app):
+    queue = JobQueue()
+    queue.register('ocr', lambda job: None)
+    queue.enqueue('ocr', {'pages': 1})
+    queue.enqueue('ocr')
+    queue.run(queue.claim('w'))
+    queue.enqueue('sync', {'n': 1})  # another queue's job type
+    db.session.add(ProcessingJob(job_type='ocr', status='failed'))  # written without a payload
+    db.session.commit()
+
+    assert queue.depth() == {'pending': 1, 'completed': 1, 'failed': 1}
+
+
+def test_pool_respects_concurrency_and_claims_each_job_once(app):
+    queue = JobQueue()
+    lock = threading.Lock()
+    state = {'active': 0, 'max': 0, 'runs': []}
+
+    def handler(job):
+        with lock:
+            state['active'] += 1
+            state['max'] = max(state['max'], state['active'])
+            state['runs'].append(job.payload['n'])
+        time.sleep(0.05)
+        with lock:
+            state['active'] -= 1
+
+    queue.register('ocr', handler)
+    for n in range(12):
+        queue.enqueue('ocr', {'n': n})
+
+    pool = WorkerPool(app, queue, concurrency=3, poll_interval=0.01).start()
+    deadline = time.time() + 10
+    while len(state['runs']) < 12 and time.time() < deadline:
+        time.sleep(0.05)
+    pool.stop(timeout=5)
+
+    assert sorted(state['runs']) == list(range(12))
+    assert 1 < state['max'] <= 3
+    assert ProcessingJob.query.filter_by(status='completed').count() == 12
+
+
+def test_jobs_of_dead_workers_are_requeued(app):
+    queue = JobQueue(lock_timeout=60)
+    queue.register('ocr', lambda job: None)
+    job = queue.enqueue('ocr', {})
+    claimed = queue.claim('dead-worker')
+    claimed.locked_at = datetime.utcnow() - timedelta(seconds=120)
+    db.session.commit()
+
+    assert queue.recover_stale() == 1
+    again = queue.claim('live-worker')
+    assert again.id == job.id and again.attempts == 2
+
+
+def test_jobs_reporting_progress_are_not_requeued(app):
+    queue = JobQueue(lock_timeout=60)
+    queue.register('ocr', lambda job: None)
+    job = queue.enqueue('ocr', {})
+    claimed = queue.claim('busy-worker')
+    # Claimed well past the lock timeout, but still reporting progress
+    claimed.locked_at = datetime.utcnow() - timedelta(seconds=600)
+    db.session.commit()
+
+    JobProgress(job.id, interval=0).update(40, stage='ocr', message='OCR 40/100 pages')
+    assert queue.recover_stale() == 0
+
+    db.session.expire_all()
+    job = ProcessingJob.query.get(job.id)
+    assert job.status == 'running' and job.locked_by == 'busy-worker'
+    assert job.locked_at > datetime.utcnow() - timedelta(seconds=60)
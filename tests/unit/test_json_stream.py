@@ -0,0 +1,94 @@
+"""
+Unit tests for the tolerant incremental JSON parser and streamed lesson notes
+"""
+
+import json
+
+import pytest
+from flask import Flask
+
+from app import db
+from app.models import SystemSettings
+from app.services.json_stream import JSONStreamParser, loads_lenient
+from app.services.lesson_service import LessonNoteService
+from tests.stubs.llm_stub_servers import StubLLMServer
+
+NOTE = {'subject': 'Biology', 'lessonTitle': 'Cells: the basics', 'mainBody': 'Line one\nLine "two"', 'mcqs': 5}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Sure! Here it is:\n```json\n' + json.dumps(NOTE) + '\n```\nEnjoy.', NOTE),
+    ('{"lessonTitle": "Cells", "mainBody": "First line\nsecond line",}', {'lessonTitle': 'Cells', 'mainBody': 'First line\nsecond line'}),
+    ('[{"lesson": "Lesson 1: A"}, {"lesson": "Lesson 2: B"}, {"lesson": "Less', [{'lesson': 'Lesson 1: A'}, {'lesson': 'Lesson 2: B'}, {'lesson': 'Less'}]),
+    ('See [1] below. [{"lesson": "Lesson 1: A"}]', [{'lesson': 'Lesson 1: A'}]),
+    ('{"done": True, "missing": None, "body": "True story"', {'done': True, 'missing': None, 'body': 'True story'}),
+    ('{"a": {"b": [1, 2,', {'a': {'b': [1, 2]}}),
+])
+def test_loads_lenient_repairs_common_malformations(text, expected):
+    assert loads_lenient(text) == expected
+
+
+def test_loads_lenient_rejects_text_without_json():
+    with pytest.raises(ValueError):
+        loads_lenient('I cannot help with that.')
+
+
+@pytest.mark.parametrize('chunk', [1, 3, 17, 1000])
+def test_stream_events_independent_of_chunking(chunk):
+    text = 'Here you go: ' + json.dumps(NOTE) + ' Hope this helps!'
+    parser = JSONStreamParser()
+    events = []
+    for i in range(0, len(text), chunk):
+        events += parser.feed(text[i:i + chunk])
+
+    fields = [(name, value) for kind, name, value in events if kind == 'field']
+    assert fields == list(NOTE.items())
+    partials = [value for kind, name, value in events if kind == 'partial' and name == 'mainBody']
+    if chunk < len(text):
+        assert partials and NOTE['mainBody'].startswith(partials[0])
+    assert parser.done
+    assert parser.close() == NOTE
+
+
+def test_multi_line_scalar_fields_are_reported():
+    # LLMs often put raw newlines in long string values
+    text = '{"lessonTitle": "Cells", "mainBody": "Introduction\n\tCells have parts\nConclusion", "mcqs": 5}'
+    parser = JSONStreamParser()
+    events = []
+    for i in range(0, len(text), 7):
+        events += parser.feed(text[i:i + 7])
+
+    fields = dict((name, value) for kind, name, value in events if kind == 'field')
+    assert fields == {'lessonTitle': 'Cells', 'mainBody': 'Introduction\n\tCells have parts\nConclusion', 'mcqs': 5}
+    assert loads_lenient('"Line one\nLine two"') == 'Line one\nLine two'
+
+
+def test_array_items_surface_as_they_complete():
+    parser = JSONStreamParser()
+    assert parser.feed('[{"lesson": "Lesson 1: A"}, {"lesson": "Les') == [('item', 0, {'lesson': 'Lesson 1: A'})]
+    assert parser.feed('son 2: B"}]') == [('item', 1, {'lesson': 'Lesson 2: B'})]
+
+
+def test_streamed_lesson_note_reports_fields_before_completion():
+    reply = 'Here is the lesson note:\n' + json.dumps(NOTE)
+    with StubLLMServer('ollama', reply=reply) as stub:
+        stub.stream_chunk = 6
+        app = Flask(__name__)
+        app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            db.session.add(SystemSettings(key='llm_base_url', value=stub.url))
+            db.session.commit()
+
+            events = list(LessonNoteService().stream_lesson_note(
+                'Biology', 'Form 1', {'lesson': 'Lesson 1: Cells'}, [{'content': 'Cells are small.'}], []))
+            db.session.remove()
+
+    assert stub.requests[0][1]['stream'] is True
+    kinds = [event['type'] for event in events]
+    assert kinds[0] == 'started' and kinds[-1] == 'done'
+    assert kinds.index('partial') < kinds.index('field') < len(kinds) - 1
+    assert {'type': 'field', 'name': 'lessonTitle', 'value': NOTE['lessonTitle']} in events
+    assert events[-1]['lesson_note'] == NOTE
+    assert events[-1]['generation_stats']['prompt_tokens'] == 10
@@ -0,0 +1,124 @@
+"""
+Unit tests for resumable batch lesson note generation
+"""
+
+import json
+import time
+
+import pytest
+from flask import Flask
+
+import app.services.lesson_service as lesson_service_module
+from app import db
+from app.models import Document, DocumentChunk, ProcessingJob, SystemSettings
+from app.services.lesson_batch import LessonBatchRunner
+from app.services.llm_queue import LLMDispatchQueue
+from tests.stubs.llm_stub_servers import StubLLMServer
+
+
+@pytest.fixture
+def stub():
+    server = StubLLMServer('ollama', reply=json.dumps({
+        'subject': 'Biology', 'classLevel': 'Form 1', 'lessonTitle': 'Generated lesson',
+        'mainTopic': 'Cells', 'subTopic': 'Cell parts', 'mainBody': 'Lesson body'
+    })).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def flask_app(stub):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(SystemSettings(key='llm_base_url', value=stub.url))
+        db.session.commit()
+        yield app
+        db.session.remove()
+
+
+def _lesson_of(payload):
+    return payload['messages'][-1]['content'].rsplit('lesson: ', 1)[-1]
+
+
+def test_failed_lessons_resume_without_regenerating(stub, flask_app, tmp_path):
+    runner = LessonBatchRunner(concurrency=2, output_dir=str(tmp_path))
+    job = runner.create_job('Biology', 'Form 1', ['Lesson 1: Cells', {'lesson': 'Lesson 2: Tissues'},
+                                                  'Lesson 3: Organs', 'Lesson 1: Cells'])
+
+    stub.fail_if = lambda payload: _lesson_of(payload) == 'Lesson 2: Tissues'
+    runner.run(job.id)
+
+    job = ProcessingJob.query.get(job.id)
+    assert job.status == 'failed'
+    assert job.progress == 66
+    assert sorted(job.result_data['completed']) == ['Lesson 1: Cells', 'Lesson 3: Organs']
+    assert list(job.result_data['failed']) == ['Lesson 2: Tissues']
+    assert len(list(tmp_path.iterdir())) == 2
+
+    stub.fail_if = None
+    stub.requests.clear()
+    runner.run(job.id)
+
+    job = ProcessingJob.query.get(job.id)
+    assert job.status == 'completed'
+    assert job.progress == 100
+    assert [_lesson_of(payload) for _, payload in stub.requests] == ['Lesson 2: Tissues']
+    summary = runner.summarize(job)
+    assert [l['status'] for l in summary['lessons']] == ['completed'] * 3
+
+
+def test_concurrency_is_bounded_by_the_llm_queue(stub, flask_app, tmp_path, monkeypatch):
+    queue = LLMDispatchQueue(default_limit=2)
+    monkeypatch.setattr(lesson_service_module, 'llm_queue', queue)
+    stub.delay = 0.3
+    runner = LessonBatchRunner(concurrency=4, output_dir=str(tmp_path))
+    job = runner.create_job('Biology', 'Form 1', [f'Lesson {i}' for i in range(1, 5)])
+
+    start = time.time()
+    runner.run(job.id)
+    elapsed = time.time() - start
+
+    assert ProcessingJob.query.get(job.id).status == 'completed'
+    # Four lessons through two Ollama slots: two rounds, not one or four
+    assert 0.55 < elapsed < 1.1
+    lane = queue.get_stats()['lanes']['ollama/llama3.3:latest']
+    assert lane['dispatched'] == 4
+    assert lane['max_queue_depth'] == 2
+    assert len(list(tmp_path.iterdir())) == 4
+
+
+def test_stored_chunks_reach_the_batch_prompt(stub, flask_app, tmp_path):
+    document = Document(name='Biology textbook', filename='bio.pdf', file_path='/tmp/bio.pdf',
+                        document_type='textbook', subject='Biology', class_level='Form 1',
+                        processing_status='completed')
+    db.session.add(document)
+    db.session.flush()
+    db.session.add(DocumentChunk(document_id=document.id, chunk_index=0,
+                                 content='MARKER-7731: cells are the basic unit of life and have a membrane.'))
+    db.session.commit()
+
+    runner = LessonBatchRunner(concurrency=2, output_dir=str(tmp_path))
+    job = runner.create_job('Biology', 'Form 1', ['Lesson 1: Cells', 'Lesson 2: Cell membrane'])
+    runner.run(job.id)
+
+    assert ProcessingJob.query.get(job.id).status == 'completed'
+    prompts = [json.dumps(payload['messages']) for _, payload in stub.requests]
+    assert len(prompts) == 2 and all('MARKER-7731' in prompt for prompt in prompts)
+
+
+def test_each_lesson_keeps_its_own_generation_stats(stub, flask_app, tmp_path, monkeypatch):
+    # Saving is slow, so other workers finish generating before a lesson's stats are collected
+    save = lesson_service_module.LessonNoteService.save_lesson_note_locally
+    monkeypatch.setattr(lesson_service_module.LessonNoteService, 'save_lesson_note_locally',
+                        lambda self, *args, **kwargs: time.sleep(0.2) or save(self, *args, **kwargs))
+    runner = LessonBatchRunner(concurrency=4, output_dir=str(tmp_path))
+    lessons = [f'Lesson {i}' for i in range(1, 9)]
+    job = runner.create_job('Biology', 'Form 1', lessons)
+    runner.run(job.id)
+
+    completed = ProcessingJob.query.get(job.id).result_data['completed']
+    assert sorted(completed) == sorted(lessons)
+    assert all(entry['generation_stats']['lesson'] == lesson for lesson, entry in completed.items())
@@ -0,0 +1,91 @@
+"""
+Unit tests for per-lesson context retrieval in lesson note generation
+"""
+
+import json
+
+import pytest
+from flask import Flask
+
+from app import db
+from app.models import Document, DocumentChunk, SystemSettings
+from app.services.curriculum_digest import curriculum_digest
+from app.services.lesson_context import LessonContextBuilder, estimate_tokens, lesson_context
+from app.services.lesson_service import LessonNoteService
+from tests.stubs.llm_stub_servers import StubLLMServer
+
+TEXTBOOK = [
+    "Photosynthesis takes place in the chloroplasts. Green plants use light energy to make glucose.",
+    "The digestive system breaks food down. The stomach and the small intestine absorb nutrients.",
+    "Chlorophyll absorbs light for photosynthesis; oxygen is released as a by-product.",
+    "The skeleton supports the body and protects organs such as the heart and lungs.",
+] + [f"Filler section {i} about unrelated revision exercises and classroom rules." for i in range(20)]
+CURRICULUM = [
+    "Objective: explain photosynthesis and the role of light and chlorophyll.",
+    "Objective: describe the organs of the digestive system.",
+]
+
+
+@pytest.fixture
+def app(monkeypatch):
+    # These tests cover retrieval of raw curriculum chunks, not the digest
+    monkeypatch.setattr(curriculum_digest, 'enabled', False)
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        for doc_type, chunks in (('textbook', TEXTBOOK), ('curriculum', CURRICULUM)):
+            document = Document(name=doc_type, filename=f"{doc_type}.pdf", file_path=f"/tmp/{doc_type}.pdf",
+                                document_type=doc_type, subject='Biology', class_level='Form 2')
+            db.session.add(document)
+            db.session.flush()
+            for i, content in enumerate(chunks):
+                db.session.add(DocumentChunk(document_id=document.id, content=content, chunk_index=i))
+        db.session.commit()
+        yield app
+        db.session.remove()
+
+
+def test_only_relevant_chunks_within_budget(app):
+    builder = LessonContextBuilder(top_k=4, token_budget=200)
+    context = builder.build('Biology', 'Form 2', 'Lesson 3: Photosynthesis and chlorophyll')
+
+    assert 'chloroplasts' in context['textbook'] and 'Chlorophyll absorbs' in context['textbook']
+    assert 'digestive' not in context['textbook'] and 'Filler' not in context['textbook']
+    assert 'photosynthesis' in context['curriculum'] and 'digestive' not in context['curriculum']
+    assert context['context_tokens'] <= 200 + 2
+    assert len(context['chunk_ids']) == 3
+
+    # A budget smaller than the matches keeps the best one only
+    tight = LessonContextBuilder(top_k=4, token_budget=40, curriculum_share=0.0)
+    assert estimate_tokens(tight.build('Biology', 'Form 2', 'Photosynthesis chlorophyll')['textbook']) <= 40
+
+
+def test_passed_documents_are_split_when_no_chunks_are_stored(app):
+    documents = [{'content': "\n\n".join(TEXTBOOK)}]
+    context = LessonContextBuilder(top_k=2, token_budget=300, passage_chars=120).build(
+        'Chemistry', 'Form 2', 'The skeleton', documents, [])
+
+    assert 'skeleton supports' in context['textbook']
+    assert 'Filler' not in context['textbook']
+    assert context['chunk_ids'] == []
+
+
+def test_generation_reports_prompt_tokens_and_latency(app):
+    note = {'lessonTitle': 'Photosynthesis', 'mainBody': '...'}
+    with StubLLMServer('ollama', reply=json.dumps(note)) as stub:
+        db.session.add(SystemSettings(key='llm_base_url', value=stub.url))
+        db.session.commit()
+        service = LessonNoteService()
+        before = lesson_context.get_stats()['lessons_generated']
+
+        result = service.generate_lesson_note('Biology', 'Form 2', {'lesson': 'Photosynthesis'}, [], [])
+
+        assert result == note
+        prompt = stub.requests[0][1]['messages'][1]['content']
+        assert 'chloroplasts' in prompt and 'digestive system breaks' not in prompt
+        stats = service.last_generation_stats
+        assert stats['prompt_tokens'] == 10 and stats['latency'] >= 0
+        assert len(stats['chunk_ids']) >= 2
+        assert lesson_context.get_stats()['lessons_generated'] == before + 1
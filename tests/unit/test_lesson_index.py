@@ -0,0 +1,99 @@
+"""
+Unit tests for the ingestion-time lesson to chunk map
+"""
+
+import json
+
+import pytest
+from flask import Flask
+
+from app import db
+from app.models import Document, DocumentChunk, LessonChunkMap, SystemSettings
+from app.services.lesson_context import LessonContextBuilder
+from app.services.lesson_index import LessonIndexer
+from app.services.lesson_title_cache import lesson_title_cache
+from tests.stubs.llm_stub_servers import StubLLMServer
+
+PROGRESSION = "Lesson 1: Photosynthesis\nLesson 2: The digestive system\nLesson 3: The skeleton"
+
+
+def add_document(doc_type, chunks, text=None):
+    document = Document(name=doc_type, filename=f"{doc_type}.pdf", file_path=f"/tmp/{doc_type}.pdf",
+                        document_type=doc_type, subject='Biology', class_level='Form 2',
+                        extracted_text=text, processing_status='completed')
+    db.session.add(document)
+    db.session.flush()
+    for i, content in enumerate(chunks):
+        db.session.add(DocumentChunk(document_id=document.id, content=content, chunk_index=i))
+    db.session.commit()
+    return document
+
+
+@pytest.fixture
+def stub():
+    with StubLLMServer('ollama', reply=json.dumps({'lessonTitle': 'x', 'mainBody': 'y'})) as server:
+        yield server
+
+
+@pytest.fixture
+def app(stub):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(SystemSettings(key='llm_base_url', value=stub.url))
+        db.session.commit()
+        lesson_title_cache.clear_memory()
+        yield app
+        db.session.remove()
+
+
+def test_rebuild_maps_each_lesson_and_generation_uses_the_lookup(app, stub, monkeypatch):
+    add_document('progression', [], PROGRESSION)
+    textbook = add_document('textbook', [
+        "Photosynthesis happens in chloroplasts.",
+        "The digestive system breaks down food.",
+        "The skeleton protects the organs.",
+    ])
+    indexer = LessonIndexer()
+
+    assert indexer.rebuild('Biology', 'Form 2') == 3
+    assert [l['lesson'] for l in indexer.lessons('Biology', 'Form 2')] == [
+        'Lesson 1: Photosynthesis', 'Lesson 2: The digestive system', 'Lesson 3: The skeleton']
+    entry = LessonChunkMap.query.filter_by(lesson='Lesson 3: The skeleton').one()
+    skeleton_chunk = DocumentChunk.query.filter_by(document_id=textbook.id, chunk_index=2).one()
+    assert entry.textbook_chunk_ids == [str(skeleton_chunk.id)]
+    assert stub.requests == []  # the progression parser handled the titles
+
+    # Generation context is a lookup: no ranking over the subject's chunks
+    builder = LessonContextBuilder()
+    monkeypatch.setattr(builder, 'select', lambda *a, **k: pytest.fail('ranked instead of lookup'))
+    context = builder.build('Biology', 'Form 2', 'Lesson 3: The skeleton')
+    assert context['textbook'] == "The skeleton protects the organs."
+    assert builder.get_stats()['chunk_map_hits'] == 1
+
+
+def test_new_documents_update_the_map_incrementally(app):
+    add_document('progression', [], PROGRESSION)
+    add_document('textbook', ["Photosynthesis happens in chloroplasts."])
+    indexer = LessonIndexer()
+    indexer.rebuild('Biology', 'Form 2')
+    assert LessonChunkMap.query.filter_by(lesson='Lesson 2: The digestive system').one().textbook_chunk_ids == []
+
+    workbook = add_document('textbook', ["Exercises on the digestive system and its organs.",
+                                         "Photosynthesis needs light and chlorophyll."])
+    assert indexer.update('Biology', 'Form 2', [workbook.id]) == 2
+
+    digestive = LessonChunkMap.query.filter_by(lesson='Lesson 2: The digestive system').one()
+    photosynthesis = LessonChunkMap.query.filter_by(lesson='Lesson 1: Photosynthesis').one()
+    assert len(digestive.textbook_chunk_ids) == 1
+    assert len(photosynthesis.textbook_chunk_ids) == 2
+
+    # A new progression replaces the lesson list
+    add_document('progression', [], "Lesson 1: Photosynthesis\nLesson 2: Respiration\nLesson 3: Cells")
+    db.session.delete(Document.query.filter_by(extracted_text=PROGRESSION).one())
+    db.session.commit()
+    assert indexer.rebuild('Biology', 'Form 2') == 3
+    assert LessonChunkMap.query.filter_by(lesson='Lesson 2: The digestive system').count() == 0
+    assert len(LessonChunkMap.query.filter_by(lesson='Lesson 1: Photosynthesis').one().textbook_chunk_ids) == 2
@@ -0,0 +1,72 @@
+"""
+Unit tests for the extracted lesson title cache
+"""
+
+import json
+import time
+
+import pytest
+from flask import Flask
+
+from app import db
+from app.models import SystemSettings
+from app.services.lesson_service import LessonNoteService
+from app.services.lesson_title_cache import lesson_title_cache
+from tests.stubs.llm_stub_servers import StubLLMServer
+
+PROGRESSION = [{'lesson': 'Week 1 - Introduction to cells'}, {'lesson': 'Week 2 - Tissues'}]
+
+
+@pytest.fixture
+def stub():
+    server = StubLLMServer('ollama', reply=json.dumps([
+        {'lesson': 'Lesson 1: Introduction to cells'}, {'lesson': 'Lesson 2: Tissues'}
+    ])).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def service(stub):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(SystemSettings(key='llm_base_url', value=stub.url))
+        db.session.commit()
+        lesson_title_cache.clear_memory()
+        yield LessonNoteService()
+        db.session.remove()
+
+
+def test_repeat_loads_skip_the_llm(stub, service):
+    first = service.extract_lesson_titles(PROGRESSION, 'Biology', 'Form 1')
+    assert len(stub.requests) == 1
+
+    start = time.perf_counter()
+    second = service.extract_lesson_titles(PROGRESSION, 'Biology', 'Form 1')
+    assert time.perf_counter() - start < 0.01
+    assert second == first
+    assert len(stub.requests) == 1
+
+    # Survives a restart through the database table
+    lesson_title_cache.clear_memory()
+    assert service.extract_lesson_titles(PROGRESSION, 'Biology', 'Form 1') == first
+    assert len(stub.requests) == 1
+
+
+def test_changed_or_invalidated_progression_is_extracted_again(stub, service):
+    service.extract_lesson_titles(PROGRESSION, 'Biology', 'Form 1')
+
+    # Whitespace-only differences hit the same entry
+    service.extract_lesson_titles([{'lesson': '  Week 1 - Introduction to cells '}, {'lesson': 'Week 2 - Tissues'}],
+                                  'Biology', 'Form 1')
+    assert len(stub.requests) == 1
+
+    service.extract_lesson_titles(PROGRESSION + [{'lesson': 'Week 3 - Organs'}], 'Biology', 'Form 1')
+    assert len(stub.requests) == 2
+
+    assert lesson_title_cache.invalidate('Biology', 'Form 1') == 2
+    service.extract_lesson_titles(PROGRESSION, 'Biology', 'Form 1')
+    assert len(stub.requests) == 3
@@ -0,0 +1,120 @@
+"""
+Unit tests for the LLM dispatch queue
+"""
+
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from app.services.llm_queue import LLMDispatchQueue, LLMQueueRejected, llm_queue, request_identity
+
+
+def _hold_slot(queue, client_id, ticket, release, order):
+    with queue.slot('ollama', 'llama3', client_id=client_id, ticket=ticket, timeout=5):
+        order.append(ticket)
+        release.wait(5)
+
+
+def test_concurrency_limit_and_round_robin_between_clients():
+    queue = LLMDispatchQueue(default_limit=1)
+    release = threading.Event()
+    order = []
+
+    holder = threading.Thread(target=_hold_slot, args=(queue, 'teacher-a', 'a0', release, order))
+    holder.start()
+    time.sleep(0.05)
+
+    done = threading.Event()
+    done.set()
+    waiters = []
+    # teacher-a floods the queue before teacher-b asks once
+    for ticket, client in [('a1', 'teacher-a'), ('a2', 'teacher-a'), ('b1', 'teacher-b')]:
+        t = threading.Thread(target=_hold_slot, args=(queue, client, ticket, done, order))
+        t.start()
+        waiters.append(t)
+        time.sleep(0.05)
+
+    assert queue.get_stats()['lanes']['ollama/llama3']['queue_depth'] == 3
+    assert queue.get_position('a1')['queue_position'] == 1
+    assert queue.get_position('b1')['queue_position'] == 2
+    assert queue.get_position('a2')['queue_position'] == 3
+    assert queue.get_position('a0')['state'] == 'running'
+
+    release.set()
+    holder.join()
+    for t in waiters:
+        t.join()
+
+    assert order == ['a0', 'a1', 'b1', 'a2']
+    lane = queue.get_stats()['lanes']['ollama/llama3']
+    assert lane['active'] == 0
+    assert lane['dispatched'] == 4
+    assert lane['max_queue_depth'] == 3
+
+
+def test_deadline_rejection_reports_position():
+    queue = LLMDispatchQueue(default_limit=1)
+    release = threading.Event()
+    holder = threading.Thread(target=_hold_slot, args=(queue, 'a', 'a0', release, []))
+    holder.start()
+    time.sleep(0.05)
+
+    with pytest.raises(LLMQueueRejected) as excinfo:
+        with queue.slot('ollama', 'llama3', client_id='b', ticket='b1', timeout=0.1):
+            pass
+
+    assert excinfo.value.queue_position == 1
+    release.set()
+    holder.join()
+    assert queue.get_stats()['lanes']['ollama/llama3']['rejected'] == 1
+
+
+def test_full_queue_rejects_immediately():
+    queue = LLMDispatchQueue(default_limit=1, max_depth=0)
+    release = threading.Event()
+    holder = threading.Thread(target=_hold_slot, args=(queue, 'a', 'a0', release, []))
+    holder.start()
+    time.sleep(0.05)
+
+    start = time.time()
+    with pytest.raises(LLMQueueRejected):
+        with queue.slot('ollama', 'llama3', client_id='b', ticket='b1', timeout=5):
+            pass
+    assert time.time() - start < 1
+
+    release.set()
+    holder.join()
+
+
+def test_per_provider_and_model_limits():
+    limits = LLMDispatchQueue.parse_limits('openai=8, ollama/llama3.3:latest=2,bad')
+    assert limits == {'openai': 8, 'ollama/llama3.3:latest': 2}
+
+    queue = LLMDispatchQueue(default_limit=1, limits=limits)
+    assert queue._limit_for('openai', 'gpt-4') == 8
+    assert queue._limit_for('ollama', 'llama3.3:latest') == 2
+    assert queue._limit_for('ollama', 'mistral') == 1
+
+
+def test_slots_of_one_ticket_do_not_evict_each_other():
+    # A hedged request: the same ticket holds a slot on two providers, then nests a call
+    queue = LLMDispatchQueue(default_limit=1)
+    with queue.slot('ollama', 'llama3', client_id='a', ticket='t1'):
+        with queue.slot('openai', 'gpt-4', client_id='a', ticket='t1'):
+            with queue.slot('ollama', 'mistral', client_id='a', ticket='t1'):
+                pass
+            assert queue.get_position('t1')['state'] == 'running'
+        assert queue.get_position('t1')['queue'] == 'ollama/llama3'
+    assert queue.get_position('t1') is None
+
+
+def test_fairness_is_keyed_on_address_unless_the_header_is_trusted(monkeypatch):
+    app = Flask(__name__)
+    headers = {'X-Client-Id': 'fresh-id-every-time', 'X-Request-Id': 'r1'}
+
+    with app.test_request_context(headers=headers, environ_base={'REMOTE_ADDR': '10.0.0.7'}):
+        assert request_identity() == ('10.0.0.7', 'r1')
+        monkeypatch.setattr(llm_queue, 'client_header', 'X-Client-Id')
+        assert request_identity() == ('fresh-id-every-time', 'r1')
@@ -0,0 +1,115 @@
+"""
+Unit tests for latency-aware LLM provider routing, run against local stub servers
+"""
+
+import time
+
+import pytest
+from flask import Flask
+
+import app.services.llm_service as llm_service_module
+from app.services.llm_queue import LLMDispatchQueue
+from app.services.llm_router import ProviderRouter
+from app.services.llm_service import LLMService
+from tests.stubs.llm_stub_servers import StubLLMServer
+
+
+@pytest.fixture
+def stubs():
+    servers = {
+        'ollama': StubLLMServer('ollama', reply='from ollama').start(),
+        'lm_studio': StubLLMServer('openai', reply='from lm_studio').start(),
+        'openai': StubLLMServer('openai', reply='from openai', models=['gpt-4o-mini']).start(),
+    }
+    yield servers
+    for server in servers.values():
+        server.stop()
+
+
+@pytest.fixture
+def router(monkeypatch):
+    router = ProviderRouter(hedge_after=0.2, failure_threshold=2, cooldown=60)
+    monkeypatch.setattr(llm_service_module, 'llm_router', router)
+    monkeypatch.setattr(llm_service_module, 'llm_queue', LLMDispatchQueue(default_limit=4))
+    return router
+
+
+@pytest.fixture
+def flask_app(stubs):
+    app = Flask(__name__)
+    app.config.update(
+        DEFAULT_LLM_PROVIDER='ollama',
+        OLLAMA_BASE_URL=stubs['ollama'].url,
+        LM_STUDIO_BASE_URL=stubs['lm_studio'].url,
+        OPENAI_BASE_URL=stubs['openai'].url,
+        LLM_ROUTER_PROVIDERS='ollama,lm_studio,openai',
+        LLM_ROUTER_MODELS='openai=gpt-4o-mini',
+    )
+    with app.app_context():
+        yield app
+
+
+def test_rank_prefers_fast_healthy_providers():
+    router = ProviderRouter(failure_threshold=2, cooldown=60)
+    for _ in range(5):
+        router.record('ollama', 2.0, True)
+        router.record('lm_studio', 0.5, True)
+    router.record('openai', 0.1, False)
+    router.record('openai', 0.1, False)
+
+    # The preferred provider only wins when it is not clearly slower
+    assert router.rank(['ollama', 'lm_studio', 'openai'], preferred='ollama') == ['lm_studio', 'ollama', 'openai']
+    stats = router.get_stats()['providers']
+    assert stats['openai']['circuit_open'] is True
+    assert stats['openai']['error_rate'] == 1.0
+
+
+def test_slow_provider_is_hedged(stubs, router, flask_app):
+    stubs['ollama'].delay = 1.0
+    service = LLMService()
+
+    start = time.time()
+    response = service.generate_response("What is photosynthesis?")
+
+    assert time.time() - start < 0.9
+    assert service.last_provider in ('lm_studio', 'openai')
+    assert response == f"from {service.last_provider}"
+    stats = router.get_stats()
+    assert stats['hedges'] == 1
+    assert stats['hedge_wins'] == 1
+
+
+def test_failing_provider_fails_over_and_is_demoted(stubs, router, flask_app):
+    stubs['ollama'].fail = True
+    service = LLMService()
+
+    assert service.generate_response("first question") in ('from lm_studio', 'from openai')
+    assert router.get_stats()['failovers'] == 1
+    assert router.get_stats()['providers']['ollama']['error_rate'] == 1.0
+
+    # The failing provider now ranks behind the healthy ones and is not retried
+    ollama_calls = len(stubs['ollama'].requests)
+    service.generate_response("second question")
+    assert len(stubs['ollama'].requests) == ollama_calls
+    assert router.get_stats()['failovers'] == 1
+
+
+def test_model_constraint_limits_candidates(stubs, router, flask_app):
+    service = LLMService()
+    assert service.get_candidate_providers('gpt-4o-mini') == ['openai']
+
+    assert service.generate_response("Summarise the syllabus", model='gpt-4o-mini') == 'from openai'
+    path, payload = stubs['openai'].requests[-1]
+    assert path == '/v1/chat/completions'
+    assert payload['model'] == 'gpt-4o-mini'
+    assert stubs['ollama'].requests == []
+
+
+def test_single_provider_errors_are_reported(stubs, router, flask_app):
+    flask_app.config['LLM_ROUTER_PROVIDERS'] = ''
+    stubs['ollama'].fail = True
+    service = LLMService()
+
+    with pytest.raises(Exception, match="LLM generation failed"):
+        service.generate_response("unanswerable")
+    assert router.get_stats()['providers']['ollama']['error_rate'] == 1.0
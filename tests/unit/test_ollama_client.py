@@ -0,0 +1,60 @@
+"""
+Unit tests for Ollama model residency, warm-up and prompt prefix ordering
+"""
+
+import pytest
+from flask import Flask
+
+from app.services.llm_service import LLMService
+from app.services.ollama_client import OllamaClient
+from tests.stubs.llm_stub_servers import StubLLMServer
+
+
+@pytest.fixture
+def stub():
+    server = StubLLMServer('ollama').start()
+    yield server
+    server.stop()
+
+
+def test_pinned_models_are_kept_alive(stub):
+    client = OllamaClient(base_url=stub.url, pinned_models=['llama3.3:latest'], keep_alive='-1')
+
+    client.chat({'model': 'llama3.3:latest', 'messages': [], 'stream': False})
+    client.chat({'model': 'mistral', 'messages': [], 'stream': False})
+
+    assert stub.requests[0][1]['keep_alive'] == -1
+    assert 'keep_alive' not in stub.requests[1][1]
+
+
+def test_warm_up_and_cold_versus_warm_latency(stub):
+    client = OllamaClient(base_url=stub.url, pinned_models=['llama3.3:latest'], keep_alive='30m')
+
+    stub.load_duration = 2.0
+    client.warm_pinned(background=False)
+    path, payload = stub.requests[0]
+    assert path == '/api/generate'
+    assert payload == {'model': 'llama3.3:latest', 'prompt': '', 'stream': False, 'keep_alive': '30m'}
+
+    stub.load_duration = 0.0
+    stub.delay = 0.1
+    client.generate({'model': 'llama3.3:latest', 'prompt': 'hello', 'stream': False})
+
+    stats = client.get_stats()['models']['llama3.3:latest']
+    assert stats['cold_requests'] == 1
+    assert stats['warm_requests'] == 1
+    assert stats['cold_latency_avg'] == pytest.approx(2.0, abs=0.01)
+    assert stats['warm_latency_avg'] == pytest.approx(0.1, abs=0.01)
+
+
+def test_rag_prompt_keeps_stable_prefix_first():
+    app = Flask(__name__)
+    with app.app_context():
+        service = LLMService()
+
+    first = service._build_rag_prompt("What is osmosis?", "chunk A", "You are a tutor.")
+    second = service._build_rag_prompt("What is diffusion?", "chunk B", "You are a tutor.")
+
+    prefix = "System: You are a tutor.\n\nPlease answer the following question using the context provided when relevant."
+    assert first.startswith(prefix) and second.startswith(prefix)
+    assert first.index("chunk A") < first.index("What is osmosis?")
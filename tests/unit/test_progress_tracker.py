@@ -0,0 +1,61 @@
+"""
+Unit tests for job progress recording and write throttling
+"""
+
+import uuid
+
+import pytest
+from flask import Flask
+
+from app import db
+from app.models import ProcessingJob
+from app.services.progress_tracker import ProgressTracker, JobProgress
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', JOB_PROGRESS_INTERVAL=60)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def job(app):
+    job_id = ProgressTracker.create_job('ocr', None, estimated_duration=120)
+    return db.session.get(ProcessingJob, job_id)
+
+
+def test_updates_are_throttled_except_stage_changes(job):
+    progress = JobProgress(job.id)
+    written = [progress.update(n / 10, stage='ocr', message=f"page {n}") for n in range(1, 500)]
+
+    assert written[0] and sum(written) == 1  # one write per interval
+    assert progress.update(50, stage='embedding', message='chunks')  # new stage
+    assert not progress.update(51, stage='embedding')
+    assert progress.update(100, stage='completed', force=True)
+    assert progress.writes == 3 and progress.skipped == 499
+
+
+def test_progress_is_recorded_on_the_job_with_an_eta(job):
+    progress = JobProgress(job.id, interval=0)
+    progress.started -= 30  # 30s in
+    progress.update(25, stage='ocr', message='OCR 5/20 pages',
+                    stages={'ocr': {'done': 5, 'total': 20}})
+
+    db.session.expire_all()
+    described = ProgressTracker.get_progress(job.id)
+    assert described['progress'] == 25 and described['message'] == 'OCR 5/20 pages'
+    assert described['stage'] == 'ocr' and described['stages']['ocr'] == {'done': 5, 'total': 20}
+    assert 85 <= described['eta_seconds'] <= 95  # 30s per 25%
+    assert 115 <= described['estimated_duration'] <= 125
+    assert described['updated_at']
+
+
+def test_update_progress_reports_missing_jobs(job):
+    assert ProgressTracker.update_progress(job.id, 40, status='running', message='halfway')
+    assert (job.progress, job.status, job.status_message) == (40, 'running', 'halfway')
+    assert not ProgressTracker.update_progress(uuid.uuid4(), 10)
@@ -0,0 +1,72 @@
+"""
+Unit tests for the rule-based progression parser
+"""
+
+import json
+import time
+from pathlib import Path
+
+import pytest
+from flask import Flask
+
+from app import db
+from app.models import SystemSettings
+from app.services.lesson_service import LessonNoteService
+from app.services.lesson_title_cache import lesson_title_cache
+from app.services.progression_parser import parse_progression
+from tests.stubs.llm_stub_servers import StubLLMServer
+
+FIXTURES = Path(__file__).resolve().parent.parent / 'fixtures' / 'progressions'
+EXPECTED = json.loads((FIXTURES / 'expected.json').read_text(encoding='utf-8'))
+THRESHOLD = 0.7
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_fixture_accuracy(name):
+    result = parse_progression((FIXTURES / name).read_text(encoding='utf-8'))
+    expected = EXPECTED[name]
+
+    if expected is None:
+        # Documents without a lesson list must be left to the LLM
+        assert result['confidence'] < THRESHOLD
+    else:
+        assert result['confidence'] >= THRESHOLD
+        assert [lesson['lesson'] for lesson in result['lessons']] == expected
+
+
+def test_fixture_speed():
+    texts = [(FIXTURES / name).read_text(encoding='utf-8') for name in EXPECTED]
+    rounds = 200
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            parse_progression(text)
+    per_document = (time.perf_counter() - start) / (rounds * len(texts))
+
+    # Orders of magnitude below an LLM extraction call
+    print(f"\nRule-based parse: {per_document * 1000:.2f} ms per progression document")
+
+
+def test_confident_parse_skips_the_llm():
+    with StubLLMServer('ollama', reply='[]') as stub:
+        app = Flask(__name__)
+        app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            db.session.add(SystemSettings(key='llm_base_url', value=stub.url))
+            db.session.commit()
+            lesson_title_cache.clear_memory()
+            service = LessonNoteService()
+
+            text = (FIXTURES / 'french_clean.txt').read_text(encoding='utf-8')
+            lessons = service.extract_lesson_titles([{'content': text}], 'Physique', '3ème')
+            assert [lesson['lesson'] for lesson in lessons] == EXPECTED['french_clean.txt']
+            assert stub.requests == []
+
+            # Unstructured text still goes to the LLM
+            prose = (FIXTURES / 'prose.txt').read_text(encoding='utf-8')
+            service.extract_lesson_titles([{'content': prose}], 'Physique', '3ème')
+            assert len(stub.requests) == 1
+            db.session.remove()
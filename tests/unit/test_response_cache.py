@@ -0,0 +1,71 @@
+"""
+Unit tests for the semantic response cache
+"""
+
+import time
+
+from app.services.response_cache import SemanticResponseCache
+
+
+def test_similar_query_hits_and_unrelated_query_misses():
+    cache = SemanticResponseCache(similarity_threshold=0.9)
+    key = cache.make_key('ollama', 'llama3', 'system', ['doc-1', 'doc-2'])
+
+    cache.store(key, [1.0, 0.0, 0.1], 'Objectives of lesson 3...', ['doc-1'])
+
+    hit = cache.lookup(key, [0.98, 0.02, 0.1])
+    assert hit is not None
+    assert hit['response'] == 'Objectives of lesson 3...'
+
+    assert cache.lookup(key, [0.0, 1.0, 0.0]) is None
+    stats = cache.get_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['hit_rate'] == 0.5
+
+
+def test_key_includes_model_and_chunk_ids():
+    cache = SemanticResponseCache()
+    key = cache.make_key('ollama', 'llama3', '', ['a', 'b'])
+    assert key == cache.make_key('ollama', 'llama3', '', ['b', 'a'])
+    assert key != cache.make_key('ollama', 'mistral', '', ['a', 'b'])
+    assert key != cache.make_key('ollama', 'llama3', '', ['a'])
+
+    cache.store(key, [1.0, 0.0], 'answer')
+    other = cache.make_key('ollama', 'mistral', '', ['a', 'b'])
+    assert cache.lookup(other, [1.0, 0.0]) is None
+
+
+def test_lru_eviction_keeps_recently_used_entries():
+    cache = SemanticResponseCache(max_entries=2)
+    key = cache.make_key('ollama', 'm')
+    cache.store(key, [1.0, 0.0, 0.0], 'first')
+    cache.store(key, [0.0, 1.0, 0.0], 'second')
+
+    assert cache.lookup(key, [1.0, 0.0, 0.0])['response'] == 'first'
+    cache.store(key, [0.0, 0.0, 1.0], 'third')
+
+    assert cache.lookup(key, [0.0, 1.0, 0.0]) is None
+    assert cache.lookup(key, [1.0, 0.0, 0.0])['response'] == 'first'
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_ttl_expiry():
+    cache = SemanticResponseCache(ttl_seconds=1)
+    key = cache.make_key('ollama', 'm')
+    cache.store(key, [1.0, 0.0], 'answer')
+    cache._entries[next(iter(cache._entries))]['created_at'] = time.time() - 5
+
+    assert cache.lookup(key, [1.0, 0.0]) is None
+    assert cache.get_stats()['entries'] == 0
+
+
+def test_invalidate_document_drops_citing_entries():
+    cache = SemanticResponseCache()
+    key = cache.make_key('ollama', 'm')
+    cache.store(key, [1.0, 0.0], 'from doc 1', ['doc-1'])
+    cache.store(key, [0.0, 1.0], 'from doc 2', ['doc-2'])
+
+    assert cache.invalidate_document('doc-1') == 1
+    assert cache.lookup(key, [1.0, 0.0]) is None
+    assert cache.lookup(key, [0.0, 1.0])['response'] == 'from doc 2'
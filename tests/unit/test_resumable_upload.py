@@ -0,0 +1,132 @@
+"""
+Unit tests for resumable chunked uploads
+"""
+
+import hashlib
+import io
+import os
+import time
+
+import pytest
+
+from app.services.resumable_upload import (ResumableUploads, UploadError, add_range, missing_ranges,
+                                           RESUMABLE_DIR)
+from app.services.upload_stream import upload_receiver, INCOMING_DIR
+
+
+class DroppedConnection(io.BytesIO):
+    """A request body that breaks after ``limit`` bytes"""
+
+    def __init__(self, data, limit):
+        super().__init__(data)
+        self.limit = limit
+
+    def read(self, size=-1):
+        if self.tell() >= self.limit:
+            raise ConnectionResetError('client went away')
+        return super().read(min(size, self.limit - self.tell()) if size >= 0 else self.limit - self.tell())
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_receiver, 'min_free_space', 0)
+    uploads = ResumableUploads(chunk_size=1024 * 1024)
+    uploads.upload_folder = str(tmp_path)
+    return uploads
+
+
+def send(uploads, upload_id, data, offset, size):
+    return uploads.write_chunk(upload_id, offset, io.BytesIO(data[offset:offset + size]), len(data[offset:offset + size]))
+
+
+def test_ranges_merge_and_gaps_are_reported():
+    ranges = add_range([], 10, 20)
+    ranges = add_range(ranges, 30, 40)
+    ranges = add_range(ranges, 18, 31)
+    assert ranges == [[10, 40]]
+    assert missing_ranges(ranges, 50) == [[0, 10], [40, 50]]
+    assert missing_ranges([[0, 50]], 50) == []
+
+
+def test_chunks_in_any_order_finalize_into_the_upload_folder(uploads, tmp_path):
+    data = os.urandom(3 * 1024 * 1024 + 100)
+    upload = uploads.create('Form 1 Biology.pdf', len(data), {'document_type': 'textbook'},
+                            sha256=hashlib.sha256(data).hexdigest())
+    upload_id = upload['upload_id']
+
+    for offset in (2 * 1024 * 1024, 0, 3 * 1024 * 1024, 1024 * 1024):
+        status = send(uploads, upload_id, data, offset, 1024 * 1024)
+    assert status['complete'] and status['bytes_received'] == len(data)
+
+    file_info, metadata = uploads.finalize(upload_id)
+    assert metadata == {'document_type': 'textbook'}
+    assert file_info['file_hash'] == hashlib.sha256(data).hexdigest() and file_info['file_size'] == len(data)
+    assert file_info['original_name'] == 'Form_1_Biology.pdf'
+    assert os.path.dirname(file_info['file_path']) == str(tmp_path)
+    with open(file_info['file_path'], 'rb') as f:
+        assert f.read() == data
+    assert os.listdir(tmp_path / RESUMABLE_DIR) == []
+    assert uploads.get_stats()['finalized'] == 1
+
+
+def test_interrupted_chunk_keeps_what_arrived_and_resumes(uploads):
+    data = os.urandom(2 * 1024 * 1024)
+    upload_id = uploads.create('notes.pdf', len(data))['upload_id']
+
+    with pytest.raises(ConnectionResetError):
+        uploads.write_chunk(upload_id, 0, DroppedConnection(data, 1_300_000))
+
+    status = uploads.status(upload_id)
+    assert status['received'] == [[0, 1_300_000]] and status['missing'] == [[1_300_000, len(data)]]
+    with pytest.raises(UploadError) as error:
+        uploads.finalize(upload_id)
+    assert error.value.status == 409
+
+    start, end = status['missing'][0]
+    send(uploads, upload_id, data, start, end - start)
+    file_info, _ = uploads.finalize(upload_id)
+    assert file_info['file_hash'] == hashlib.sha256(data).hexdigest()
+
+
+def test_limits_and_bad_requests(uploads):
+    with pytest.raises(UploadError) as error:
+        uploads.create('huge.pdf', upload_receiver.max_file_size + 1)
+    assert error.value.status == 413
+
+    upload_id = uploads.create('notes.pdf', 100)['upload_id']
+    with pytest.raises(UploadError) as error:
+        uploads.write_chunk(upload_id, 90, io.BytesIO(b'x' * 20), 20)
+    assert error.value.status == 416
+    with pytest.raises(UploadError) as error:
+        uploads.status('0123456789abcdef')
+    assert error.value.status == 404
+    with pytest.raises(UploadError) as error:
+        uploads.status('../../etc')
+    assert error.value.status == 404
+
+
+def test_checksum_mismatch_discards_the_upload(uploads):
+    upload_id = uploads.create('notes.pdf', 4, sha256=hashlib.sha256(b'good').hexdigest())['upload_id']
+    uploads.write_chunk(upload_id, 0, io.BytesIO(b'evil'), 4)
+    with pytest.raises(UploadError) as error:
+        uploads.finalize(upload_id)
+    assert error.value.status == 422
+    with pytest.raises(UploadError):
+        uploads.status(upload_id)
+
+
+def test_abandoned_uploads_and_stray_parts_are_cleaned_up(uploads, tmp_path):
+    stale = uploads.create('stale.pdf', 10)['upload_id']
+    fresh = uploads.create('fresh.pdf', 10)['upload_id']
+    os.makedirs(tmp_path / INCOMING_DIR)
+    part = tmp_path / INCOMING_DIR / 'crashed.part'
+    part.write_bytes(b'x')
+
+    long_ago = time.time() - uploads.ttl - 60
+    for path in (tmp_path / RESUMABLE_DIR / stale / 'upload.json', tmp_path / RESUMABLE_DIR / stale, part):
+        os.utime(path, (long_ago, long_ago))
+
+    assert uploads.cleanup() == 2
+    assert os.listdir(tmp_path / RESUMABLE_DIR) == [fresh]
+    assert not part.exists()
+    assert uploads.get_stats()['expired'] == 2
@@ -0,0 +1,127 @@
+"""
+Unit tests for the process-wide system settings cache
+"""
+
+import pytest
+from flask import Flask
+from sqlalchemy import event, text
+
+from app import db
+from app.models import SystemSettings
+from app.services.lesson_service import LessonNoteService
+from app.services.onlyoffice_service import OnlyOfficeService
+from app.services.settings_cache import SettingsCache, settings_cache, VERSION_KEY
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            SystemSettings(key='llm_base_url', value='http://ollama:11434'),
+            SystemSettings(key='llm_model', value='mistral:7b'),
+            SystemSettings(key='llm_temperature', value='0.3'),
+            SystemSettings(key='llm_max_tokens', value='not a number'),
+            SystemSettings(key='onlyoffice_enabled', value='true', description='Enable OnlyOffice'),
+            SystemSettings(key='google_credentials', value='{"token": "abc"}'),
+        ])
+        db.session.commit()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def queries(app):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def save_setting(key, value):
+    """What the settings routes do"""
+    setting = SystemSettings.query.filter_by(key=key).first()
+    if setting:
+        setting.value = value
+    else:
+        db.session.add(SystemSettings(key=key, value=value))
+    db.session.commit()
+
+
+def test_services_read_settings_from_memory(app, queries):
+    service = LessonNoteService()
+    assert (service.ollama_url, service.ollama_model) == ('http://ollama:11434', 'mistral:7b')
+    assert service.temperature == 0.3
+    assert service.max_tokens == 2048  # unparsable value falls back to the default
+
+    queries.clear()
+    for _ in range(20):
+        LessonNoteService()
+        assert OnlyOfficeService().enabled is True
+    assert queries == []
+
+
+def test_typed_getters(app):
+    cache = SettingsCache()
+    assert cache.get('llm_model') == 'mistral:7b'
+    assert cache.get('missing', 'default') == 'default'
+    assert cache.get_float('llm_temperature', 0.7) == 0.3
+    assert cache.get_int('llm_max_tokens', 2048) == 2048
+    assert cache.get_bool('onlyoffice_enabled') is True
+    assert cache.get_bool('missing', True) is True
+    assert cache.get_json('google_credentials') == {'token': 'abc'}
+    assert cache.describe()['onlyoffice_enabled']['description'] == 'Enable OnlyOffice'
+    assert VERSION_KEY not in cache.all()
+
+
+def test_writes_bump_the_version_and_invalidate(app, queries):
+    assert settings_cache.get('llm_model') == 'mistral:7b'
+    version = settings_cache.get_stats()['version']
+
+    save_setting('llm_model', 'llama3.3:latest')
+    save_setting('llm_provider', 'lmstudio')
+
+    assert settings_cache.get('llm_model') == 'llama3.3:latest'
+    assert settings_cache.get('llm_provider') == 'lmstudio'
+    assert int(settings_cache.get_stats()['version']) == int(version or 0) + 2
+
+    # A rolled back change neither bumps nor invalidates
+    invalidations = settings_cache.get_stats()['invalidations']
+    SystemSettings.query.filter_by(key='llm_model').first().value = 'discarded'
+    db.session.flush()
+    db.session.rollback()
+    assert settings_cache.get_stats()['invalidations'] == invalidations
+    assert settings_cache.get('llm_model') == 'llama3.3:latest'
+
+    # Deleting a setting counts as a change
+    db.session.delete(SystemSettings.query.filter_by(key='llm_provider').first())
+    db.session.commit()
+    assert settings_cache.get('llm_provider') is None
+
+
+def test_other_processes_changes_are_seen_after_a_version_check(app, queries):
+    cache = SettingsCache(check_interval=3600)
+    assert cache.get('llm_model') == 'mistral:7b'
+
+    # Another process: plain SQL, no local invalidation
+    db.session.execute(text("UPDATE system_settings SET value = 'phi3' WHERE key = 'llm_model'"))
+    db.session.execute(text(f"UPDATE system_settings SET value = '7' WHERE key = '{VERSION_KEY}'"))
+    db.session.commit()
+    assert cache.get('llm_model') == 'mistral:7b'  # within the check interval
+
+    cache.check_interval = 0
+    queries.clear()
+    assert cache.get('llm_model') == 'phi3'
+    assert len(queries) == 2  # version check, reload
+
+    queries.clear()
+    assert cache.get('llm_model') == 'phi3'
+    assert len(queries) == 1  # unchanged version: no reload
+    assert cache.get_stats()['loads'] == 2
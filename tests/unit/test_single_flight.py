@@ -0,0 +1,63 @@
+"""
+Unit tests for single-flight LLM request coalescing
+"""
+
+import threading
+import time
+
+from app.services.single_flight import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_upstream_call():
+    flight = SingleFlight()
+    key = flight.make_key('ollama', 'llama3', 'Lesson 1: Cells', {'temperature': 0.2})
+    calls = []
+    results = []
+
+    def upstream():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'lesson note'
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do(key, upstream)))
+               for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == ['lesson note'] * 10
+    assert flight.get_stats() == {'upstream_calls': 1, 'coalesced_calls': 9, 'in_flight': 0}
+
+
+def test_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+    assert flight.make_key('ollama', 'm', 'a') != flight.make_key('ollama', 'm', 'b')
+    assert flight.do('a', lambda: 1) == 1
+    assert flight.do('b', lambda: 2) == 2
+    assert flight.get_stats()['upstream_calls'] == 2
+
+
+def test_errors_propagate_to_followers_and_key_is_released():
+    flight = SingleFlight()
+    errors = []
+
+    def failing():
+        time.sleep(0.1)
+        raise RuntimeError('ollama down')
+
+    def caller():
+        try:
+            flight.do('k', failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=caller) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == ['ollama down'] * 3
+    assert flight.do('k', lambda: 'recovered') == 'recovered'
@@ -0,0 +1,94 @@
+"""
+Unit tests and a 10k-document benchmark for subject/class document lookups
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+from app import db
+from app.models import Document
+from app.services.document_counts import document_counts
+from app.services.lesson_service import LessonNoteService
+
+SUBJECTS = [f"Subject {i}" for i in range(40)]
+CLASSES = [f"Form {i}" for i in range(1, 6)]
+TYPES = ['textbook', 'textbook', 'curriculum', 'progression', None]
+DOCUMENTS = 10_000
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        start = datetime(2026, 1, 1)
+        rows = []
+        for i in range(DOCUMENTS):
+            document_type = TYPES[(i // 200) % len(TYPES)]
+            rows.append({
+                'name': f"doc-{i}", 'filename': f"doc-{i}.pdf", 'file_path': f"/tmp/doc-{i}.pdf",
+                'subject': SUBJECTS[i % len(SUBJECTS)], 'class_level': CLASSES[(i // len(SUBJECTS)) % len(CLASSES)],
+                'document_type': document_type, 'processing_status': 'completed',
+                'extracted_text': f"Lesson 1: Topic {i}\nLesson 2: Topic {i + 1}\n\n" + "x" * 2000,
+                'created_at': start + timedelta(seconds=i)
+            })
+        db.session.execute(Document.__table__.insert(), rows)
+        db.session.commit()
+        yield app
+        db.session.remove()
+
+
+def test_lookup_returns_metadata_and_progression_lines_only(app):
+    document_counts.clear()
+    data = LessonNoteService().get_subject_documents('Subject 3', 'Form 1')
+
+    # 10k documents over 40 subjects x 5 classes: 50 per pair
+    assert sum(data['counts'].values()) == 50
+    assert data['counts'] == {'documents_count': 30, 'curriculum_count': 10, 'progression_count': 10}
+    assert all(set(d) == {'id', 'name', 'document_type'} for d in data['documents'] + data['curriculum_documents'])
+    assert len(data['progression_documents']) == 10 * 3
+    assert data['progression_documents'][0]['lesson'].startswith('Lesson 1: Topic')
+
+    assert LessonNoteService().get_subject_documents('Unknown', 'Form 1') == {}
+
+
+def test_counts_are_cached_until_invalidated(app):
+    document_counts.clear()
+    before = document_counts.get_stats()
+    assert document_counts.get('Subject 1', 'Form 2')['curriculum_count'] == 10
+    assert document_counts.get('Subject 1', 'Form 2')['curriculum_count'] == 10
+    stats = document_counts.get_stats()
+    assert stats['misses'] == before['misses'] + 1 and stats['hits'] == before['hits'] + 1
+
+    document_counts.invalidate('Subject 1', 'Form 2')
+    document_counts.get('Subject 1', 'Form 2')
+    assert document_counts.get_stats()['misses'] == before['misses'] + 2
+
+
+def test_lookup_latency_on_10k_documents(app):
+    plan = db.session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT id, name, document_type FROM documents "
+        "WHERE subject = 'Subject 3' AND class_level = 'Form 1'")).fetchall()
+    assert any('ix_documents_subject_class_type' in str(row) for row in plan)
+
+    service = LessonNoteService()
+    document_counts.clear()
+    pairs = [(s, c) for s in SUBJECTS[:20] for c in CLASSES]
+
+    start = time.perf_counter()
+    for subject, class_level in pairs:
+        assert service.get_subject_documents(subject, class_level)['counts']
+    cold = (time.perf_counter() - start) / len(pairs)
+
+    start = time.perf_counter()
+    for subject, class_level in pairs:
+        document_counts.get(subject, class_level)
+    cached_counts = (time.perf_counter() - start) / len(pairs)
+
+    print(f"\n10k documents: lookup {cold * 1000:.2f} ms, cached counts {cached_counts * 1000:.3f} ms")
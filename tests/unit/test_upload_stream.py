@@ -0,0 +1,99 @@
+"""
+Unit tests and a throughput benchmark for single-pass streamed uploads
+"""
+
+import hashlib
+import io
+import os
+import time
+
+import pytest
+from flask import Flask, jsonify, request
+
+from app.services.large_file_service import LargeFileUploadService
+from app.services.upload_stream import upload_receiver, UploadRequest, UploadSink, INCOMING_DIR
+
+
+@pytest.fixture
+def receiver(monkeypatch):
+    settings = dict(max_file_size=8 * 1024 * 1024, min_free_space=0, endpoints={'upload'},
+                    files=0, bytes=0, seconds=0.0, rejected=0)
+    for name, value in settings.items():
+        monkeypatch.setattr(upload_receiver, name, value)
+    return upload_receiver
+
+
+@pytest.fixture
+def client(receiver, tmp_path):
+    app = Flask(__name__)
+    app.config.update(UPLOAD_FOLDER=str(tmp_path), MAX_CONTENT_LENGTH=None)
+    app.request_class = UploadRequest
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        file = request.files['file']
+        if request.form.get('reject'):
+            return jsonify({'error': 'rejected'}), 400
+        service = LargeFileUploadService()
+        file_info, error = service.save_file(file, app.config['UPLOAD_FOLDER'])
+        return jsonify(dict(file_info, streamed=isinstance(file.stream, UploadSink), upload_time=None))
+
+    @app.errorhandler(413)
+    def too_large(error):
+        return jsonify({'error': error.description}), 413
+
+    return app.test_client()
+
+
+def post(client, data, **form):
+    return client.post('/upload', data=dict(form, file=(io.BytesIO(data), 'notes.pdf')),
+                       content_type='multipart/form-data')
+
+
+def incoming(tmp_path):
+    return os.listdir(tmp_path / INCOMING_DIR)
+
+
+def test_upload_is_received_hashed_and_renamed_in_one_pass(client, receiver, tmp_path):
+    data = os.urandom(3 * 1024 * 1024 + 5)
+    info = post(client, data).get_json()
+
+    assert info['streamed']  # the part was written to the upload folder, not a spooled temp file
+    assert info['file_hash'] == hashlib.sha256(data).hexdigest() and info['file_size'] == len(data)
+    with open(info['file_path'], 'rb') as f:
+        assert f.read() == data
+    assert os.path.dirname(info['file_path']) == str(tmp_path)
+    assert incoming(tmp_path) == []
+    assert receiver.get_stats()['files'] == 1
+
+
+def test_oversized_file_is_refused_while_receiving(client, receiver, tmp_path):
+    response = post(client, os.urandom(9 * 1024 * 1024))
+
+    assert response.status_code == 413 and 'too large' in response.get_json()['error']
+    assert incoming(tmp_path) == [] and os.listdir(tmp_path) == [INCOMING_DIR]
+    assert receiver.get_stats()['rejected'] == 1
+
+
+def test_upload_not_saved_by_the_view_leaves_nothing_behind(client, tmp_path):
+    assert post(client, b'x' * 4096, reject='1').status_code == 400
+    assert incoming(tmp_path) == []
+
+
+def test_full_disk_is_refused_before_receiving(client, receiver, tmp_path):
+    receiver.min_free_space = 1 << 60
+    response = post(client, b'x' * 4096)
+    assert response.status_code == 507
+    assert not os.path.exists(tmp_path / INCOMING_DIR) or incoming(tmp_path) == []
+
+
+def test_upload_throughput(client, receiver):
+    receiver.max_file_size = 128 * 1024 * 1024
+    data = os.urandom(64 * 1024 * 1024)
+    started = time.perf_counter()
+    info = post(client, data).get_json()
+    elapsed = time.perf_counter() - started
+
+    assert info['file_size'] == len(data)
+    print(f"\n64MB upload: {64 / elapsed:.0f} MB/s end to end, "
+          f"{receiver.get_stats()['mb_per_second']} MB/s received and hashed")
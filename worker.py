@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+OCR Agent Pro - Job Worker
+Runs queued background jobs (document OCR and embeddings) outside the web process
+
+Usage:
+    python worker.py                      # JOB_WORKER_CONCURRENCY threads, all job types
+    python worker.py --concurrency 4      # more jobs at once
+    python worker.py --types ocr          # only some job types
+
+Start as many worker processes as the machine allows; they share the queue
+through the processing_jobs table.
+"""
+
+import argparse
+import os
+import signal
+import sys
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Workers never start embedded workers of their own, and only publish job events
+os.environ['JOB_WORKERS_EMBEDDED'] = '0'
+os.environ['JOB_EVENTS_LISTEN'] = 'false'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run OCR Agent background job workers')
+    parser.add_argument('--concurrency', type=int, help='jobs run at once (default: JOB_WORKER_CONCURRENCY)')
+    parser.add_argument('--types', help='comma-separated job types to run (default: all registered)')
+    parser.add_argument('--poll-interval', type=float, help='seconds between claims when idle')
+    args = parser.parse_args()
+
+    from config import Config
+    from app import create_app
+    from app.services import document_ingestion  # noqa: F401  registers the ingestion handler
+    from app.services.job_queue import job_queue, WorkerPool
+
+    concurrency = args.concurrency or Config.JOB_WORKER_CONCURRENCY
+    # One app, engine and connection pool for every job this process runs
+    app = create_app(threads=concurrency)
+    pool = WorkerPool(
+        app, job_queue,
+        concurrency=concurrency,
+        poll_interval=args.poll_interval or app.config.get('JOB_POLL_INTERVAL', 1.0),
+        job_types=args.types.split(',') if args.types else None
+    )
+
+    def shutdown(signum, frame):
+        print("\n🛑 Stopping job workers after their current jobs...")
+        pool.stop()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    pool.start()
+    pool.wait()
+    print("✅ Job workers stopped")
+
+
+if __name__ == '__main__':
+    main()